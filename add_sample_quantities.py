@@ -7,7 +7,6 @@ Run this script to populate the quantity field for existing products
 import os
 import sys
 import django
-import requests
 
 # Add the project directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -33,13 +32,5 @@ def add_sample_quantities():
     
     print(f"\nUpdated quantities for {products.count()} products")
 
-def send_telegram_message(order_details):
-    bot_token = '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc'
-    chat_id = '<YOUR_CHAT_ID>'  # Replace with your Telegram user or group chat ID
-    message = f"New order: {order_details}"
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    data = {'chat_id': chat_id, 'text': message}
-    requests.post(url, data=data)
-
 if __name__ == '__main__':
     add_sample_quantities() 
\ No newline at end of file
@@ -1,14 +1,29 @@
-from decimal import Decimal
+import logging
 from django.conf import settings
 from store.models import Product
+from store.money import Money
+
+logger = logging.getLogger(__name__)
 
 class Cart:
     def __init__(self, request):
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # An empty cart is only attached to the session by save(), so merely
+        # looking at the cart never creates a session row
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
+        # Running item count and subtotal (integer cents), kept next to the
+        # cart so reading them never walks the lines
+        totals = self.session.get(settings.CART_TOTALS_SESSION_ID)
+        if totals is None or not isinstance(totals.get('subtotal'), int):
+            upgraded = self._upgrade_prices()
+            self._count, self._subtotal = self._recompute_totals()
+            if upgraded:
+                self.save()
+        else:
+            self._count, self._subtotal = totals['count'], totals['subtotal']
+        if settings.DEBUG:
+            self._check_totals()
 
     def add(self, product, quantity):
         product_id = str(product.id)
@@ -25,9 +40,10 @@ class Cart:
             return False, f"Only {product.quantity} items available in stock"
         
         if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
+            self.cart[product_id] = {'quantity': 0, 'price': Money.parse(product.price).cents}
+        self._product_cache()[product_id] = product
         
-        self.cart[product_id]['quantity'] = total_quantity
+        self._set_quantity(product_id, total_quantity)
         self.save()
         return True, "Product added to cart"
 
@@ -47,54 +63,127 @@ class Cart:
                 self.remove(product)
                 return True, "Product removed from cart"
             else:
-                self.cart[product_id]['quantity'] = quantity
+                self._set_quantity(product_id, quantity)
                 self.save()
                 return True, "Cart updated"
         return False, "Product not in cart"
 
     def remove(self, product):
-        product_id = str(product.id)
+        # Accepts a Product or a bare id, so lines for deleted products can go too
+        product_id = str(getattr(product, 'id', product))
         if product_id in self.cart:
-            del self.cart[product_id]
+            self._discard(product_id)
             self.save()
 
+    def clear(self):
+        self.cart = {}
+        self._count, self._subtotal = 0, 0
+        self.save()
+
     def __len__(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        return self._count
 
     def get_total_price(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return Money(self._subtotal)
+
+    def _set_quantity(self, product_id, quantity):
+        item = self.cart[product_id]
+        delta = quantity - item['quantity']
+        item['quantity'] = quantity
+        self._count += delta
+        self._subtotal += item['price'] * delta
+
+    def _discard(self, product_id):
+        self._set_quantity(product_id, 0)
+        del self.cart[product_id]
+
+    def _recompute_totals(self):
+        count = sum(item['quantity'] for item in self.cart.values())
+        subtotal = sum(item['price'] * item['quantity'] for item in self.cart.values())
+        return count, subtotal
+
+    def _upgrade_prices(self):
+        # Carts saved before prices were kept in cents hold dollar strings
+        upgraded = False
+        for item in self.cart.values():
+            if not isinstance(item['price'], int):
+                item['price'] = Money.parse(item['price']).cents
+                upgraded = True
+        return upgraded
+
+    def _check_totals(self):
+        """Debug-only: compare the running totals with a full recount"""
+        expected = self._recompute_totals()
+        if (self._count, self._subtotal) != expected:
+            logger.error(f"Cart totals drifted: running {(self._count, self._subtotal)}, recomputed {expected}")
+            self._count, self._subtotal = expected
 
     def save(self):
-        self.session.modified = True
+        if self.cart or settings.CART_SESSION_ID in self.session:
+            self.session[settings.CART_SESSION_ID] = self.cart
+            self.session[settings.CART_TOTALS_SESSION_ID] = {
+                'count': self._count,
+                'subtotal': self._subtotal,
+            }
+            self.session.modified = True
+        if settings.DEBUG:
+            self._check_totals()
     
+    def _product_cache(self):
+        # Shared by every Cart built for this request (views, context processor)
+        cache = getattr(self.request, '_cart_products', None)
+        if cache is None:
+            cache = self.request._cart_products = {}
+        return cache
+
+    def load_products(self, product_ids):
+        """Resolve product ids to Products (or None), fetching unseen ids with one id__in query"""
+        cache = self._product_cache()
+        product_ids = [str(product_id) for product_id in product_ids]
+        missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in cache]
+        if missing:
+            found = Product.objects.in_bulk([int(product_id) for product_id in missing])
+            for product_id in missing:
+                cache[product_id] = found.get(int(product_id))
+        return {product_id: cache[product_id] for product_id in product_ids}
+
+    def get_products(self):
+        """Map cart product ids to Products, loading missing ones with one id__in query"""
+        return self.load_products(self.cart)
+
     def get_cart_items(self):
         """Get cart items with product information"""
         items = []
-        for product_id, item_data in self.cart.items():
-            try:
-                product = Product.objects.get(id=product_id)
-                items.append({
-                    'product': product,
-                    'quantity': item_data['quantity'],
-                    'price': Decimal(item_data['price']),
-                    'total': Decimal(item_data['price']) * item_data['quantity']
-                })
-            except Product.DoesNotExist:
+        removed = False
+        products = self.get_products()
+        for product_id, item_data in list(self.cart.items()):
+            product = products[product_id]
+            if product is None:
                 # Remove invalid product from cart
-                del self.cart[product_id]
-        self.save()
+                self._discard(product_id)
+                removed = True
+                continue
+            price = Money(item_data['price'])
+            items.append({
+                'product': product,
+                'quantity': item_data['quantity'],
+                'price': price,
+                'total': price * item_data['quantity']
+            })
+        if removed:
+            self.save()
         return items
     
     def validate_stock(self):
         """Validate that all items in cart have sufficient stock"""
         errors = []
+        products = self.get_products()
         for product_id, item_data in self.cart.items():
-            try:
-                product = Product.objects.get(id=product_id)
-                if not product.is_in_stock:
-                    errors.append(f"{product.name} is out of stock")
-                elif item_data['quantity'] > product.quantity:
-                    errors.append(f"Only {product.quantity} {product.name} available in stock")
-            except Product.DoesNotExist:
+            product = products[product_id]
+            if product is None:
                 errors.append(f"Product with ID {product_id} no longer exists")
-        return errors
\ No newline at end of file
+            elif not product.is_in_stock:
+                errors.append(f"{product.name} is out of stock")
+            elif item_data['quantity'] > product.quantity:
+                errors.append(f"Only {product.quantity} {product.name} available in stock")
+        return errors
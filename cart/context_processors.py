@@ -1,5 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
 from .cart import Cart
 
 
 def cart(request):
-    return {'cart': Cart(request)}
\ No newline at end of file
+    # Only build the cart (and read the session) if a template uses it
+    return {'cart': SimpleLazyObject(lambda: Cart(request))}
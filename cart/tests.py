@@ -1,3 +1,212 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Product
+from store.money import Money
+from .cart import Cart
+from .views import MAX_BATCH_OPERATIONS
+
+
+class CartProductTests(TestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f'Product {i}', price=Money(1000 + i), Sale_price=Money(1000 + i), quantity=5)
+            for i in range(8)
+        ]
+
+    def cart(self, products):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.session[settings.CART_SESSION_ID] = {
+            str(product.pk): {'quantity': 1, 'price': product.price.cents} for product in products
+        }
+        return Cart(request)
+
+    def test_lines_resolve_in_one_query(self):
+        for lines in (1, 8):
+            with self.subTest(lines=lines):
+                cart = self.cart(self.products[:lines])
+                with self.assertNumQueries(1):
+                    items = cart.get_cart_items()
+                self.assertEqual([item['product'] for item in items], self.products[:lines])
+                # Resolved products are reused for the rest of the request
+                with self.assertNumQueries(0):
+                    self.assertEqual(cart.validate_stock(), [])
+
+    def test_deleted_products_are_dropped(self):
+        cart = self.cart(self.products[:3])
+        self.products[1].delete()
+        with self.assertNumQueries(1):
+            items = cart.get_cart_items()
+        self.assertEqual([item['product'] for item in items], [self.products[0], self.products[2]])
+        self.assertEqual(list(cart.session[settings.CART_SESSION_ID]), [str(self.products[0].pk), str(self.products[2].pk)])
+        self.assertEqual((len(cart), cart.get_total_price()), (2, Money(2002)))
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.phone = Product.objects.create(name='Phone', price=Money(10000), Sale_price=Money(9999), quantity=5, Is_sale=True)
+        self.case = Product.objects.create(name='Case', price=Money(1550), Sale_price=Money(1550), quantity=10, Is_sale=True)
+
+    def assertTotalsMatchRecount(self, session, count, subtotal):
+        lines = session[settings.CART_SESSION_ID].values()
+        recount = {
+            'count': sum(line['quantity'] for line in lines),
+            'subtotal': sum(line['price'] * line['quantity'] for line in lines),
+        }
+        self.assertEqual(session[settings.CART_TOTALS_SESSION_ID], recount)
+        self.assertEqual(recount, {'count': count, 'subtotal': subtotal})
+
+    def test_running_totals_match_recount(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        cart = Cart(request)
+        steps = [
+            (lambda: cart.add(self.phone, 2), 2, 20000),
+            (lambda: cart.add(self.case, 3), 5, 24650),
+            (lambda: cart.update(self.phone, 1), 4, 14650),
+            (lambda: cart.add(self.phone, 1), 5, 24650),
+            (lambda: cart.remove(self.case), 2, 20000),
+            (lambda: cart.update(self.phone, 0), 0, 0),
+        ]
+        for step, count, subtotal in steps:
+            step()
+            self.assertTotalsMatchRecount(request.session, count, subtotal)
+            self.assertEqual((len(cart), cart.get_total_price()), (count, Money(subtotal)))
+
+    def test_batch_totals_match_recount(self):
+        self.client.post(reverse('cart_batch'), json.dumps({'operations': [
+            {'op': 'add', 'product_id': self.phone.pk, 'quantity': 3},
+            {'op': 'add', 'product_id': self.case.pk, 'quantity': 2},
+            {'op': 'set', 'product_id': self.phone.pk, 'quantity': 1},
+            {'op': 'add', 'product_id': self.case.pk, 'quantity': 20},
+        ]}), content_type='application/json')
+        self.assertTotalsMatchRecount(self.client.session, 3, 13100)
+
+    def test_legacy_cart_is_upgraded(self):
+        # Saved before the running totals existed, with prices as dollar strings
+        session = SessionStore()
+        session[settings.CART_SESSION_ID] = {
+            str(self.phone.pk): {'quantity': 2, 'price': '100.00'},
+            str(self.case.pk): {'quantity': 1, 'price': '15.50'},
+        }
+        request = RequestFactory().get('/')
+        request.session = session
+        cart = Cart(request)
+        self.assertEqual((len(cart), cart.get_total_price()), (3, Money(21550)))
+        self.assertEqual(session[settings.CART_SESSION_ID][str(self.case.pk)]['price'], 1550)
+        self.assertTotalsMatchRecount(session, 3, 21550)
+
+    @override_settings(DEBUG=True)
+    def test_debug_check_repairs_drift(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.session[settings.CART_SESSION_ID] = {str(self.case.pk): {'quantity': 2, 'price': 1550}}
+        request.session[settings.CART_TOTALS_SESSION_ID] = {'count': 5, 'subtotal': 100}
+        with self.assertLogs('cart.cart', 'ERROR'):
+            cart = Cart(request)
+        self.assertEqual((len(cart), cart.get_total_price()), (2, Money(3100)))
+
+
+class CartContextProcessorTests(TestCase):
+    def test_anonymous_page_creates_no_session(self):
+        Product.objects.create(name='Phone', price=Money(10000), Sale_price=Money(10000), quantity=5)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_cart_built_only_when_template_uses_it(self):
+        request = RequestFactory().get('/')
+        request.session, request.user = SessionStore(), AnonymousUser()
+        with mock.patch('cart.context_processors.Cart', wraps=Cart) as cart:
+            Template('{{ request.path }}').render(RequestContext(request))
+            cart.assert_not_called()
+            self.assertEqual(Template('{{ cart|length }}').render(RequestContext(request)), '0')
+            cart.assert_called_once_with(request)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        def add(name, cents, quantity, on_sale=True):
+            return Product.objects.create(
+                name=name, price=Money(cents), Sale_price=Money(cents), quantity=quantity, Is_sale=on_sale,
+            )
+        self.phone = add('Phone', 10000, 5)
+        self.case = add('Case', 1500, 10)
+        self.cable = add('Cable', 500, 3)
+        self.retired = add('Retired', 2000, 4, on_sale=False)
+
+    def batch(self, *operations):
+        response = self.client.post(
+            reverse('cart_batch'), json.dumps({'operations': list(operations)}), content_type='application/json',
+        )
+        return response.status_code, response.json()
+
+    def cart(self):
+        session = self.client.session
+        return {int(pid): line['quantity'] for pid, line in session.get(settings.CART_SESSION_ID, {}).items()}
+
+    def test_mixed_operations_apply_in_order(self):
+        self.batch({'op': 'add', 'product_id': self.case.pk, 'quantity': 2},
+                   {'op': 'add', 'product_id': self.cable.pk})
+
+        status, body = self.batch(
+            {'op': 'add', 'product_id': self.phone.pk, 'quantity': 2},
+            {'op': 'set', 'product_id': self.case.pk, 'quantity': 4},
+            {'op': 'remove', 'product_id': self.cable.pk},
+            {'op': 'add', 'product_id': self.phone.pk},
+        )
+        self.assertEqual(status, 200)
+        self.assertTrue(body['success'])
+        self.assertEqual([r['item_quantity'] for r in body['results']], [2, 4, 0, 3])
+        self.assertEqual(self.cart(), {self.phone.pk: 3, self.case.pk: 4})
+        self.assertEqual((body['qty'], body['cart_total']), (7, 360.0))
+
+    def test_failed_operations_do_not_stop_the_rest(self):
+        status, body = self.batch(
+            {'op': 'add', 'product_id': self.cable.pk, 'quantity': 4},
+            {'op': 'add', 'product_id': self.retired.pk},
+            {'op': 'remove', 'product_id': self.phone.pk},
+            {'op': 'add', 'product_id': 0},
+            {'op': 'explode', 'product_id': self.case.pk},
+            {'product_id': self.case.pk},
+            {'op': 'set', 'product_id': self.case.pk, 'quantity': 2},
+        )
+        self.assertEqual(status, 200)
+        self.assertFalse(body['success'])
+        self.assertEqual([r['success'] for r in body['results']], [False, False, False, False, False, False, True])
+        self.assertEqual(body['results'][0]['message'], 'Only 3 items available in stock')
+        self.assertEqual(self.cart(), {self.case.pk: 2})
+
+    def test_set_zero_removes(self):
+        self.batch({'op': 'add', 'product_id': self.case.pk, 'quantity': 2})
+        status, body = self.batch({'op': 'set', 'product_id': self.case.pk, 'quantity': 0})
+        self.assertTrue(body['success'])
+        self.assertEqual(self.cart(), {})
+
+    def test_products_load_in_one_query(self):
+        operations = [{'op': 'add', 'product_id': product.pk} for product in (self.phone, self.case, self.cable)]
+        with CaptureQueriesContext(connection) as queries:
+            self.batch(*operations)
+        self.assertEqual(len([q for q in queries if 'store_product' in q['sql']]), 1)
+
+    def test_rejects_bad_bodies(self):
+        for operations in ([], 'add', [{'op': 'add', 'product_id': self.case.pk}] * (MAX_BATCH_OPERATIONS + 1)):
+            with self.subTest(operations=operations):
+                response = self.client.post(
+                    reverse('cart_batch'), json.dumps({'operations': operations}), content_type='application/json',
+                )
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('cart_batch'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -1,27 +1,35 @@
+import json
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from .cart import Cart
 from store.models import Product
+from store.money import Money
+
+MAX_BATCH_OPERATIONS = 50
 
 def cart_summary(request):
     cart = Cart(request)
     order = {
         'get_cart_items': cart.__len__(),
-        'get_cart_total': float(cart.get_total_price())  # Ensure float for JSON
+        'get_cart_total': cart.get_total_price()
     }
+    products = cart.get_products()
     items = [
         {
             'product': {
                 'id': product_id,
                 'name': product.name,
-                'price': float(item['price']),
-                'imageURL': product.imageURL
+                'price': Money(item['price']),
+                'imageURL': product.imageURL,
+                'quantity': product.quantity
             },
             'quantity': item['quantity'],
-            'get_total': float(item['price']) * item['quantity']
+            'get_total': Money(item['price']) * item['quantity']
         }
         for product_id, item in cart.cart.items()
-        for product in [get_object_or_404(Product, id=int(product_id))]
+        for product in [products[product_id]]
+        if product is not None
     ]
     return render(request, "cart_summary.html", {'order': order, 'items': items})
 
@@ -120,4 +128,79 @@ def cart_delete(request):
             return JsonResponse({'error': 'Invalid product ID'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
-    return JsonResponse({'error': 'Invalid request'}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+def _apply_operation(cart, op, product_id, quantity, product):
+    """Apply one batch operation; returns (success, message)"""
+    in_cart = str(product_id) in cart.cart
+    if op == 'remove' or (op == 'set' and quantity == 0):
+        if not in_cart:
+            return False, "Product not in cart"
+        cart.remove(product_id)
+        return True, "Product removed from cart"
+    if product is None:
+        return False, "Product not found"
+    if op == 'add' or (op == 'set' and not in_cart):
+        if quantity < 1:
+            return False, "Quantity must be at least 1"
+        if not product.Is_sale:
+            return False, "Product is out of stock"
+        return cart.add(product=product, quantity=quantity)
+    if op == 'set':
+        if quantity < 0:
+            return False, "Quantity cannot be negative"
+        return cart.update(product=product, quantity=quantity)
+    return False, f"Unknown operation '{op}'"
+
+@require_POST
+def cart_batch(request):
+    """
+    Apply several cart operations in one request.
+
+    Body: {"operations": [{"op": "add"|"set"|"remove", "product_id": 1, "quantity": 2}, ...]}
+    All products are resolved with one query and the session is written once.
+    """
+    try:
+        operations = json.loads(request.body or b'{}').get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'error': 'operations must be a non-empty list'}, status=400)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return JsonResponse({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}, status=400)
+
+    parsed = []
+    for operation in operations:
+        try:
+            parsed.append((
+                str(operation['op']),
+                int(operation['product_id']),
+                int(operation.get('quantity', 1)),
+            ))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            parsed.append(None)
+
+    cart = Cart(request)
+    products = cart.load_products(entry[1] for entry in parsed if entry)
+
+    results = []
+    for entry in parsed:
+        if entry is None:
+            results.append({'success': False, 'message': 'Invalid operation'})
+            continue
+        op, product_id, quantity = entry
+        success, message = _apply_operation(cart, op, product_id, quantity, products[str(product_id)])
+        results.append({
+            'op': op,
+            'product_id': product_id,
+            'success': success,
+            'message': message,
+            'item_quantity': cart.cart.get(str(product_id), {'quantity': 0})['quantity'],
+        })
+
+    return JsonResponse({
+        'results': results,
+        'qty': len(cart),
+        'cart_total': float(cart.get_total_price()),
+        'success': all(result['success'] for result in results),
+    })
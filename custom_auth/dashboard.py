@@ -0,0 +1,83 @@
+"""
+Cached snapshots of the admin dashboard.
+
+The dashboard page and each of its chart endpoints are computed once per
+filter combination (brand, status, date) into a snapshot of their own,
+kept in the cache backend for ``FRESH_FOR`` seconds. After that the
+snapshot is stale: the first request to see it takes a short-lived lock
+and recomputes it, while requests arriving in the meantime keep getting
+the stale copy instead of running the same aggregates again.
+Stale copies are dropped after ``STALE_FOR`` seconds, so an idle filter
+combination is recomputed from scratch.
+
+Every snapshot carries ``as_of``, the time its figures were computed, and
+``fresh_until``, from which responses derive how long clients may keep them.
+Figures that must never lag (pending orders, low stock) are not snapshotted.
+"""
+import hashlib
+import logging
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FRESH_FOR = 60
+STALE_FOR = 60 * 15
+# How long a recomputation may hold the lock before another worker takes over
+LOCK_TIMEOUT = 30
+# How long a request with no snapshot at all waits for another worker's
+WAIT_FOR = 5
+WAIT_STEP = 0.1
+# Bump when the snapshot's contents change shape
+VERSION = 2
+
+
+def snapshot_key(*filters):
+    digest = hashlib.sha1('\x1f'.join(map(str, filters)).encode()).hexdigest()
+    return f"dashboard:v{VERSION}:{digest}"
+
+
+def _store(key, compute):
+    snapshot = {'data': compute(), 'as_of': timezone.now(), 'fresh_until': time.time() + FRESH_FOR}
+    cache.set(key, snapshot, STALE_FOR)
+    return snapshot
+
+
+def get_snapshot(filters, compute):
+    """
+    Snapshot for ``filters``: ``{'data': compute(), 'as_of': datetime, 'fresh_until': timestamp}``.
+
+    ``compute`` is only called when there is no fresh snapshot and no other
+    worker is already recomputing one.
+    """
+    key = snapshot_key(*filters)
+    lock_key = f"{key}:lock"
+    snapshot = cache.get(key)
+    if snapshot is not None and snapshot['fresh_until'] > time.time():
+        return snapshot
+
+    if cache.add(lock_key, True, LOCK_TIMEOUT):
+        try:
+            return _store(key, compute)
+        finally:
+            cache.delete(lock_key)
+
+    if snapshot is not None:
+        # Someone else is recomputing it; the stale copy will do until then
+        return snapshot
+
+    deadline = time.monotonic() + WAIT_FOR
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+    logger.warning(f"Dashboard snapshot {key} not ready after {WAIT_FOR}s; computing it here")
+    return _store(key, compute)
+
+
+def fresh_for(snapshot):
+    """Whole seconds ``snapshot`` stays fresh; 0 once it is stale."""
+    return max(0, int(snapshot['fresh_until'] - time.time()))
@@ -1,3 +1,197 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payment import rollups
+from payment.models import Order, OrderItem
+from store.models import Category, Product
+from store.money import Money
+from store.registry import category_registry
+from .dashboard import snapshot_key
+
+
+# Count only the page's own queries, not those of the database cache backend
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminDashboardQueryTests(TestCase):
+    # Session, user, the snapshot's fixed set of aggregates and lists, and
+    # the live figures; must not grow with the number of products,
+    # categories or orders
+    DASHBOARD_QUERIES = 11
+    # Session, user and the grouped line sales, once the category registry
+    # is loaded; the product chart also loads the brands' products
+    CHART_QUERIES = {'category': 3, 'brand': 3, 'product': 4}
+    # Session, user and the live figures (recent orders, low stock list and
+    # count, pending orders) when the snapshot is cached
+    SNAPSHOT_QUERIES = 6
+
+    def setUp(self):
+        # The registry and dashboard snapshots outlive each test's rolled-back transaction
+        category_registry.invalidate()
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def add_catalog(self, brands, products_per_brand=3, orders_per_product=2):
+        for name in brands:
+            category = Category.objects.create(name=name)
+            for i in range(products_per_brand):
+                product = Product.objects.create(
+                    name=f'{name} {i}', category=category, price=Money(10000), Sale_price=Money(9000), quantity=3,
+                )
+                for _ in range(orders_per_product):
+                    # 100.00 of goods plus 5.00 delivery
+                    order = Order.objects.create(user=self.admin, amount_paid=Money(10500), status='DELIVERED')
+                    OrderItem.objects.create(order=order, product=product, quantity=1, price=Money(10000))
+        # What the refresh_sales_rollups worker does
+        rollups.refresh_marked()
+
+    def forget_snapshot(self, params, name='page'):
+        cache.delete(snapshot_key(name, params.get('brand', ''), params.get('status', ''), params.get('date', '')))
+
+    def test_query_count_is_fixed(self):
+        self.add_catalog(['Pixel'])
+        self.client.get(reverse('admin_dashboard'))
+        self.forget_snapshot({})
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            self.client.get(reverse('admin_dashboard'))
+
+        self.add_catalog(['Samsung', 'Vivo', 'Oppo', 'Nokia'], products_per_brand=5)
+        self.forget_snapshot({})
+        self.client.get(reverse('admin_dashboard'))
+        for params in ({}, {'brand': 'Samsung'}, {'status': 'DELIVERED', 'date': 'this_year'}):
+            self.forget_snapshot(params)
+            with self.assertNumQueries(self.DASHBOARD_QUERIES):
+                response = self.client.get(reverse('admin_dashboard'), params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_chart_query_count_is_fixed(self):
+        self.add_catalog(['Pixel'])
+        self.client.get(reverse('admin_dashboard_chart', args=['category']))
+        self.add_catalog(['Samsung', 'Vivo', 'Oppo', 'Nokia'], products_per_brand=5)
+        for chart, queries in self.CHART_QUERIES.items():
+            for params in ({}, {'brand': 'Samsung'}):
+                category_registry.all()
+                self.forget_snapshot(params, chart)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(reverse('admin_dashboard_chart', args=[chart]), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(response['Cache-Control'], ('private, max-age=59', 'private, max-age=60'))
+
+    def test_unknown_chart(self):
+        response = self.client.get(reverse('admin_dashboard_chart', args=['users']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_sales_totals(self):
+        self.add_catalog(['Pixel', 'Samsung'], products_per_brand=2)
+        Order.objects.create(user=self.admin, amount_paid=Money(500), status='PENDING')
+        rollups.refresh_marked()
+
+        context = self.client.get(reverse('admin_dashboard')).context
+        self.assertEqual(context['status_counts']['DELIVERED'], 8)
+        self.assertEqual(context['status_counts']['PENDING'], 1)
+        self.assertEqual(context['total_year'], Money(84500))
+        self.assertEqual(context['total_sales'], Money(84000))
+        self.assertEqual(context['delivery_fees'], Money(4000))
+        self.assertEqual(context['new_orders_count'], 1)
+
+        def chart(name):
+            return self.client.get(reverse('admin_dashboard_chart', args=[name])).json()
+
+        sales_by_brand = {row['brand']: row['total'] for row in chart('brand')['sales_by_brand']}
+        self.assertEqual(sales_by_brand['Pixel'], 400.0)
+        self.assertEqual(sales_by_brand['Vivo'], 0)
+        self.assertEqual(chart('category')['sales_by_category'][0]['total'], 400.0)
+        top_products = chart('product')['top_products']
+        self.assertEqual(top_products[0]['revenue'], 200.0)
+        self.assertEqual(len(top_products), 4)
+
+    def test_brand_counts_each_order_once(self):
+        self.add_catalog(['Pixel', 'Samsung'], products_per_brand=2, orders_per_product=0)
+        pixels = list(Product.objects.filter(category__name='Pixel'))
+        order = Order.objects.create(user=self.admin, amount_paid=Money(20500), status='SHIPPED')
+        for product in pixels:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=Money(10000))
+        samsung = Product.objects.filter(category__name='Samsung').first()
+        OrderItem.objects.create(order=order, product=samsung, quantity=1, price=Money(10000))
+        rollups.refresh_marked()
+
+        context = self.client.get(reverse('admin_dashboard'), {'brand': 'Pixel'}).context
+        self.assertEqual(context['status_counts']['SHIPPED'], 1)
+        self.assertEqual(context['total_year'], Money(20000))
+        context = self.client.get(reverse('admin_dashboard'), {'brand': 'Samsung'}).context
+        self.assertEqual((context['status_counts']['SHIPPED'], context['total_year']), (1, Money(10000)))
+
+    def test_snapshot_is_cached_per_filter(self):
+        self.add_catalog(['Pixel'])
+        first = self.client.get(reverse('admin_dashboard')).context
+        self.add_catalog(['Samsung'])
+        with self.assertNumQueries(self.SNAPSHOT_QUERIES):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['as_of'], first['as_of'])
+        self.assertEqual(response.context['total_orders'], 6)
+        self.assertContains(response, 'As of ')
+
+        # Another filter combination has its own snapshot
+        response = self.client.get(reverse('admin_dashboard'), {'brand': 'Samsung'})
+        self.assertEqual(response.context['total_orders'], 12)
+
+    def test_stale_snapshot_served_while_another_worker_recomputes(self):
+        self.add_catalog(['Pixel'])
+        self.client.get(reverse('admin_dashboard'))
+        key = snapshot_key('page', '', '', '')
+        stale = cache.get(key)
+        stale['fresh_until'] = time.time() - 1
+        cache.set(key, stale)
+
+        cache.add(f'{key}:lock', True)
+        with self.assertNumQueries(self.SNAPSHOT_QUERIES):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['as_of'], stale['as_of'])
+
+        cache.delete(f'{key}:lock')
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertGreater(response.context['as_of'], stale['as_of'])
+
+    def test_live_figures_are_not_snapshotted(self):
+        self.add_catalog(['Pixel'])
+        first = self.client.get(reverse('admin_dashboard')).context
+        self.assertEqual((first['new_orders_count'], first['low_stock_count']), (0, 3))
+
+        order = Order.objects.create(user=self.admin, amount_paid=Money(500), status='PENDING')
+        Product.objects.create(name='Last one', price=Money(100), Sale_price=Money(90), quantity=0)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['as_of'], first['as_of'])
+        self.assertEqual(response.context['new_orders_count'], 1)
+        self.assertEqual(response.context['recent_orders'][0], order)
+        self.assertEqual(response.context['low_stock_products'][0].name, 'Last one')
+        self.assertEqual(response.context['low_stock_count'], 4)
+
+    def test_stale_chart_is_not_cached_by_the_browser(self):
+        self.add_catalog(['Pixel'])
+        self.client.get(reverse('admin_dashboard_chart', args=['brand']))
+        key = snapshot_key('brand', '', '', '')
+        stale = cache.get(key)
+        stale['fresh_until'] = time.time() - 1
+        cache.set(key, stale)
+        cache.add(f'{key}:lock', True)
+        response = self.client.get(reverse('admin_dashboard_chart', args=['brand']))
+        self.assertEqual(response['Cache-Control'], 'private, max-age=0')
+
+
+class AdminOrderStatusTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.order = Order.objects.create(amount_paid=Money(1000))
+
+    def set_status(self, status):
+        self.client.post(reverse('admin_order_update_status', args=[self.order.pk]), {'status': status})
+        return Order.objects.get(pk=self.order.pk)
+
+    def test_reposting_shipped_keeps_ship_date(self):
+        shipped = self.set_status('SHIPPED')
+        self.assertIsNotNone(shipped.date_shipped)
+        again = self.set_status('SHIPPED')
+        self.assertEqual((again.date_shipped, again.status_changed_at), (shipped.date_shipped, shipped.status_changed_at))
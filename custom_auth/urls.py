@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('', views.admin_dashboard, name='admin_dashboard'),
+    path('charts/<slug:chart>/', views.admin_dashboard_chart, name='admin_dashboard_chart'),
     path('admin/orders/', views.admin_order_list, name='admin_order_list'),
     path('admin/orders/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
     path('admin/orders/<int:order_id>/update-status/', views.admin_order_update_status, name='admin_order_update_status'),
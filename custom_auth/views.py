@@ -1,16 +1,22 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
-from store.models import Product, Category, Profile
-from payment.models import Order, OrderItem, ShippingAddress, DeliveryOption
+from store.models import Product, Profile
+from store.search import filter_products
+from store.registry import category_registry
+from .dashboard import fresh_for, get_snapshot
+from payment.models import Order, DailyCategorySales, DailyOrderSales, DailySales
 from django.contrib import messages
+from django.http import Http404, JsonResponse
 from django import forms
-from django.db.models import Sum, Q, Count
+from django.db.models import Sum, Q
 from django.utils import timezone
 from django.utils.timezone import now
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
 from datetime import timedelta
 from functools import wraps
+from django.utils.http import urlencode
 
 # Role-based permission decorators
 def role_required(allowed_roles):
@@ -125,21 +131,68 @@ class UserProfileForm(forms.ModelForm):
             'country': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+TARGET_BRANDS = ['Oppo', 'ROG', 'Vivo', 'Samsung', 'Pixel', 'iPhone']
+# Products at or below this many units are flagged on the dashboard
+LOW_STOCK = 5
+
 @login_required(login_url='/login/')
 @role_required(['ADMIN', 'MANAGER'])
 def admin_dashboard(request):
-    target_brands = ['Oppo', 'ROG', 'Vivo', 'Samsung', 'Pixel', 'iPhone']
-    now = timezone.now()
-
     # Get filter parameters
     selected_brand = request.GET.get('brand', '')
     selected_status = request.GET.get('status', '')
     selected_date = request.GET.get('date', '')
 
-    # Base queryset for orders
-    orders = Order.objects.select_related('user', 'shipping_address', 'delivery_option').prefetch_related('orderitem_set__product')
+    filters = (selected_brand, selected_status, selected_date)
+    snapshot = get_snapshot(('page', *filters), lambda: _dashboard_context(*filters))
+    context = {
+        **snapshot['data'],
+        **_dashboard_live(*filters),
+        'as_of': snapshot['as_of'],
+        # The charts are fetched after load, with the same filters
+        'chart_query': urlencode({key: value for key, value in zip(('brand', 'status', 'date'), filters) if value}),
+    }
+    return render(request, 'admin_dashboard.html', context)
 
-    # Apply filters
+@login_required(login_url='/login/')
+@role_required(['ADMIN', 'MANAGER'])
+def admin_dashboard_chart(request, chart):
+    if chart not in DASHBOARD_CHARTS:
+        raise Http404(f"No dashboard chart named {chart}")
+    filters = (request.GET.get('brand', ''), request.GET.get('status', ''), request.GET.get('date', ''))
+    snapshot = get_snapshot((chart, *filters), lambda: DASHBOARD_CHARTS[chart](*filters))
+    response = JsonResponse({**snapshot['data'], 'as_of': snapshot['as_of']})
+    # Browsers may keep the chart only as long as the snapshot is fresh
+    patch_cache_control(response, private=True, max_age=fresh_for(snapshot))
+    return response
+
+def _rollup_filter(selected_status, selected_date):
+    # Sales figures are read from the daily rollups (payment.rollups), so
+    # their cost follows the number of days and products, not of orders
+    today = timezone.localdate()
+    rollup_filter = Q()
+    if selected_status:
+        rollup_filter &= Q(status=selected_status)
+    if selected_date == 'today':
+        rollup_filter &= Q(date=today)
+    elif selected_date == 'past_7_days':
+        rollup_filter &= Q(date__gte=today - timedelta(days=7))
+    elif selected_date == 'this_month':
+        rollup_filter &= Q(date__year=today.year, date__month=today.month)
+    elif selected_date == 'this_year':
+        rollup_filter &= Q(date__year=today.year)
+    return rollup_filter
+
+def _line_sales(selected_brand, selected_status, selected_date):
+    line_sales = DailySales.objects.filter(_rollup_filter(selected_status, selected_date))
+    if selected_brand:
+        # Only the brand's own lines count towards its totals
+        line_sales = line_sales.filter(category__name=selected_brand)
+    return line_sales
+
+def _filtered_orders(selected_brand, selected_status, selected_date):
+    now = timezone.now()
+    orders = Order.objects.select_related('user')
     if selected_brand:
         orders = orders.filter(orderitem__product__category__name=selected_brand)
     if selected_status:
@@ -153,95 +206,71 @@ def admin_dashboard(request):
             orders = orders.filter(date_ordered__year=now.year, date_ordered__month=now.month)
         elif selected_date == 'this_year':
             orders = orders.filter(date_ordered__year=now.year)
+    return orders
+
+def _dashboard_live(selected_brand, selected_status, selected_date):
+    """What the dashboard shows as of this request: a few cheap, indexed queries kept out of the snapshot."""
+    orders = _filtered_orders(selected_brand, selected_status, selected_date)
+    low_stock = Product.objects.filter(quantity__lte=LOW_STOCK).order_by('quantity')
+    return {
+        'recent_orders': list(orders.order_by('-date_ordered')[:5]),
+        'low_stock_products': list(low_stock[:5]),
+        'low_stock_count': low_stock.count(),
+        'new_orders_count': Order.objects.filter(status='PENDING').count(),
+    }
 
-    # Calculate total order amounts
-    total_today = orders.filter(
-        date_ordered__date=now.date()
-    ).aggregate(total=Sum('amount_paid'))['total'] or 0.0
-    total_month = orders.filter(
-        date_ordered__year=now.year, date_ordered__month=now.month
-    ).aggregate(total=Sum('amount_paid'))['total'] or 0.0
-    total_year = orders.filter(
-        date_ordered__year=now.year
-    ).aggregate(total=Sum('amount_paid'))['total'] or 0.0
-
-    # Calculate order counts by status
-    status_counts = orders.values('status').annotate(count=Count('id')).order_by('status')
+def _dashboard_context(selected_brand, selected_status, selected_date):
+    """The dashboard's summary figures for one filter combination, as plain (cacheable) values."""
+    today = timezone.localdate()
+
+    if selected_brand:
+        # One row per category, so an order holding several of the brand's
+        # products is still counted once
+        period_rows = DailyCategorySales.objects.filter(
+            _rollup_filter(selected_status, selected_date), category__name=selected_brand,
+        )
+        amount_field = 'revenue'
+    else:
+        period_rows = DailyOrderSales.objects.filter(_rollup_filter(selected_status, selected_date))
+        amount_field = 'amount_paid'
+
+    # Period totals and status counts
     status_data = {
         'PENDING': 0,
         'SHIPPED': 0,
         'DELIVERED': 0,
         'CANCELLED': 0
     }
-    for item in status_counts:
-        status_data[item['status']] = item['count']
-
-    # Product sales data
-    products = Product.objects.filter(category__name__in=target_brands)
-    if selected_brand:
-        products = products.filter(category__name=selected_brand)
-    product_sales = []
-    for product in products:
-        product_orders = orders.filter(
-            orderitem__product=product,
-            status__in=['SHIPPED', 'DELIVERED']
-        )
-        total_amount = product_orders.aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0.0
-        product_sales.append({
-            'product': product,
-            'category': product.category.name if product.category else 'N/A',
-            'price': product.price or 0.0,
-            'sale_price': product.Sale_price or 0.0,
-            'is_sale': product.Is_sale,
-            'amount_paid': total_amount
-        })
-
-    # Sales by brand data
-    sales_by_brand = {}
-    for brand in target_brands:
-        brand_orders = orders.filter(
-            orderitem__product__category__name=brand,
-            status__in=['SHIPPED', 'DELIVERED']
-        )
-        total_sales = brand_orders.aggregate(total=Sum('amount_paid'))['total'] or 0.0
-        sales_by_brand[brand] = total_sales
-
-    # Top products (by sales amount)
-    top_products = sorted(product_sales, key=lambda x: x['amount_paid'], reverse=True)[:5]
-
-    # Recent orders (last 5)
-    recent_orders = orders.order_by('-date_ordered')[:5]
+    summary = period_rows.aggregate(
+        total_today=Sum(amount_field, filter=Q(date=today)),
+        total_month=Sum(amount_field, filter=Q(date__year=today.year, date__month=today.month)),
+        total_year=Sum(amount_field, filter=Q(date__year=today.year)),
+        **{status: Sum('order_count', filter=Q(status=status)) for status in status_data},
+    )
+    total_today = summary['total_today'] or 0.0
+    total_month = summary['total_month'] or 0.0
+    total_year = summary['total_year'] or 0.0
+    for status in status_data:
+        status_data[status] = summary[status] or 0
 
     # Recent users (last 5)
-    recent_users = User.objects.order_by('-date_joined')[:5]
-
-    # Sales by category (pie chart) - limit to top 6
-    categories = Category.objects.all()
-    sales_by_category = []
-    for cat in categories:
-        cat_orders = orders.filter(orderitem__product__category=cat, status__in=['SHIPPED', 'DELIVERED'])
-        total_sales = cat_orders.aggregate(total=Sum('amount_paid'))['total'] or 0.0
-        sales_by_category.append({'category': cat.name, 'total': total_sales})
-    
-    # Sort by total sales and limit to top 6
-    sales_by_category = sorted(sales_by_category, key=lambda x: x['total'], reverse=True)[:6]
+    recent_users = list(User.objects.order_by('-date_joined')[:5])
 
     # --- Dashboard summary stats ---
     total_users = User.objects.count()
     total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_sales = Order.objects.filter(status__in=['SHIPPED', 'DELIVERED']).aggregate(total=Sum('amount_paid'))['total'] or 0.0
-
-    # --- Notifications ---
-    low_stock_products = Product.objects.filter(quantity__lte=5).order_by('quantity')
-    new_orders_count = Order.objects.filter(status='PENDING').count()
+    order_stats = DailyOrderSales.objects.aggregate(
+        total_orders=Sum('order_count'),
+        total_sales=Sum('amount_paid', filter=Q(status__in=['SHIPPED', 'DELIVERED'])),
+        items_sales=Sum('items_subtotal', filter=Q(status__in=['SHIPPED', 'DELIVERED'])),
+    )
+    total_orders = order_stats['total_orders'] or 0
+    total_sales = order_stats['total_sales'] or 0.0
+    # What was paid beyond the items: delivery fees
+    delivery_fees = total_sales - (order_stats['items_sales'] or 0.0)
 
-    context = {
-        'product_sales': product_sales,
-        'sales_by_brand': sales_by_brand,
-        'target_brands': target_brands,
+    return {
+        'target_brands': TARGET_BRANDS,
         'total_today': total_today,
         'total_month': total_month,
         'total_year': total_year,
@@ -249,25 +278,73 @@ def admin_dashboard(request):
         'selected_brand': selected_brand,
         'selected_status': selected_status,
         'selected_date': selected_date,
-        'top_products': top_products,
-        'recent_orders': recent_orders,
         'recent_users': recent_users,
-        'sales_by_category': sales_by_category,
         'total_users': total_users,
         'total_products': total_products,
         'total_orders': total_orders,
         'total_sales': total_sales,
-        'low_stock_products': low_stock_products,
-        'new_orders_count': new_orders_count,
+        'delivery_fees': delivery_fees,
     }
-    return render(request, 'admin_dashboard.html', context)
+
+def _sales_totals(selected_brand, selected_status, selected_date):
+    """Line revenue of sold orders by product id and by category id."""
+    # Line revenue (price x quantity) per (product, category) in one grouped
+    # query; delivery fees are not part of any product's sales. Product,
+    # brand and category totals are all sums of these rows.
+    sales_rows = _line_sales(selected_brand, selected_status, selected_date).filter(
+        status__in=['SHIPPED', 'DELIVERED']
+    ).values_list('product_id', 'category_id').annotate(total=Sum('revenue')).order_by()
+    sales_by_product = {}
+    sales_by_category_id = {}
+    for product_id, category_id, total in sales_rows:
+        sales_by_product[product_id] = sales_by_product.get(product_id, 0.0) + total
+        sales_by_category_id[category_id] = sales_by_category_id.get(category_id, 0.0) + total
+    return sales_by_product, sales_by_category_id
+
+def _category_chart(selected_brand, selected_status, selected_date):
+    _, sales_by_category_id = _sales_totals(selected_brand, selected_status, selected_date)
+    sales_by_category = [
+        {'category': cat.name, 'total': float(sales_by_category_id.get(cat.id, 0.0))}
+        for cat in category_registry.all()
+    ]
+    # Sort by total sales and limit to top 6
+    return {'sales_by_category': sorted(sales_by_category, key=lambda x: x['total'], reverse=True)[:6]}
+
+def _brand_chart(selected_brand, selected_status, selected_date):
+    _, sales_by_category_id = _sales_totals(selected_brand, selected_status, selected_date)
+    sales_by_brand = {brand: 0.0 for brand in TARGET_BRANDS}
+    for cat in category_registry.all():
+        if cat.name in sales_by_brand:
+            sales_by_brand[cat.name] += float(sales_by_category_id.get(cat.id, 0.0))
+    return {'sales_by_brand': [{'brand': brand, 'total': total} for brand, total in sales_by_brand.items()]}
+
+def _product_chart(selected_brand, selected_status, selected_date):
+    sales_by_product, _ = _sales_totals(selected_brand, selected_status, selected_date)
+    products = Product.objects.filter(category__name__in=TARGET_BRANDS).select_related('category')
+    if selected_brand:
+        products = products.filter(category__name=selected_brand)
+    product_sales = [
+        {
+            'product': product.name,
+            'category': product.category.name if product.category else 'N/A',
+            'revenue': float(sales_by_product.get(product.id, 0.0)),
+        }
+        for product in products
+    ]
+    # Top products (by sales amount)
+    return {'top_products': sorted(product_sales, key=lambda x: x['revenue'], reverse=True)[:5]}
+
+DASHBOARD_CHARTS = {
+    'category': _category_chart,
+    'brand': _brand_chart,
+    'product': _product_chart,
+}
 
 @login_required(login_url='/login/')
 @role_required(['ADMIN', 'MANAGER'])
 def admin_order_list(request):
     target_brands = ['Oppo', 'ROG', 'Vivo', 'Samsung', 'Pixel', 'iPhone']
-    orders = Order.objects.select_related('user', 'shipping_address', 'delivery_option').prefetch_related('orderitem_set__product')
-    orders = Order.objects.all().order_by('-id')
+    orders = Order.objects.select_related('user', 'shipping_address').order_by('-id')
     
     # Apply filters
     selected_brand = request.GET.get('brand', '')
@@ -325,9 +402,8 @@ def admin_order_detail(request, order_id):
             messages.error(request, 'Status parameter is missing.')
             return redirect('admin_order_detail', order_id=order_id)
         if status in valid_statuses:
+            # The Order pre_save hook stamps date_shipped on the move to SHIPPED
             order.status = status
-            if status == 'SHIPPED':
-                order.date_shipped = timezone.now()
             order.save()
             messages.success(request, f'Order {order.id} status updated to {status}.')
             return redirect('admin_order_detail', order_id=order_id)
@@ -350,9 +426,8 @@ def admin_order_update_status(request, order_id):
         messages.error(request, 'Status parameter is missing.')
         return redirect('admin_order_list')
     if status in valid_statuses:
+        # The Order pre_save hook stamps date_shipped on the move to SHIPPED
         order.status = status
-        if status == 'SHIPPED':
-            order.date_shipped = timezone.now()
         order.save()
         messages.success(request, f'Order {order.id} status updated to {status}.')
     else:
@@ -363,7 +438,7 @@ def admin_order_update_status(request, order_id):
 @role_required(['ADMIN', 'MANAGER'])
 def admin_product_list(request):
     products = Product.objects.all()
-    categories = Category.objects.all()
+    categories = category_registry.all()
     search_query = request.GET.get('q', '').strip()
     category_id = request.GET.get('category', '')
     stock_status = request.GET.get('stock', '')
@@ -371,7 +446,7 @@ def admin_product_list(request):
 
     # Search
     if search_query:
-        products = products.filter(name__icontains=search_query)
+        products = filter_products(products, search_query)
     # Filter by category
     if category_id:
         products = products.filter(category_id=category_id)
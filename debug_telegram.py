@@ -6,12 +6,14 @@ Use this script to diagnose and fix Telegram bot issues in Proxmox environments
 
 import os
 import sys
-import requests
-import json
 import time
 import logging
 from datetime import datetime
 
+import requests
+
+from payment.telegram import API_URL, TelegramError, get_client, get_telegram_config
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,9 +27,9 @@ logger = logging.getLogger(__name__)
 
 class TelegramBotDebugger:
     def __init__(self):
-        self.bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc')
-        self.chat_id = os.environ.get('TELEGRAM_CHAT_ID', '-4862435107')
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self.bot_token, self.chat_id = get_telegram_config()
+        self.api_url = os.environ.get('TELEGRAM_API_URL', API_URL)
+        self.client = get_client()
         
     def test_bot_connection(self):
         """Test basic bot connectivity"""
@@ -36,26 +38,14 @@ class TelegramBotDebugger:
         
         try:
             # Test bot info
-            response = requests.get(f"{self.base_url}/getMe", timeout=10)
-            if response.status_code == 200:
-                bot_info = response.json()
-                if bot_info.get('ok'):
-                    print(f"✅ Bot connected successfully!")
-                    print(f"   Bot Name: {bot_info['result']['first_name']}")
-                    print(f"   Username: @{bot_info['result']['username']}")
-                    print(f"   Bot ID: {bot_info['result']['id']}")
-                    return True
-                else:
-                    print(f"❌ Bot API error: {bot_info.get('description', 'Unknown error')}")
-                    return False
-            else:
-                print(f"❌ HTTP error {response.status_code}: {response.text}")
-                return False
+            bot_info = self.client.call('getMe', http_method='get')
+            print(f"✅ Bot connected successfully!")
+            print(f"   Bot Name: {bot_info['first_name']}")
+            print(f"   Username: @{bot_info['username']}")
+            print(f"   Bot ID: {bot_info['id']}")
+            return True
                 
-        except requests.exceptions.Timeout:
-            print("❌ Connection timeout - check network connectivity")
-            return False
-        except requests.exceptions.RequestException as e:
+        except TelegramError as e:
             print(f"❌ Connection error: {e}")
             return False
     
@@ -66,28 +56,15 @@ class TelegramBotDebugger:
         
         try:
             # Test chat info
-            response = requests.get(f"{self.base_url}/getChat", 
-                                  params={'chat_id': self.chat_id}, 
-                                  timeout=10)
-            
-            if response.status_code == 200:
-                chat_info = response.json()
-                if chat_info.get('ok'):
-                    chat = chat_info['result']
-                    print(f"✅ Chat access successful!")
-                    print(f"   Chat Type: {chat['type']}")
-                    print(f"   Chat ID: {chat['id']}")
-                    if chat['type'] in ['group', 'supergroup']:
-                        print(f"   Group Name: {chat.get('title', 'N/A')}")
-                    return True
-                else:
-                    print(f"❌ Chat access error: {chat_info.get('description', 'Unknown error')}")
-                    return False
-            else:
-                print(f"❌ HTTP error {response.status_code}: {response.text}")
-                return False
+            chat = self.client.call('getChat', {'chat_id': self.chat_id}, http_method='get')
+            print(f"✅ Chat access successful!")
+            print(f"   Chat Type: {chat['type']}")
+            print(f"   Chat ID: {chat['id']}")
+            if chat['type'] in ['group', 'supergroup']:
+                print(f"   Group Name: {chat.get('title', 'N/A')}")
+            return True
                 
-        except Exception as e:
+        except TelegramError as e:
             print(f"❌ Chat access error: {e}")
             return False
     
@@ -99,31 +76,12 @@ class TelegramBotDebugger:
         test_message = f"🧪 Test message from Proxmox environment\n⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n🔧 Debug session active"
         
         try:
-            response = requests.post(f"{self.base_url}/sendMessage", 
-                                   data={
-                                       'chat_id': self.chat_id,
-                                       'text': test_message,
-                                       'parse_mode': 'Markdown'
-                                   }, 
-                                   timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('ok'):
-                    print("✅ Test message sent successfully!")
-                    print(f"   Message ID: {result['result']['message_id']}")
-                    return True
-                else:
-                    print(f"❌ Message sending error: {result.get('description', 'Unknown error')}")
-                    return False
-            else:
-                print(f"❌ HTTP error {response.status_code}: {response.text}")
-                return False
+            result = self.client.send_message(self.chat_id, test_message)
+            print("✅ Test message sent successfully!")
+            print(f"   Message ID: {result['message_id']}")
+            return True
                 
-        except requests.exceptions.Timeout:
-            print("❌ Message sending timeout")
-            return False
-        except Exception as e:
+        except TelegramError as e:
             print(f"❌ Message sending error: {e}")
             return False
     
@@ -135,7 +93,8 @@ class TelegramBotDebugger:
         # Test DNS resolution
         try:
             import socket
-            socket.gethostbyname('api.telegram.org')
+            from urllib.parse import urlsplit
+            socket.gethostbyname(urlsplit(self.api_url).hostname)
             print("✅ DNS resolution successful")
         except Exception as e:
             print(f"❌ DNS resolution failed: {e}")
@@ -143,7 +102,7 @@ class TelegramBotDebugger:
         
         # Test HTTP connectivity
         try:
-            response = requests.get('https://api.telegram.org', timeout=10)
+            response = requests.get(self.api_url, timeout=10)
             print(f"✅ HTTP connectivity successful (Status: {response.status_code})")
             return True
         except Exception as e:
@@ -175,29 +134,19 @@ class TelegramBotDebugger:
         print("=" * 40)
         
         try:
-            response = requests.get(f"{self.base_url}/getUpdates", timeout=10)
-            if response.status_code == 200:
-                updates = response.json()
-                if updates.get('ok'):
-                    recent_updates = updates['result']
-                    print(f"Found {len(recent_updates)} recent updates")
-                    
-                    for i, update in enumerate(recent_updates[-5:], 1):  # Show last 5
-                        if 'message' in update:
-                            msg = update['message']
-                            chat = msg['chat']
-                            print(f"  {i}. Chat ID: {chat['id']}, Type: {chat['type']}")
-                            if chat['type'] in ['group', 'supergroup']:
-                                print(f"     Group: {chat.get('title', 'N/A')}")
-                    return True
-                else:
-                    print(f"❌ Error getting updates: {updates.get('description', 'Unknown error')}")
-                    return False
-            else:
-                print(f"❌ HTTP error {response.status_code}: {response.text}")
-                return False
+            recent_updates = self.client.call('getUpdates', http_method='get')
+            print(f"Found {len(recent_updates)} recent updates")
+            
+            for i, update in enumerate(recent_updates[-5:], 1):  # Show last 5
+                if 'message' in update:
+                    msg = update['message']
+                    chat = msg['chat']
+                    print(f"  {i}. Chat ID: {chat['id']}, Type: {chat['type']}")
+                    if chat['type'] in ['group', 'supergroup']:
+                        print(f"     Group: {chat.get('title', 'N/A')}")
+            return True
                 
-        except Exception as e:
+        except TelegramError as e:
             print(f"❌ Error getting updates: {e}")
             return False
     
@@ -207,6 +156,7 @@ class TelegramBotDebugger:
         print("=" * 50)
         print(f"Bot Token: {self.bot_token[:20]}...")
         print(f"Chat ID: {self.chat_id}")
+        print(f"API URL: {self.api_url}")
         print("=" * 50)
         
         tests = [
@@ -154,7 +154,27 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'static/images')
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# The cache must be shared by every worker: the reference-data version
+# stamps in store/registry.py and the dashboard's recompute locks in
+# custom_auth/dashboard.py rely on it. Redis when REDIS_URL is set, otherwise
+# a table in the main database (created by migration store/0019)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
 CART_SESSION_ID = 'cart'
+CART_TOTALS_SESSION_ID = 'cart_totals'
 CSRF_COOKIE_SECURE = False  # Set to True in production
 CSRF_TRUSTED_ORIGINS = ['https://bbu-d104-g5.thavrak-lab.xyz']
 CSRF_TRUSTED_ORIGINS = ['https://shop-racw.onrender.com']
@@ -3,7 +3,7 @@
 Script to get Telegram group chat ID for order notifications
 """
 
-import requests
+from payment.telegram import TelegramError, get_client
 
 def get_group_chat_id():
     """
@@ -19,74 +19,53 @@ def get_group_chat_id():
     print("5. Run this script to get the group chat ID")
     print()
     
-    bot_token = '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc'
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
-    
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
+        updates = get_client().call('getUpdates', http_method='get')
+        if updates:
+            print("📱 Recent messages to your bot:")
+            print("-" * 30)
             
-            if data['ok'] and data['result']:
-                print("📱 Recent messages to your bot:")
-                print("-" * 30)
-                
-                group_found = False
-                for update in data['result']:
-                    if 'message' in update:
-                        message = update['message']
-                        chat = message['chat']
-                        
-                        if chat['type'] == 'group' or chat['type'] == 'supergroup':
-                            group_found = True
-                            print(f"🏷️  Group Name: {chat.get('title', 'N/A')}")
-                            print(f"🆔 Group Chat ID: {chat['id']}")
-                            print(f"📝 Chat Type: {chat['type']}")
-                            print(f"👤 From: {message.get('from', {}).get('first_name', 'N/A')}")
-                            print("-" * 30)
-                
-                if not group_found:
-                    print("❌ No group messages found.")
-                    print()
-                    print("To add your bot to a group:")
-                    print("1. Open Telegram")
-                    print("2. Go to your group")
-                    print("3. Click on group name → Add members")
-                    print("4. Search for @Getme_Phone_Shop_bot")
-                    print("5. Add the bot to the group")
-                    print("6. Send a message in the group")
-                    print("7. Run this script again")
-            else:
-                print("❌ No recent messages found.")
-                print("Make sure your bot is added to the group and someone sent a message.")
-        else:
-            print(f"❌ Error: {response.status_code}")
-            print(response.text)
+            group_found = False
+            for update in updates:
+                if 'message' in update:
+                    message = update['message']
+                    chat = message['chat']
+                    
+                    if chat['type'] == 'group' or chat['type'] == 'supergroup':
+                        group_found = True
+                        print(f"🏷️  Group Name: {chat.get('title', 'N/A')}")
+                        print(f"🆔 Group Chat ID: {chat['id']}")
+                        print(f"📝 Chat Type: {chat['type']}")
+                        print(f"👤 From: {message.get('from', {}).get('first_name', 'N/A')}")
+                        print("-" * 30)
             
-    except Exception as e:
+            if not group_found:
+                print("❌ No group messages found.")
+                print()
+                print("To add your bot to a group:")
+                print("1. Open Telegram")
+                print("2. Go to your group")
+                print("3. Click on group name → Add members")
+                print("4. Search for @Getme_Phone_Shop_bot")
+                print("5. Add the bot to the group")
+                print("6. Send a message in the group")
+                print("7. Run this script again")
+        else:
+            print("❌ No recent messages found.")
+            print("Make sure your bot is added to the group and someone sent a message.")
+        
+    except TelegramError as e:
         print(f"❌ Error: {e}")
 
 def test_group_message(chat_id):
     """
     Send a test message to the group
     """
-    bot_token = '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc'
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    data = {
-        'chat_id': chat_id,
-        'text': '🔔 Test message from your e-commerce site! Order notifications will be sent to this group. 🎉',
-        'parse_mode': 'Markdown'
-    }
-    
     try:
-        response = requests.post(url, data=data)
-        if response.status_code == 200:
-            print("✅ Test message sent successfully to the group!")
-        else:
-            print(f"❌ Error sending test message: {response.text}")
-    except Exception as e:
-        print(f"❌ Error: {e}")
+        get_client().send_message(chat_id, '🔔 Test message from your e-commerce site! Order notifications will be sent to this group. 🎉')
+        print("✅ Test message sent successfully to the group!")
+    except TelegramError as e:
+        print(f"❌ Error sending test message: {e}")
 
 if __name__ == "__main__":
     print("🏪 Telegram Group Chat ID for Order Notifications")
@@ -1,6 +1,7 @@
 # payment/admin.py
 from django.contrib import admin
-from .models import DeliveryOption, ShippingAddress, Order, OrderItem
+from django.utils import timezone
+from .models import DeliveryOption, ShippingAddress, Order, OrderItem, NotificationOutbox
 
 @admin.register(DeliveryOption)
 class DeliveryOptionAdmin(admin.ModelAdmin):
@@ -16,10 +17,11 @@ class ShippingAddressAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'shipping_address', 'delivery_option', 'payment_method', 'amount_paid', 'status', 'date_ordered']
+    list_display = ['id', 'user', 'shipping_address', 'delivery_option', 'payment_method', 'item_count', 'grand_total', 'amount_paid', 'status', 'date_ordered']
     list_filter = ['status', 'payment_method', 'date_ordered']
+    list_select_related = ['user', 'shipping_address', 'delivery_option']
     search_fields = ['user__username', 'shipping_address__shipping_full_name']
-    readonly_fields = ['date_ordered', 'date_shipped']
+    readonly_fields = ['date_ordered', 'date_shipped', 'idempotency_key', 'items_subtotal', 'item_count', 'grand_total']
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -33,4 +35,19 @@ class OrderItemAdmin(admin.ModelAdmin):
 
     def get_total(self, obj):
         return obj.get_total()
-    get_total.short_description = 'Total'
\ No newline at end of file
+    get_total.short_description = 'Total'
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event', 'order', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'event']
+    search_fields = ['order__id', 'last_error']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=NotificationOutbox.StatusChoices.SENT).update(
+            status=NotificationOutbox.StatusChoices.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Requeued {count} notifications.")
+    requeue.short_description = 'Retry selected notifications'
@@ -71,10 +71,25 @@ class ShippingForm(forms.ModelForm):
         }
   
 
+import uuid
+
 from django import forms
-import qrcode
-from io import BytesIO
-import base64
+from django.core import signing
+
+IDEMPOTENCY_SALT = 'payment.checkout.idempotency'
+
+
+def issue_idempotency_key():
+    """A fresh checkout key, signed so the server only accepts keys it issued."""
+    return signing.Signer(salt=IDEMPOTENCY_SALT).sign(uuid.uuid4().hex)
+
+
+def read_idempotency_key(value):
+    """The raw key inside a signed checkout key, or None if it is missing or forged."""
+    try:
+        return signing.Signer(salt=IDEMPOTENCY_SALT).unsign(value or '')
+    except signing.BadSignature:
+        return None
 
 class PaymentForm(forms.Form):
     PAYMENT_METHODS = [
@@ -90,23 +105,20 @@ class PaymentForm(forms.Form):
         }),
         label='Choose Payment Method'
     )
+    # One key per rendered checkout form; Order.idempotency_key is unique, so
+    # a resubmitted form finds the order it already created
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False)
 
-    def get_qr_code(self):
-        """Generate a QR code image for bank transfer."""
-        # Sample payment data; replace with your bank details
-        payment_data = "Bank: Example Bank\nAccount: 1234567890\nAmount: ${order['grand_total']:.2f}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(payment_data)
-        qr.make(fit=True)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault('idempotency_key', issue_idempotency_key())
 
-        # Create image and encode as base64
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
\ No newline at end of file
+    def clean_idempotency_key(self):
+        key = read_idempotency_key(self.cleaned_data.get('idempotency_key'))
+        if key is None:
+            # Re-render with a new key so the next submission can go through
+            self.data = self.data.copy()
+            self.data[self.add_prefix('idempotency_key')] = issue_idempotency_key()
+            raise forms.ValidationError("This checkout form has expired. Please review your order and submit it again.")
+        return key
@@ -0,0 +1,57 @@
+# payment/invoices.py
+"""
+Rendered invoices for finalized orders.
+
+DELIVERED and CANCELLED orders no longer change, so their invoice body is
+rendered once and kept in the cache backend. The key is built from the
+order id, its status and the time of its last status change, so reopening
+an order moves it to a new key and stale HTML is never served. The same
+version backs the invoice page's ETag.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Order
+
+FINAL_STATUSES = (Order.StatusChoices.DELIVERED, Order.StatusChoices.CANCELLED)
+CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Bump when payment/invoice.html changes so cached bodies are re-rendered
+TEMPLATE_VERSION = 1
+
+
+def invoice_version(order):
+    """Version string of a finalized order's invoice, or None while it can still change."""
+    if order.status not in FINAL_STATUSES:
+        return None
+    changed = int(order.status_changed_at.timestamp() * 1_000_000)
+    return f"{order.pk}:{order.status}:{changed}:v{TEMPLATE_VERSION}"
+
+
+def invoice_etag(order, *variants):
+    """Strong validator for an invoice page; ``variants`` are the other inputs the page depends on."""
+    version = invoice_version(order)
+    if version is None:
+        return None
+    return hashlib.sha1(':'.join([version, *map(str, variants)]).encode()).hexdigest()
+
+
+def _render(order_id):
+    order = Order.objects.select_related('user', 'shipping_address', 'delivery_option').get(pk=order_id)
+    items = order.orderitem_set.select_related('product')
+    return render_to_string('payment/invoice.html', {'order': order, 'items': items})
+
+
+def render_invoice(order):
+    """Invoice body HTML for ``order``, from the cache when it is finalized."""
+    version = invoice_version(order)
+    if version is None:
+        return _render(order.pk)
+    key = f"invoice:{version}"
+    html = cache.get(key)
+    if html is None:
+        html = _render(order.pk)
+        cache.set(key, str(html), CACHE_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from payment.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored subtotal, item count and grand total of every order from its items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders updated per UPDATE statement")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Order.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += Order.refresh_totals(batch)
+            last_id = batch[-1]
+        self.stdout.write(f"Refreshed totals for {updated} orders")
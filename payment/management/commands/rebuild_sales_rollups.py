@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.rollups import rebuild, refresh_day
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups from orders (every day, or only the days given)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--day', action='append', default=[], help="Only rebuild this day (YYYY-MM-DD); repeatable")
+        parser.add_argument('--verbose', action='store_true', help="Print each day as it is rebuilt")
+
+    def handle(self, *args, **options):
+        if options['day']:
+            for value in options['day']:
+                try:
+                    day = date.fromisoformat(value)
+                except ValueError:
+                    raise CommandError(f"Invalid day: {value}")
+                self.stdout.write(f"{day}: {refresh_day(day)} orders")
+            return
+        days, orders = rebuild(self.stdout if options['verbose'] else None)
+        self.stdout.write(f"Rebuilt sales rollups for {days} days ({orders} orders)")
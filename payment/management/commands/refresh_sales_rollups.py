@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.rollups import refresh_marked
+
+
+class Command(BaseCommand):
+    help = "Refresh the daily sales rollups of days with new order changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Refresh every day marked so far, then exit")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when nothing is marked")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            consumed = refresh_marked(batch_size)
+            if consumed:
+                self.stdout.write(f"Refreshed sales rollups for {consumed} changes")
+            if consumed < batch_size:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
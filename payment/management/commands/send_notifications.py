@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.notifications import deliver_due
+
+
+class Command(BaseCommand):
+    help = "Deliver pending order notifications from the outbox to Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain everything currently due, then exit")
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when nothing is due")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            sent, failed = deliver_due(batch_size)
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+            if sent + failed < batch_size:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.telegram import CircuitOpenError, TelegramClient, TelegramError
+from payment.telegram_stub import StubTelegramServer
+
+
+class Command(BaseCommand):
+    help = "Run a local Telegram Bot API stub, or benchmark the Telegram client against one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+        parser.add_argument('--fail-rate', type=float, default=0.0, help="Fraction of requests answered with 502")
+        parser.add_argument('--rate-limit', type=int, default=None, help="Messages per second per chat before 429")
+        parser.add_argument('--bench', type=int, default=0, metavar='N', help="Send N messages through the client and report")
+        parser.add_argument('--chats', type=int, default=1, help="Spread --bench messages over this many chats")
+        parser.add_argument('--no-client-limit', action='store_true', help="Disable the client's token buckets during --bench")
+
+    def handle(self, *args, **options):
+        server = StubTelegramServer(
+            port=0 if options['bench'] else options['port'],
+            latency=options['latency'],
+            fail_rate=options['fail_rate'],
+            rate_limit=options['rate_limit'],
+        ).start()
+        try:
+            if options['bench']:
+                self.bench(server, options['bench'], options['chats'], not options['no_client_limit'])
+                return
+            self.stdout.write(f"Telegram stub listening on {server.url}")
+            self.stdout.write(f"Use it with: TELEGRAM_API_URL={server.url}")
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+
+    def bench(self, server, count, chats, rate_limit):
+        client = TelegramClient('stub-token', api_url=server.url, rate_limit=rate_limit)
+        sent = failed = short_circuited = 0
+        started = time.monotonic()
+        for i in range(count):
+            try:
+                client.send_message(str(1000 + i % chats), f"Benchmark message {i}")
+                sent += 1
+            except CircuitOpenError:
+                short_circuited += 1
+            except TelegramError as e:
+                failed += 1
+                if e.retry_after:
+                    time.sleep(e.retry_after)
+        elapsed = time.monotonic() - started
+        client.close()
+        self.stdout.write(f"Sent {sent}, failed {failed}, skipped by open circuit {short_circuited} in {elapsed:.2f}s ({sent / elapsed:.1f} msg/s)")
+        self.stdout.write(
+            f"Stub saw {server.requests} requests over {server.connections} connections, "
+            f"{server.failures} injected failures, {server.rate_limited} rate limited"
+        )
+        self.stdout.write(f"Circuit breaker: {client.breaker.state}")
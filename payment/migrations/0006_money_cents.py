@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+import store.money
+from store.money import Money
+
+MONEY_FIELDS = [
+    ('deliveryoption', 'DeliveryOption', 'price'),
+    ('order', 'Order', 'amount_paid'),
+    ('orderitem', 'OrderItem', 'price'),
+]
+
+
+def copy_field(model_name, source, target, convert):
+    def run(apps, schema_editor):
+        Model = apps.get_model('payment', model_name)
+        rows = Model.objects.exclude(**{f'{source}__isnull': True}).values_list('id', source)
+        Model.objects.bulk_update(
+            [Model(id=pk, **{target: convert(value)}) for pk, value in rows.iterator()],
+            [target],
+            batch_size=500,
+        )
+    return run
+
+
+def to_cents(value):
+    return Money.parse(value).cents
+
+
+def to_dollars(cents):
+    return Money(cents).to_decimal()
+
+
+def money_operations(model, model_name, field):
+    temp = f'{field}_cents'
+    return [
+        migrations.AddField(model, temp, models.BigIntegerField(null=True)),
+        migrations.AlterField(model, field, models.DecimalField(max_digits=10, decimal_places=2, null=True)),
+        migrations.RunPython(
+            copy_field(model_name, field, temp, to_cents),
+            copy_field(model_name, temp, field, to_dollars),
+        ),
+        migrations.RemoveField(model, field),
+        migrations.RenameField(model, temp, field),
+        migrations.AlterField(model, field, store.money.MoneyField()),
+    ]
+
+
+class Migration(migrations.Migration):
+    """Store delivery prices, order totals and line prices as integer cents."""
+
+    dependencies = [
+        ('payment', '0005_notificationoutbox'),
+        ('store', '0018_money_cents'),
+    ]
+
+    operations = [
+        operation
+        for model, model_name, field in MONEY_FIELDS
+        for operation in money_operations(model, model_name, field)
+    ]
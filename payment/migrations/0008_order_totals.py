@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 19:14
+
+import store.money
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    # The totals as payment.models.order_totals computed them at this point,
+    # written out against the historical models so later changes cannot
+    # alter what this migration does
+    Order = apps.get_model('payment', 'Order')
+    OrderItem = apps.get_model('payment', 'OrderItem')
+    DeliveryOption = apps.get_model('payment', 'DeliveryOption')
+
+    items = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    subtotal = Coalesce(
+        models.Subquery(
+            items.annotate(
+                total=models.Sum(models.F('price') * models.F('quantity'), output_field=store.money.MoneyField()),
+            ).values('total'),
+            output_field=store.money.MoneyField(),
+        ),
+        models.Value(0),
+        output_field=store.money.MoneyField(),
+    )
+    count = Coalesce(
+        models.Subquery(items.annotate(units=models.Sum('quantity')).values('units')),
+        models.Value(0),
+        output_field=models.PositiveIntegerField(),
+    )
+    delivery = Coalesce(
+        models.Subquery(DeliveryOption.objects.filter(pk=models.OuterRef('delivery_option_id')).values('price')),
+        models.Value(0),
+        output_field=store.money.MoneyField(),
+    )
+    Order.objects.update(
+        items_subtotal=subtotal,
+        item_count=count,
+        grand_total=models.ExpressionWrapper(subtotal + delivery, output_field=store.money.MoneyField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0007_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='grand_total',
+            field=store.money.MoneyField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_subtotal',
+            field=store.money.MoneyField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
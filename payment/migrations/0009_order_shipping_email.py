@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_shipping_email(apps, schema_editor):
+    Order = apps.get_model('payment', 'Order')
+    ShippingAddress = apps.get_model('payment', 'ShippingAddress')
+    email = ShippingAddress.objects.filter(pk=models.OuterRef('shipping_address_id')).values('shipping_email')
+    Order.objects.filter(shipping_address__isnull=False).update(shipping_email=models.Subquery(email))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0008_order_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='shipping_email',
+            field=models.EmailField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(copy_shipping_email, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shipping_email', '-id'], name='order_email_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 19:16
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def seed_status_changed_at(apps, schema_editor):
+    Order = apps.get_model('payment', 'Order')
+    Order.objects.update(status_changed_at=Coalesce('date_shipped', 'date_ordered'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0009_order_shipping_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(seed_status_changed_at, migrations.RunPython.noop),
+    ]
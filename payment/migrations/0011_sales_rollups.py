@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-18 19:21
+
+import django.db.models.deletion
+import django.utils.timezone
+import store.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0010_order_status_changed_at'),
+        ('store', '0018_money_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyOrderSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('amount_paid', store.money.MoneyField(default=0)),
+                ('items_subtotal', store.money.MoneyField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Order Sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='daily_order_sales_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', store.money.MoneyField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('order_amount', store.money.MoneyField(default=0)),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='store.category')),
+                ('product', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='store.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Sales',
+                'indexes': [models.Index(fields=['date', 'status'], name='daily_sales_date_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 19:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0011_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dailysales',
+            name='order_amount',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0012_dailysales_line_revenue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='date_ordered',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+import store.money
+
+
+def build_sales_rollups(apps, schema_editor):
+    # Builds every day at once from the historical models, so later changes
+    # to payment.rollups or the live models cannot change what this does
+    Order = apps.get_model('payment', 'Order')
+    OrderItem = apps.get_model('payment', 'OrderItem')
+    SalesRollupDay = apps.get_model('payment', 'SalesRollupDay')
+    DailyOrderSales = apps.get_model('payment', 'DailyOrderSales')
+    DailySales = apps.get_model('payment', 'DailySales')
+
+    DailyOrderSales.objects.all().delete()
+    DailySales.objects.all().delete()
+    SalesRollupDay.objects.all().delete()
+
+    order_rows = list(
+        Order.objects.annotate(day=TruncDate('date_ordered'))
+        .values('day', 'status')
+        .annotate(order_count=Count('id'), amount_paid=Sum('amount_paid'), items_subtotal=Sum('items_subtotal'))
+        .order_by()
+    )
+    SalesRollupDay.objects.bulk_create([SalesRollupDay(date=day) for day in {row['day'] for row in order_rows}])
+    DailyOrderSales.objects.bulk_create(
+        [DailyOrderSales(date=row.pop('day'), **row) for row in order_rows], batch_size=500,
+    )
+
+    line_rows = (
+        OrderItem.objects.annotate(day=TruncDate('order__date_ordered'))
+        .values('day', 'order__status', 'product_id', 'product__category_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=store.money.MoneyField()),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    DailySales.objects.bulk_create(
+        [
+            DailySales(
+                date=row['day'],
+                status=row['order__status'],
+                product_id=row['product_id'],
+                category_id=row['product__category_id'],
+                units=row['units'],
+                revenue=row['revenue'],
+                order_count=row['order_count'],
+            )
+            for row in line_rows.iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0013_order_date_ordered_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_sales_rollups, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
 # payment/models.py
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save, post_migrate
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, pre_save, post_migrate
 from django.dispatch import receiver
 from django.utils import timezone
+from store.money import Money, MoneyField
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,7 +13,7 @@ logger = logging.getLogger(__name__)
 class DeliveryOption(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = MoneyField()
     estimated_days = models.PositiveIntegerField()
     is_active = models.BooleanField(default=True)
 
@@ -21,6 +23,12 @@ class DeliveryOption(models.Model):
     class Meta:
         verbose_name_plural = "Delivery Options"
 
+@receiver(post_save, sender=DeliveryOption)
+@receiver(post_delete, sender=DeliveryOption)
+def invalidate_delivery_option_registry(sender, instance, **kwargs):
+    from .registry import delivery_option_registry
+    delivery_option_registry.invalidate()
+
 class ShippingAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     shipping_full_name = models.CharField(max_length=255)
@@ -93,18 +101,81 @@ class Order(models.Model):
     shipping_address = models.ForeignKey(ShippingAddress, on_delete=models.SET_NULL, null=True)
     delivery_option = models.ForeignKey(DeliveryOption, on_delete=models.SET_NULL, null=True)
     payment_method = models.CharField(max_length=20, choices=PaymentMethodChoices.choices, default=PaymentMethodChoices.COD)
-    amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
-    date_ordered = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    amount_paid = MoneyField()
+    date_ordered = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Indexed for the dashboard's live count of pending orders
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING, db_index=True)
     date_shipped = models.DateTimeField(blank=True, null=True)
+    # Bumped on every status change; versions the cached invoice (payment.invoices)
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Key of the checkout form that created this order; see PaymentForm
+    idempotency_key = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
+    # Denormalized from the order's items so order lists never load them;
+    # written at checkout and kept in step by refresh_totals()
+    items_subtotal = MoneyField(default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    grand_total = MoneyField(default=0, editable=False)
+    # Copied from shipping_address so invoice lookups by email stay on one indexed table
+    shipping_email = models.EmailField(max_length=255, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shipping_email', '-id'], name='order_email_recent_idx'),
+        ]
+
+    # Fields whose loaded values the pre_save hook compares against
+    TRACKED_FIELDS = ('status', 'shipping_address_id', 'delivery_option_id')
 
     def __str__(self):
         return f'Order - {self.id}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_values(fields)
+
+    def _remember_values(self, fields=None):
+        """Record the database values of tracked fields (``fields`` limits which ones)."""
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        deferred = self.get_deferred_fields()
+        names = {self._meta.get_field(name).attname for name in fields} if fields is not None else None
+        for attname in self.TRACKED_FIELDS:
+            if attname not in deferred and (names is None or attname in names):
+                loaded[attname] = getattr(self, attname)
+
+    def loaded_values(self):
+        """
+        Tracked field values as last read from or written to the database.
+
+        Only an instance that was not loaded by a query (or had these fields
+        deferred) costs a SELECT. Returns None if the row no longer exists.
+        """
+        loaded = self.__dict__.get('_loaded_values', {})
+        missing = [attname for attname in self.TRACKED_FIELDS if attname not in loaded]
+        if missing:
+            row = type(self)._default_manager.filter(pk=self.pk).values(*missing).first()
+            if row is None:
+                return None
+            loaded = {**loaded, **row}
+        return loaded
+
+    @classmethod
+    def refresh_totals(cls, order_ids=None):
+        """
+        Recompute the stored totals of ``order_ids`` (all orders if None) from
+        their items and delivery option, in a single UPDATE. Returns the
+        number of orders updated.
+        """
+        orders = cls.objects.all() if order_ids is None else cls.objects.filter(pk__in=order_ids)
+        return orders.update(**order_totals())
+
     def get_total(self):
-        item_total = sum(item.get_total() for item in self.orderitem_set.all())
-        delivery_cost = self.delivery_option.price if self.delivery_option else 0
-        return item_total + delivery_cost
+        return self.grand_total
     @property
     def is_paid(self):
         return self.status in [self.StatusChoices.SHIPPED, self.StatusChoices.DELIVERED]
@@ -115,25 +186,217 @@ class Order(models.Model):
     def is_get_total(self):
         return self.get_total()
 
+def order_totals():
+    """
+    Correlated subqueries for Order.update() that compute each order's
+    items_subtotal, item_count and grand_total.
+    """
+    items = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    subtotal = Coalesce(
+        models.Subquery(
+            items.annotate(total=models.Sum(models.F('price') * models.F('quantity'), output_field=MoneyField())).values('total'),
+            output_field=MoneyField(),
+        ),
+        models.Value(0),
+        output_field=MoneyField(),
+    )
+    count = Coalesce(
+        models.Subquery(items.annotate(units=models.Sum('quantity')).values('units')),
+        models.Value(0),
+        output_field=models.PositiveIntegerField(),
+    )
+    delivery = Coalesce(
+        models.Subquery(DeliveryOption.objects.filter(pk=models.OuterRef('delivery_option_id')).values('price')),
+        models.Value(0),
+        output_field=MoneyField(),
+    )
+    return {
+        'items_subtotal': subtotal,
+        'item_count': count,
+        'grand_total': models.ExpressionWrapper(subtotal + delivery, output_field=MoneyField()),
+    }
+
 @receiver(pre_save, sender=Order)
 def set_shipped_date_on_update(sender, instance, **kwargs):
+    if not instance.pk and instance.shipping_address and not instance.shipping_email:
+        instance.shipping_email = instance.shipping_address.shipping_email
     if instance.pk:
-        try:
-            obj = sender._default_manager.get(pk=instance.pk)
-            if instance.status == 'SHIPPED' and obj.status != 'SHIPPED':
-                instance.date_shipped = timezone.now()
-                logger.info(f"Set shipped date for order {instance.id}")
-        except sender.DoesNotExist:
+        # Compare with the values the instance was loaded with instead of re-reading the row
+        old = instance.loaded_values()
+        if old is None:
             logger.warning(f"Order {instance.pk} not found during pre_save")
+            return
+        if instance.status != old['status']:
+            instance.status_changed_at = timezone.now()
+        if instance.status == 'SHIPPED' and old['status'] != 'SHIPPED':
+            instance.date_shipped = timezone.now()
+            logger.info(f"Set shipped date for order {instance.id}")
+        if instance.shipping_address_id != old['shipping_address_id']:
+            instance.shipping_email = instance.shipping_address.shipping_email if instance.shipping_address else ''
+        if instance.delivery_option_id != old['delivery_option_id']:
+            delivery_cost = instance.delivery_option.price if instance.delivery_option else Money()
+            instance.grand_total = instance.items_subtotal + delivery_cost
+
+@receiver(post_save, sender=Order)
+def remember_saved_order_values(sender, instance, update_fields=None, **kwargs):
+    instance._remember_values(update_fields)
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_order_sales_rollup(sender, instance, **kwargs):
+    from .rollups import mark_stale, order_day
+    mark_stale(day=order_day(instance))
+
+@receiver(post_save, sender=ShippingAddress)
+def sync_order_shipping_email(sender, instance, created, **kwargs):
+    if not created:
+        Order.objects.filter(shipping_address=instance).exclude(shipping_email=instance.shipping_email).update(shipping_email=instance.shipping_email)
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey('store.Product', on_delete=models.SET_NULL, null=True)
     quantity = models.PositiveIntegerField(default=1)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = MoneyField()
 
     def __str__(self):
         return f'OrderItem - {self.id}'
 
     def get_total(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals(sender, instance, **kwargs):
+    # bulk_create skips this; checkout writes the totals itself
+    Order.refresh_totals([instance.order_id])
+    from .rollups import mark_stale
+    # The worker looks up the order's day, so saving a line costs no extra read
+    mark_stale(order_id=instance.order_id)
+
+class NotificationOutbox(models.Model):
+    """
+    Order events waiting to be pushed to Telegram.
+
+    Rows are written in the same transaction as the order and drained by
+    ``python manage.py send_notifications``, so checkout never waits on the
+    Telegram API.
+    """
+    class StatusChoices(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        SENT = 'SENT', 'Sent'
+        DEAD = 'DEAD', 'Dead-lettered'
+
+    event = models.CharField(max_length=50)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Notification Outbox"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event} - {self.id} ({self.status})'
+
+class SalesRollupMark(models.Model):
+    """
+    A day, or the day of an order, whose sales rollups are out of date.
+
+    Written in the same transaction as the order change, so every committed
+    change leaves a mark, and consumed by ``python manage.py
+    refresh_sales_rollups``. Marks are only ever inserted by requests, so
+    concurrent checkouts never wait on each other here.
+    """
+    date = models.DateField(null=True, blank=True)
+    # Not a foreign key: the order may be gone by the time the mark is read
+    order_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Stale sales rollup {self.date or f"of order {self.order_id}"}'
+
+class SalesRollupDay(models.Model):
+    """
+    One row per day that has sales rollups.
+
+    ``payment.rollups.refresh_day`` locks this row while it rebuilds the
+    day's DailyOrderSales and DailySales rows, so concurrent refreshes of the
+    same day run one after another. Only the rollup worker takes this lock.
+    """
+    date = models.DateField(primary_key=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Sales rollup {self.date}'
+
+class DailyOrderSales(models.Model):
+    """Orders per day and status: how many, what was paid, and the items part of that."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.StatusChoices.choices)
+    order_count = models.PositiveIntegerField(default=0)
+    amount_paid = MoneyField(default=0)
+    items_subtotal = MoneyField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily Order Sales"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_order_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.status}: {self.order_count} orders'
+
+class DailySales(models.Model):
+    """
+    Order lines per day, status, product and product category.
+
+    ``revenue`` is what the lines sold for (price x quantity); delivery fees
+    are not in it and come from DailyOrderSales. Product and category keep
+    the ids they had when the day was last refreshed, even after deletion.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.StatusChoices.choices)
+    product = models.ForeignKey('store.Product', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    category = models.ForeignKey('store.Category', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = MoneyField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily Sales"
+        indexes = [
+            models.Index(fields=['date', 'status'], name='daily_sales_date_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.status} product {self.product_id}: {self.units} units'
+
+class DailyCategorySales(models.Model):
+    """
+    Orders per day, status and product category.
+
+    ``order_count`` counts each order once however many of the category's
+    products it holds, which summing DailySales.order_count over products
+    would not; ``revenue`` is the category's line revenue, as in DailySales.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.StatusChoices.choices)
+    category = models.ForeignKey('store.Category', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = MoneyField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily Category Sales"
+        indexes = [
+            models.Index(fields=['date', 'status'], name='daily_category_sales_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.status} category {self.category_id}: {self.order_count} orders'
@@ -0,0 +1,176 @@
+# payment/notifications.py
+"""
+Telegram order notifications delivered through the NotificationOutbox table.
+
+Checkout calls ``enqueue_order_notification`` inside its transaction; the
+``send_notifications`` management command calls ``deliver_due`` to push
+pending rows to Telegram with retries, exponential backoff and
+dead-lettering. Rows claimed together are coalesced into digest messages,
+so a burst of orders costs a few sends rather than one per order.
+
+Only network and 5xx errors spend a retry. A digest Telegram rejects (4xx)
+is split and its rows sent one at a time, so a bad payload dead-letters its
+own row and nothing else; rate limiting and an open circuit postpone rows
+without charging an attempt.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NotificationOutbox
+from .telegram import (
+    CircuitOpenError, TelegramError, TelegramRateLimited, TelegramRejected, build_digests, escape_markdown,
+    send_message,
+)
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order_created'
+
+MAX_ATTEMPTS = 8
+BASE_DELAY = 30           # seconds before the first retry, doubled per attempt
+MAX_DELAY = 60 * 60
+LEASE_SECONDS = 120       # how long a claimed row is hidden from other workers
+
+
+def format_order_message(order, order_items, shipping_address, delivery_option, payment_method):
+    """Concise group message for a new order; customer-entered text is Markdown-escaped"""
+    total_items = sum(item.quantity for item in order_items)
+    esc = escape_markdown
+
+    message = f"🛒 *NEW ORDER #{order.id}*\n\n"
+    message += f"💰 *Total:* ${order.amount_paid:.2f}\n"
+    message += f"📦 *Items:* {total_items} item{'s' if total_items != 1 else ''}\n"
+    message += f"👤 *Customer:* {esc(shipping_address.shipping_full_name)}\n"
+    message += f"📧 *Email:* {esc(shipping_address.shipping_email)}\n"
+    message += f"🚚 *Delivery:* {esc(delivery_option.name)}\n"
+    message += f"💳 *Payment:* {esc(payment_method)}\n\n"
+
+    message += f"📋 *Order Items:*\n"
+    for item in order_items:
+        message += f"• {esc(item.product.name)} x{item.quantity}\n"
+
+    message += f"\n📍 *Address:* {esc(shipping_address.shipping_city)}, {esc(shipping_address.shipping_country)}"
+    return message
+
+
+def send_telegram_message(text):
+    """Single delivery attempt; raises TelegramError on any failure"""
+    return send_message(text)
+
+
+def digest_header(count):
+    return f"🧾 *{count} NEW ORDERS*"
+
+
+def send_telegram_notification(order, order_items, shipping_address, delivery_option, payment_method):
+    """Send an order notification immediately (used by the manual test endpoint)"""
+    try:
+        send_telegram_message(format_order_message(order, order_items, shipping_address, delivery_option, payment_method))
+        logger.info(f"Telegram notification sent successfully for order {order.id}")
+        return True
+    except TelegramError as e:
+        logger.error(f"Error sending Telegram notification: {str(e)}")
+        return False
+
+
+def enqueue_order_notification(order, order_items, shipping_address, delivery_option, payment_method):
+    """Record a new-order event; call inside the transaction that creates the order"""
+    return NotificationOutbox.objects.create(
+        event=ORDER_CREATED,
+        order=order,
+        payload={'text': format_order_message(order, order_items, shipping_address, delivery_option, payment_method)},
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY))
+
+
+def claim_due(batch_size):
+    """Lease up to ``batch_size`` due rows so concurrent workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.StatusChoices.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return rows
+
+
+def _postpone(rows, e, now):
+    # Not the rows' fault (rate limited, or Telegram known to be down): wait without spending an attempt
+    for row in rows:
+        row.last_error = str(e)[:1000]
+        row.next_attempt_at = now + timedelta(seconds=e.retry_after or BASE_DELAY)
+        row.save(update_fields=['last_error', 'next_attempt_at'])
+
+
+def _dead_letter(row, e):
+    row.attempts += 1
+    row.last_error = str(e)[:1000]
+    row.status = NotificationOutbox.StatusChoices.DEAD
+    row.save(update_fields=['attempts', 'last_error', 'status'])
+    logger.error(f"Notification {row.id} dead-lettered: {row.last_error}")
+
+
+def _retry_later(rows, e, now):
+    for row in rows:
+        row.attempts += 1
+        row.last_error = str(e)[:1000]
+        if row.attempts >= MAX_ATTEMPTS:
+            row.status = NotificationOutbox.StatusChoices.DEAD
+            logger.error(f"Notification {row.id} dead-lettered after {row.attempts} attempts: {row.last_error}")
+        else:
+            row.next_attempt_at = now + retry_delay(row.attempts)
+            logger.warning(f"Notification {row.id} failed (attempt {row.attempts}/{MAX_ATTEMPTS}): {row.last_error}")
+        row.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver(rows, text, send=send_telegram_message):
+    """
+    Send ``text`` on behalf of ``rows`` and record the outcome; returns how many rows were sent.
+
+    When Telegram rejects a message covering several rows, each row is sent
+    on its own instead, and only the rows rejected by themselves are
+    dead-lettered.
+    """
+    now = timezone.now()
+    try:
+        send(text)
+    except (CircuitOpenError, TelegramRateLimited) as e:
+        _postpone(rows, e, now)
+        return 0
+    except TelegramRejected as e:
+        if len(rows) == 1:
+            _dead_letter(rows[0], e)
+            return 0
+        logger.warning(f"Digest of notifications {', '.join(str(row.id) for row in rows)} rejected, sending them one by one: {e}")
+        return sum(deliver([row], row.payload.get('text', ''), send=send) for row in rows)
+    except Exception as e:
+        _retry_later(rows, e, now)
+        return 0
+    NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+        status=NotificationOutbox.StatusChoices.SENT, sent_at=now, last_error='', attempts=F('attempts') + 1
+    )
+    logger.info(f"Notifications {', '.join(str(row.id) for row in rows)} sent")
+    return len(rows)
+
+
+def deliver_due(batch_size=20, send=send_telegram_message):
+    """Claim one batch and deliver it as digest messages; returns (sent, failed) row counts"""
+    sent = failed = 0
+    rows = claim_due(batch_size)
+    for text, indexes in build_digests([row.payload.get('text', '') for row in rows], header=digest_header):
+        digest_rows = [rows[i] for i in indexes]
+        delivered = deliver(digest_rows, text, send=send)
+        sent += delivered
+        failed += len(digest_rows) - delivered
+    return sent, failed
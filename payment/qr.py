@@ -0,0 +1,82 @@
+# payment/qr.py
+"""
+Bank-transfer QR codes, rendered once per payload and served from their own URL.
+
+Rendered images are kept in a bounded in-process LRU keyed by the transfer
+details, so the same amount is encoded once per worker. The ``payment_qr``
+view only encodes the requester's own checkout total (their cart plus the
+chosen delivery option), never an amount taken from the URL, and answers
+the browser's revalidation with a 304 while that total is unchanged. Checkout pages link to the image
+instead of inlining a base64 PNG.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.urls import reverse
+from django.utils.http import urlencode
+
+# Sample payment details; replace with your bank details
+BANK_NAME = 'Example Bank'
+BANK_ACCOUNT = '1234567890'
+
+CACHE_SIZE = 256
+MAX_AMOUNT = Decimal('1000000')
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def parse_amount(value):
+    """Normalize an amount to two decimal places; raises ValueError if it is not a sane price."""
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite() or amount < 0 or amount >= MAX_AMOUNT:
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+
+def payment_payload(amount, bank=BANK_NAME, account=BANK_ACCOUNT):
+    return f"Bank: {bank}\nAccount: {account}\nAmount: ${parse_amount(amount):.2f}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _render(payload, fmt):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buffered = BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathFillImage).save(buffered)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def render_qr(amount, fmt='png', bank=BANK_NAME, account=BANK_ACCOUNT):
+    """Image bytes for a bank-transfer QR code, from the LRU when already rendered."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    return _render(payment_payload(amount, bank, account), fmt)
+
+
+def qr_etag(amount, fmt='png', bank=BANK_NAME, account=BANK_ACCOUNT):
+    """Stable validator for a QR image, derived from its payload without rendering it."""
+    payload = payment_payload(amount, bank, account)
+    return hashlib.sha1(f"{fmt}:{payload}".encode()).hexdigest()
+
+
+def get_qr_url(delivery_option, fmt='svg'):
+    """URL of the checkout QR for the requester's cart with ``delivery_option``."""
+    url = reverse('payment_qr', args=[fmt])
+    return f"{url}?{urlencode({'delivery': delivery_option.pk})}"
+
+
+def cache_info():
+    return _render.cache_info()
@@ -0,0 +1,15 @@
+# payment/registry.py
+from store.registry import ReferenceRegistry
+
+from .models import DeliveryOption
+
+delivery_option_registry = ReferenceRegistry(DeliveryOption)
+
+
+def active_delivery_options():
+    return delivery_option_registry.filter(is_active=True)
+
+
+def get_active_delivery_option(pk):
+    option = delivery_option_registry.get(pk)
+    return option if option is not None and option.is_active else None
@@ -0,0 +1,158 @@
+# payment/rollups.py
+"""
+Daily sales rollups for the admin dashboard and reports.
+
+``DailyOrderSales`` (date x status), ``DailyCategorySales`` (date x status
+x category) and ``DailySales`` (date x status x product x category) hold
+pre-aggregated order figures, so reports read a number of rows that grows
+with days and catalog size, not with orders.
+
+Rollups are kept current one day at a time, off the request path. When an
+order or one of its lines is written, ``mark_stale`` inserts a
+SalesRollupMark in the same transaction; ``python manage.py
+refresh_sales_rollups`` consumes the marks and rebuilds each marked day once
+from Order and OrderItem, however many marks name it. A day holds a bounded
+number of orders, read through the ``date_ordered`` index, and rebuilding it
+(rather than applying deltas) means the rollups cannot drift when a product
+is deleted or recategorized.
+``python manage.py rebuild_sales_rollups`` rebuilds every day.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from store.money import MoneyField
+from .models import (
+    DailyCategorySales, DailyOrderSales, DailySales, Order, OrderItem, SalesRollupDay, SalesRollupMark,
+)
+
+
+def order_day(order):
+    """The rollup day of ``order``: its order date in the current time zone."""
+    return timezone.localdate(order.date_ordered)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def refresh_day(day):
+    """Rebuild the rollup rows of ``day`` from its orders; returns the number of orders."""
+    start, end = _day_bounds(day)
+    with transaction.atomic():
+        SalesRollupDay.objects.get_or_create(date=day)
+        # Lock the day so a concurrent refresh waits instead of interleaving
+        SalesRollupDay.objects.select_for_update().filter(date=day).update(refreshed_at=timezone.now())
+        DailyOrderSales.objects.filter(date=day).delete()
+        DailyCategorySales.objects.filter(date=day).delete()
+        DailySales.objects.filter(date=day).delete()
+
+        orders = Order.objects.filter(date_ordered__gte=start, date_ordered__lt=end)
+        order_rows = list(
+            orders.values('status').annotate(
+                order_count=Count('id'),
+                amount_paid=Sum('amount_paid'),
+                items_subtotal=Sum('items_subtotal'),
+            ).order_by()
+        )
+        if not order_rows:
+            SalesRollupDay.objects.filter(date=day).delete()
+            return 0
+        DailyOrderSales.objects.bulk_create([DailyOrderSales(date=day, **row) for row in order_rows])
+
+        lines = OrderItem.objects.filter(order__in=orders.values('pk'))
+        category_rows = (
+            lines.values('order__status', 'product__category_id')
+            .annotate(
+                order_count=Count('order_id', distinct=True),
+                revenue=Sum(F('price') * F('quantity'), output_field=MoneyField()),
+            )
+            .order_by()
+        )
+        DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(
+                date=day,
+                status=row['order__status'],
+                category_id=row['product__category_id'],
+                order_count=row['order_count'],
+                revenue=row['revenue'],
+            )
+            for row in category_rows
+        ])
+
+        line_rows = (
+            lines.values('order__status', 'product_id', 'product__category_id')
+            .annotate(
+                units=Sum('quantity'),
+                revenue=Sum(F('price') * F('quantity'), output_field=MoneyField()),
+                order_count=Count('order_id', distinct=True),
+            )
+            .order_by()
+        )
+        DailySales.objects.bulk_create([
+            DailySales(
+                date=day,
+                status=row['order__status'],
+                product_id=row['product_id'],
+                category_id=row['product__category_id'],
+                units=row['units'],
+                revenue=row['revenue'],
+                order_count=row['order_count'],
+            )
+            for row in line_rows
+        ])
+        return sum(row['order_count'] for row in order_rows)
+
+
+def mark_stale(day=None, order_id=None):
+    """
+    Record that ``day``, or the day of order ``order_id``, needs refreshing.
+
+    The mark is a plain insert in the caller's transaction: it commits or
+    rolls back with the order change and never waits on another request.
+    """
+    SalesRollupMark.objects.create(date=day, order_id=order_id)
+
+
+def refresh_marked(limit=500):
+    """
+    Refresh every day named by up to ``limit`` marks, oldest first, and
+    delete those marks; returns the number of marks consumed.
+    """
+    marks = list(SalesRollupMark.objects.order_by('pk').values_list('pk', 'date', 'order_id')[:limit])
+    if not marks:
+        return 0
+    days = {day for _, day, _ in marks if day is not None}
+    order_ids = {order_id for _, _, order_id in marks if order_id is not None}
+    if order_ids:
+        days |= {
+            timezone.localdate(date_ordered)
+            for date_ordered in Order.objects.filter(pk__in=order_ids).values_list('date_ordered', flat=True)
+        }
+    with transaction.atomic():
+        # Only these marks: ones written meanwhile are read on the next pass
+        SalesRollupMark.objects.filter(pk__in=[pk for pk, _, _ in marks]).delete()
+        for day in sorted(days):
+            refresh_day(day)
+    return len(marks)
+
+
+def rebuild(stdout=None):
+    """Rebuild every day's rollups; returns (days, orders)."""
+    days = set(
+        Order.objects.annotate(day=TruncDate('date_ordered')).values_list('day', flat=True).distinct()
+    )
+    stale = set(SalesRollupDay.objects.exclude(date__in=days).values_list('date', flat=True))
+    for day in stale:
+        refresh_day(day)
+    orders = 0
+    for day in sorted(days):
+        count = refresh_day(day)
+        orders += count
+        if stdout is not None:
+            stdout.write(f"{day}: {count} orders")
+    return len(days), orders
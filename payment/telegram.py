@@ -0,0 +1,290 @@
+# payment/telegram.py
+"""
+The one Telegram Bot API client used by the shop and its helper scripts.
+
+* A single keep-alive ``requests.Session`` per process, so repeated sends
+  reuse pooled HTTPS connections instead of handshaking every time.
+* Token buckets matching Telegram's documented limits: about 30 messages a
+  second overall, one a second per chat and 20 a minute per group. A 429
+  ``retry_after`` pauses the chat's bucket for the time Telegram asks for.
+* A circuit breaker that fails fast after repeated network or 5xx errors,
+  instead of making every caller wait out the timeout while the API is down.
+* Failures are raised as distinct TelegramError subclasses: ``TelegramRejected``
+  for a request Telegram refuses (4xx; sending it again will not help),
+  ``TelegramRateLimited`` for a 429 and ``CircuitOpenError`` while the
+  breaker is open. A plain TelegramError is a network or 5xx error.
+* ``build_digests`` for coalescing a burst of messages into as few sends as
+  the 4096-character message limit allows.
+
+This module depends only on ``requests`` so the standalone scripts in the
+project root can use it without setting up Django. Point
+``TELEGRAM_API_URL`` at ``payment.telegram_stub`` to exercise it offline.
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.telegram.org'
+REQUEST_TIMEOUT = 10
+MAX_MESSAGE_LENGTH = 4096
+
+GLOBAL_RATE = (30, 30)        # (tokens per second, burst)
+CHAT_RATE = (1, 1)
+GROUP_RATE = (20 / 60, 20)
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 60
+
+DIGEST_SEPARATOR = '\n\n➖➖➖➖➖\n\n'
+
+
+def get_telegram_config():
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc')
+    chat_id = os.environ.get('TELEGRAM_CHAT_ID', '-4862435107')  # Bot Get me Shop group
+    return bot_token, chat_id
+
+
+class TelegramError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(TelegramError):
+    pass
+
+
+class TelegramRateLimited(TelegramError):
+    pass
+
+
+class TelegramRejected(TelegramError):
+    pass
+
+
+def escape_markdown(text):
+    """Escape ``text`` for a message sent with ``parse_mode='Markdown'``."""
+    return re.sub(r'([_*`\[])', r'\\\1', str(text))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep the returned delay."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take one token, returning how many seconds to wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds):
+        """Hand out nothing for ``seconds`` (used when Telegram answers 429)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; one trial call after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            raise CircuitOpenError("Telegram circuit is open", retry_after=retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning(f"Telegram circuit opened after {self._failures} failures")
+                self._opened_at = self._clock()
+                self._trial_running = False
+
+
+class TelegramClient:
+    def __init__(self, bot_token, api_url=API_URL, timeout=REQUEST_TIMEOUT, rate_limit=True,
+                 breaker=None, sleep=time.sleep, pool_size=10):
+        self.bot_token = bot_token
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._global_bucket = TokenBucket(*GLOBAL_RATE)
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def _buckets_for(self, chat_id):
+        chat_id = str(chat_id)
+        with self._lock:
+            buckets = self._chat_buckets.get(chat_id)
+            if buckets is None:
+                buckets = [TokenBucket(*CHAT_RATE)]
+                if chat_id.startswith('-'):
+                    buckets.append(TokenBucket(*GROUP_RATE))
+                self._chat_buckets[chat_id] = buckets
+        return buckets
+
+    def _throttle(self, chat_id):
+        if not self.rate_limit:
+            return
+        buckets = [self._global_bucket] + self._buckets_for(chat_id)
+        wait = max(bucket.reserve() for bucket in buckets)
+        if wait > 0:
+            self._sleep(wait)
+
+    def call(self, method, params=None, http_method='post'):
+        """Call a Bot API method and return its ``result``; raises TelegramError."""
+        self.breaker.before_call()
+        url = f"{self.api_url}/bot{self.bot_token}/{method}"
+        try:
+            if http_method == 'get':
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            else:
+                response = self.session.post(url, data=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            raise TelegramError(f"Telegram request error: {e}") from e
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise TelegramError(f"HTTP error {response.status_code}: {response.text}", status=response.status_code)
+        self.breaker.record_success()
+        try:
+            result = response.json()
+        except ValueError:
+            raise TelegramError(f"HTTP error {response.status_code}: {response.text}", status=response.status_code)
+        if not result.get('ok'):
+            message = f"Telegram API error: {result.get('description', 'Unknown error')}"
+            retry_after = result.get('parameters', {}).get('retry_after')
+            if response.status_code == 429 or retry_after:
+                raise TelegramRateLimited(message, status=response.status_code, retry_after=retry_after)
+            if 400 <= response.status_code < 500:
+                raise TelegramRejected(message, status=response.status_code)
+            raise TelegramError(message, status=response.status_code)
+        return result.get('result')
+
+    def send_message(self, chat_id, text, parse_mode='Markdown'):
+        self._throttle(chat_id)
+        params = {'chat_id': chat_id, 'text': text}
+        if parse_mode:
+            params['parse_mode'] = parse_mode
+        try:
+            return self.call('sendMessage', params)
+        except TelegramRateLimited as e:
+            # Only Telegram's own rate limiting pauses the chat; an open
+            # breaker is about the API, not this chat
+            if e.retry_after:
+                for bucket in self._buckets_for(chat_id):
+                    bucket.pause(e.retry_after)
+            raise
+
+    def close(self):
+        self.session.close()
+
+
+def build_digests(texts, header=None, limit=MAX_MESSAGE_LENGTH):
+    """
+    Group ``texts`` into as few messages as fit in ``limit`` characters.
+
+    Returns ``(message, indexes)`` pairs so callers can tell which inputs went
+    out in each message. A single text is passed through unchanged; a text
+    too long on its own is sent alone and left for Telegram to reject.
+    """
+    if len(texts) <= 1:
+        return [(text, [i]) for i, text in enumerate(texts)]
+    groups, current, length = [], [], 0
+    for i, text in enumerate(texts):
+        extra = len(text) + (len(DIGEST_SEPARATOR) if current else 0)
+        if current and length + extra > limit:
+            groups.append(current)
+            current, length = [], 0
+            extra = len(text)
+        current.append(i)
+        length += extra
+    groups.append(current)
+
+    digests = []
+    for indexes in groups:
+        body = DIGEST_SEPARATOR.join(texts[i] for i in indexes)
+        if header and len(indexes) > 1:
+            title = header(len(indexes)) + '\n\n'
+            if len(title) + len(body) <= limit:
+                body = title + body
+        digests.append((body, indexes))
+    return digests
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, configured from TELEGRAM_BOT_TOKEN and TELEGRAM_API_URL."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            bot_token, _ = get_telegram_config()
+            _client = TelegramClient(bot_token, api_url=os.environ.get('TELEGRAM_API_URL', API_URL))
+        return _client
+
+
+def send_message(text, chat_id=None, parse_mode='Markdown'):
+    """Send ``text`` to ``chat_id`` (default: the configured shop group)."""
+    if chat_id is None:
+        _, chat_id = get_telegram_config()
+    return get_client().send_message(chat_id, text, parse_mode=parse_mode)
@@ -0,0 +1,167 @@
+# payment/telegram_stub.py
+"""
+A local stand-in for the Telegram Bot API, for exercising the notification
+pipeline without network access or a real bot.
+
+It answers ``getMe``, ``getChat``, ``getUpdates`` and ``sendMessage`` in the
+Bot API's JSON shape (rejecting Markdown it cannot parse with a 400, as
+Telegram does), records every delivered message, and can inject
+latency, random 5xx failures and 429 rate limiting. It speaks HTTP/1.1
+keep-alive and counts TCP connections, so connection reuse is measurable.
+
+    python manage.py telegram_stub --port 8081 --fail-rate 0.2
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python manage.py send_notifications
+"""
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+PATH_RE = re.compile(r'^/bot(?P<token>[^/]+)/(?P<method>\w+)$')
+MARKDOWN_ESCAPE_RE = re.compile(r'\\[_*`\[]')
+
+
+def markdown_parses(text):
+    """Rough check of legacy Markdown: every unescaped entity marker is closed."""
+    text = MARKDOWN_ESCAPE_RE.sub('', text)
+    return all(text.count(marker) % 2 == 0 for marker in ('*', '_', '`'))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle's
+        # algorithm and delayed ACKs add ~40ms to every keep-alive response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode()
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body))
+        return url.path, params
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        path, params = self._params()
+        status, payload = self.server.dispatch(path, params)
+        self._reply(status, payload)
+
+
+class StubTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0,
+                 rate_limit=None, retry_after=1, seed=None):
+        super().__init__((host, port), StubHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit      # messages per second per chat, None for unlimited
+        self.retry_after = retry_after
+        self.messages = []
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._recent = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _over_limit(self, chat_id, now):
+        recent = self._recent[chat_id]
+        while recent and now - recent[0] >= 1:
+            recent.popleft()
+        if len(recent) >= self.rate_limit:
+            return True
+        recent.append(now)
+        return False
+
+    def dispatch(self, path, params):
+        if self.latency:
+            time.sleep(self.latency)
+        match = PATH_RE.match(path)
+        if not match:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        method = match['method']
+        with self._lock:
+            self.requests += 1
+            if self.fail_rate and self._random.random() < self.fail_rate:
+                self.failures += 1
+                return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+
+            if method == 'getMe':
+                return 200, {'ok': True, 'result': {
+                    'id': 1, 'is_bot': True, 'first_name': 'Stub Bot', 'username': 'stub_bot',
+                }}
+            if method == 'getChat':
+                chat_id = params.get('chat_id', '')
+                chat_type = 'group' if str(chat_id).startswith('-') else 'private'
+                return 200, {'ok': True, 'result': {'id': chat_id, 'type': chat_type, 'title': 'Stub Chat'}}
+            if method == 'getUpdates':
+                return 200, {'ok': True, 'result': []}
+            if method == 'sendMessage':
+                chat_id, text = params.get('chat_id'), params.get('text')
+                if not chat_id or not text:
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message text is empty'}
+                if params.get('parse_mode') == 'Markdown' and not markdown_parses(text):
+                    return 400, {'ok': False, 'error_code': 400, 'description': "Bad Request: can't parse entities"}
+                if self.rate_limit and self._over_limit(chat_id, time.monotonic()):
+                    self.rate_limited += 1
+                    return 429, {
+                        'ok': False, 'error_code': 429,
+                        'description': f'Too Many Requests: retry after {self.retry_after}',
+                        'parameters': {'retry_after': self.retry_after},
+                    }
+                self.messages.append({'chat_id': chat_id, 'text': text})
+                return 200, {'ok': True, 'result': {
+                    'message_id': len(self.messages), 'chat': {'id': chat_id}, 'text': text,
+                }}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
@@ -1,3 +1,665 @@
-from django.test import TestCase
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Category, Product
+from store.money import Money
+from store.tests import MigrationTestCase
+from . import invoices, rollups
+from .forms import issue_idempotency_key
+from .models import (
+    DailyCategorySales, DailyOrderSales, DailySales, DeliveryOption, NotificationOutbox, Order, OrderItem, SalesRollupDay,
+    SalesRollupMark, ShippingAddress,
+)
+from .notifications import MAX_ATTEMPTS, deliver_due, digest_header, retry_delay
+from .qr import qr_etag
+from .registry import delivery_option_registry
+from .telegram import (
+    CircuitBreaker, CircuitOpenError, TelegramClient, TelegramError, TelegramRateLimited, TelegramRejected,
+    TokenBucket, build_digests, escape_markdown,
+)
+from .telegram_stub import StubTelegramServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1.0)
+        clock.now += 10
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_pause(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=5, clock=clock)
+        bucket.pause(3)
+        self.assertEqual(bucket.reserve(), 4.0)
+        clock.now += 4
+        self.assertEqual(bucket.reserve(), 1.0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_allows_one_trial(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError) as cm:
+            breaker.before_call()
+        self.assertEqual(cm.exception.retry_after, 60)
+
+        clock.now += 60
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.before_call()
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+
+class BuildDigestsTests(SimpleTestCase):
+    def test_single_text_passes_through(self):
+        self.assertEqual(build_digests(['hello'], header=digest_header), [('hello', [0])])
+
+    def test_groups_within_limit(self):
+        texts = ['a' * 40, 'b' * 40, 'c' * 40]
+        digests = build_digests(texts, limit=100)
+        self.assertEqual([indexes for _, indexes in digests], [[0, 1], [2]])
+        self.assertTrue(all(len(message) <= 100 for message, _ in digests))
+
+    def test_header_only_when_it_fits(self):
+        digests = build_digests(['a', 'b'], header=digest_header)
+        self.assertTrue(digests[0][0].startswith(digest_header(2)))
+        digests = build_digests(['a' * 45, 'b' * 45], header=digest_header, limit=105)
+        self.assertFalse(digests[0][0].startswith(digest_header(2)))
+
+
+class TelegramStubTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.server = StubTelegramServer().start()
+        self.addCleanup(self.server.stop)
+        self.slept = []
+        self.client = TelegramClient('token', api_url=self.server.url, sleep=self.slept.append)
+        self.addCleanup(self.client.close)
+
+
+class TelegramClientTests(TelegramStubTestMixin, SimpleTestCase):
+    def test_rejected_message_does_not_trip_breaker(self):
+        for _ in range(10):
+            with self.assertRaises(TelegramRejected):
+                self.client.send_message('-1', 'unclosed *bold')
+        self.assertEqual(self.client.breaker.state, 'closed')
+        self.client.send_message('-1', escape_markdown('unclosed *bold'))
+        self.assertEqual(self.server.messages[-1]['text'], 'unclosed \\*bold')
+
+    def test_rate_limit_pauses_chat(self):
+        self.server.rate_limit, self.server.retry_after = 1, 7
+        self.client.rate_limit = False
+        self.client.send_message('-1', 'first')
+        with self.assertRaises(TelegramRateLimited) as cm:
+            self.client.send_message('-1', 'second')
+        self.assertEqual(cm.exception.retry_after, 7)
+        self.assertGreaterEqual(self.client._buckets_for('-1')[0].reserve(), 7)
+
+    def test_open_circuit_does_not_pause_chat(self):
+        self.client.breaker = CircuitBreaker(failure_threshold=1)
+        self.client.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            self.client.send_message('-1', 'hello')
+        # Only the token this send reserved, not the breaker's 60s
+        self.assertLessEqual(self.client._buckets_for('-1')[0].reserve(), 1.0)
+
+
+class DigestDeliveryTests(TelegramStubTestMixin, TestCase):
+    def send(self, text):
+        return self.client.send_message('-1', text)
+
+    def test_poisoned_row_does_not_sink_digest(self):
+        rows = [
+            NotificationOutbox.objects.create(event='order_created', payload={'text': text})
+            for text in ['order one', 'order by john_smith', 'order three']
+        ]
+        self.client.rate_limit = False
+
+        self.assertEqual(deliver_due(send=self.send), (2, 1))
+        self.assertEqual([m['text'] for m in self.server.messages], ['order one', 'order three'])
+        statuses = {row.id: row.status for row in NotificationOutbox.objects.all()}
+        self.assertEqual(statuses, {
+            rows[0].id: NotificationOutbox.StatusChoices.SENT,
+            rows[1].id: NotificationOutbox.StatusChoices.DEAD,
+            rows[2].id: NotificationOutbox.StatusChoices.SENT,
+        })
+
+    def test_rate_limited_rows_keep_their_attempts(self):
+        row = NotificationOutbox.objects.create(event='order_created', payload={'text': 'order'})
+        self.server.rate_limit, self.server.retry_after = 1, 30
+        self.client.rate_limit = False
+        self.client.send_message('-1', 'fills the chat limit')
+
+        self.assertEqual(deliver_due(send=self.send), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual(row.status, NotificationOutbox.StatusChoices.PENDING)
+        self.assertEqual(row.attempts, 0)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+
+class OutboxRetryTests(TestCase):
+    def setUp(self):
+        self.row = NotificationOutbox.objects.create(event='order_created', payload={'text': 'order'})
+        self.send = mock.Mock(side_effect=TelegramError('Telegram API error 502: Bad Gateway'))
+
+    def make_due(self):
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+
+    def test_failures_back_off_then_dead_letter(self):
+        for attempt in range(1, MAX_ATTEMPTS):
+            before = timezone.now()
+            self.assertEqual(deliver_due(send=self.send), (0, 1))
+            self.row.refresh_from_db()
+            self.assertEqual((self.row.status, self.row.attempts), (NotificationOutbox.StatusChoices.PENDING, attempt))
+            self.assertGreaterEqual(self.row.next_attempt_at, before + retry_delay(attempt))
+            # Not due again until the backoff has passed
+            self.assertEqual(deliver_due(send=self.send), (0, 0))
+            self.make_due()
+
+        self.assertEqual(deliver_due(send=self.send), (0, 1))
+        self.row.refresh_from_db()
+        self.assertEqual((self.row.status, self.row.attempts), (NotificationOutbox.StatusChoices.DEAD, MAX_ATTEMPTS))
+        self.assertIn('502', self.row.last_error)
+
+        self.make_due()
+        self.assertEqual(deliver_due(send=self.send), (0, 0))
+        self.assertEqual(self.send.call_count, MAX_ATTEMPTS)
+
+    def test_retry_that_succeeds_is_sent(self):
+        self.assertEqual(deliver_due(send=self.send), (0, 1))
+        self.make_due()
+        self.send.side_effect = None
+        self.assertEqual(deliver_due(send=self.send), (1, 0))
+        self.row.refresh_from_db()
+        self.assertEqual((self.row.status, self.row.attempts, self.row.last_error), (NotificationOutbox.StatusChoices.SENT, 2, ''))
+
+
+class OrderStatusTimestampTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(amount_paid=Money(1000))
+        self.created_at = self.order.status_changed_at
+
+    def reload(self):
+        return Order.objects.get(pk=self.order.pk)
+
+    def test_resave_without_status_change_keeps_timestamps(self):
+        order = self.reload()
+        order.payment_method = Order.PaymentMethodChoices.BANK_TRANSFER
+        order.save()
+        order = self.reload()
+        self.assertEqual(order.status_changed_at, self.created_at)
+        self.assertIsNone(order.date_shipped)
+
+    def test_shipping_stamps_both_once(self):
+        order = self.reload()
+        order.status = 'SHIPPED'
+        order.save()
+        shipped = self.reload()
+        self.assertGreater(shipped.status_changed_at, self.created_at)
+        self.assertIsNotNone(shipped.date_shipped)
+
+        # Saving SHIPPED again is not a transition
+        shipped.status = 'SHIPPED'
+        shipped.save()
+        again = self.reload()
+        self.assertEqual((again.status_changed_at, again.date_shipped), (shipped.status_changed_at, shipped.date_shipped))
+
+    def test_other_transitions_leave_date_shipped(self):
+        order = self.reload()
+        order.status = 'CANCELLED'
+        order.save()
+        order = self.reload()
+        self.assertGreater(order.status_changed_at, self.created_at)
+        self.assertIsNone(order.date_shipped)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        category = Category.objects.create(name='Pixel')
+        self.products = [
+            Product.objects.create(name=f'Pixel {i}', category=category, price=Money(10000), Sale_price=Money(9000))
+            for i in range(3)
+        ]
+
+    def place_order(self, status='DELIVERED'):
+        order = Order.objects.create(user=self.user, amount_paid=Money(30500), status=status)
+        for product in self.products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=Money(10000))
+        return order
+
+    def test_order_change_only_marks_its_day(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = self.place_order()
+        # Nothing reads or locks the rollups on the request path
+        self.assertEqual(callbacks, [])
+        self.assertFalse(SalesRollupDay.objects.exists())
+        self.assertEqual(SalesRollupMark.objects.count(), 4)
+
+        with mock.patch.object(rollups, 'refresh_day', wraps=rollups.refresh_day) as refresh_day:
+            self.assertEqual(rollups.refresh_marked(), 4)
+        refresh_day.assert_called_once_with(rollups.order_day(order))
+        self.assertFalse(SalesRollupMark.objects.exists())
+
+        day_sales = DailyOrderSales.objects.get(status='DELIVERED')
+        self.assertEqual((day_sales.order_count, day_sales.amount_paid, day_sales.items_subtotal), (1, Money(30500), Money(30000)))
+        self.assertEqual(DailySales.objects.filter(status='DELIVERED', revenue=Money(10000), units=1).count(), 3)
+        # One order, however many of the category's products it holds
+        category_sales = DailyCategorySales.objects.get()
+        self.assertEqual((category_sales.order_count, category_sales.revenue), (1, Money(30000)))
+
+    def test_line_save_does_not_read_order(self):
+        order = self.place_order()
+        with self.assertNumQueries(3):
+            # INSERT, the order totals UPDATE and the mark
+            OrderItem.objects.create(order_id=order.pk, product=self.products[0], quantity=1, price=Money(10000))
+
+    def test_status_change_moves_rollup(self):
+        order = self.place_order(status='PENDING')
+        rollups.refresh_marked()
+        order.status = 'CANCELLED'
+        order.save()
+        self.assertEqual(rollups.refresh_marked(), 1)
+        self.assertEqual(list(DailyOrderSales.objects.values_list('status', 'order_count')), [('CANCELLED', 1)])
+        self.assertEqual(set(DailySales.objects.values_list('status', flat=True)), {'CANCELLED'})
+
+    def test_rolled_back_change_leaves_no_mark(self):
+        try:
+            with transaction.atomic():
+                self.place_order()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(SalesRollupMark.objects.exists())
+        self.assertEqual(rollups.refresh_marked(), 0)
+
+    def test_marks_consumed_in_batches(self):
+        order = self.place_order()
+        self.assertEqual(rollups.refresh_marked(limit=3), 3)
+        self.assertEqual(SalesRollupMark.objects.count(), 1)
+        call_command('refresh_sales_rollups', '--once', stdout=io.StringIO())
+        self.assertFalse(SalesRollupMark.objects.exists())
+        self.assertEqual(DailyOrderSales.objects.get().date, rollups.order_day(order))
+
+
+class OrderTotalsMigrationTests(MigrationTestCase):
+    migrate_from = [('payment', '0007_order_idempotency_key')]
+    migrate_to = [('payment', '0008_order_totals')]
+
+    def test_existing_orders_get_their_totals(self):
+        DeliveryOption = self.apps.get_model('payment', 'DeliveryOption')
+        Order = self.apps.get_model('payment', 'Order')
+        OrderItem = self.apps.get_model('payment', 'OrderItem')
+        delivery = DeliveryOption.objects.create(name='Courier', price=Money(500), estimated_days=2)
+        order = Order.objects.create(amount_paid=Money(2500), delivery_option=delivery)
+        OrderItem.objects.create(order=order, quantity=2, price=Money(1000))
+        empty = Order.objects.create(amount_paid=Money(0))
+
+        Order = self.migrate().get_model('payment', 'Order')
+        totals = {row['pk']: row for row in Order.objects.values('pk', 'items_subtotal', 'item_count', 'grand_total')}
+        self.assertEqual(totals[order.pk], {'pk': order.pk, 'items_subtotal': Money(2000), 'item_count': 2, 'grand_total': Money(2500)})
+        self.assertEqual(totals[empty.pk], {'pk': empty.pk, 'items_subtotal': Money(0), 'item_count': 0, 'grand_total': Money(0)})
+
+
+class SalesRollupMigrationTests(MigrationTestCase):
+    migrate_from = [('payment', '0013_order_date_ordered_index')]
+    migrate_to = [('payment', '0014_rebuild_sales_rollups')]
+
+    def test_existing_orders_are_rolled_up(self):
+        Order = self.apps.get_model('payment', 'Order')
+        OrderItem = self.apps.get_model('payment', 'OrderItem')
+        order = Order.objects.create(amount_paid=Money(2500), items_subtotal=Money(2000), status='DELIVERED')
+        OrderItem.objects.create(order=order, quantity=2, price=Money(1000))
+        OrderItem.objects.create(order=order, quantity=1, price=Money(300))
+        Order.objects.create(amount_paid=Money(700), items_subtotal=Money(700), status='DELIVERED')
+        Order.objects.create(amount_paid=Money(900), items_subtotal=Money(900), status='PENDING')
+
+        apps = self.migrate()
+        day = timezone.localdate(order.date_ordered)
+        rows = {
+            row.status: (row.date, row.order_count, row.amount_paid, row.items_subtotal)
+            for row in apps.get_model('payment', 'DailyOrderSales').objects.all()
+        }
+        self.assertEqual(rows, {
+            'DELIVERED': (day, 2, Money(3200), Money(2700)),
+            'PENDING': (day, 1, Money(900), Money(900)),
+        })
+        line = apps.get_model('payment', 'DailySales').objects.get()
+        self.assertEqual((line.units, line.revenue, line.order_count), (3, Money(2300), 1))
+        self.assertEqual(list(apps.get_model('payment', 'SalesRollupDay').objects.values_list('date', flat=True)), [day])
+
+
+class CategorySalesMigrationTests(MigrationTestCase):
+    migrate_from = [('payment', '0016_sales_rollup_marks'), ('store', '0020_product_quantity_index')]
+    migrate_to = [('payment', '0017_daily_category_sales')]
+
+    def test_orders_are_counted_once_per_category(self):
+        Category = self.apps.get_model('store', 'Category')
+        Product = self.apps.get_model('store', 'Product')
+        Order = self.apps.get_model('payment', 'Order')
+        OrderItem = self.apps.get_model('payment', 'OrderItem')
+        pixel = Category.objects.create(name='Pixel')
+        order = Order.objects.create(amount_paid=Money(2500), status='DELIVERED')
+        for name, price in (('Pixel 8', 1000), ('Pixel Buds', 300)):
+            product = Product.objects.create(name=name, category=pixel, price=Money(price), Sale_price=Money(price))
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=Money(price))
+
+        apps = self.migrate()
+        row = apps.get_model('payment', 'DailyCategorySales').objects.get()
+        self.assertEqual(
+            (row.date, row.status, row.category_id, row.order_count, row.revenue),
+            (timezone.localdate(order.date_ordered), 'DELIVERED', pixel.pk, 1, Money(2600)),
+        )
+
+
+class CheckoutTestMixin:
+    SHIPPING = {
+        'shipping_full_name': 'Dara Sok',
+        'shipping_email': 'dara@example.com',
+        'shipping_address1': '1 Main St',
+        'shipping_city': 'Phnom Penh',
+        'shipping_state': 'PP',
+        'shipping_zipcode': '12000',
+        'shipping_country': 'Cambodia',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.buyer = User.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client.force_login(self.buyer)
+        self.phone = Product.objects.create(name='Phone', price=Money(10000), Sale_price=Money(9000), Is_sale=True, quantity=5)
+        self.case = Product.objects.create(name='Case', price=Money(1000), Sale_price=Money(900), Is_sale=True, quantity=2)
+
+    def add_to_cart(self, product, quantity):
+        self.client.post(reverse('cart_add'), {'action': 'post', 'product_id': product.pk, 'product_qty': quantity})
+
+    def checkout(self, key):
+        return self.client.post(reverse('checkout'), {**self.SHIPPING, 'payment_method': 'cod', 'idempotency_key': key})
+
+    def stock(self):
+        return dict(Product.objects.values_list('id', 'quantity'))
+
+
+class CheckoutStockTests(CheckoutTestMixin, TestCase):
+    def test_order_decrements_stock(self):
+        self.add_to_cart(self.phone, 2)
+        self.add_to_cart(self.case, 1)
+        response = self.checkout(issue_idempotency_key())
+        self.assertRedirects(response, reverse('payment_success'), fetch_redirect_response=False)
+        self.assertEqual(self.stock(), {self.phone.pk: 3, self.case.pk: 1})
+        order = Order.objects.get()
+        self.assertEqual((order.item_count, order.items_subtotal), (3, Money(21000)))
+
+    def test_short_line_rolls_back_the_order(self):
+        self.add_to_cart(self.phone, 2)
+        self.add_to_cart(self.case, 2)
+        # Someone else buys a case after the cart's stock check passed
+        Product.objects.filter(pk=self.case.pk).update(quantity=1)
+        addresses = ShippingAddress.objects.count()
+        with mock.patch('cart.cart.Cart.validate_stock', return_value=[]):
+            response = self.checkout(issue_idempotency_key())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Insufficient stock for Case')
+        self.assertEqual(self.stock(), {self.phone.pk: 5, self.case.pk: 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(ShippingAddress.objects.count(), addresses)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+
+class CheckoutQueryTests(CheckoutTestMixin, TestCase):
+    # Session, user, idempotency lookup and the cart's products; then, in
+    # savepoints, the address, order, rollup mark, stock check and update,
+    # the order lines, the outbox row and the session save. Must not grow
+    # with the number of lines
+    CHECKOUT_QUERIES = 16
+
+    def test_query_count_is_fixed(self):
+        # Loaded once per process, not per checkout
+        delivery_option_registry.invalidate()
+        delivery_option_registry.all()
+        for lines in (1, 8):
+            with self.subTest(lines=lines):
+                for i in range(lines):
+                    self.add_to_cart(Product.objects.create(
+                        name=f'Item {lines}-{i}', price=Money(1000), Sale_price=Money(900), Is_sale=True, quantity=3,
+                    ), 1)
+                with self.assertNumQueries(self.CHECKOUT_QUERIES):
+                    response = self.checkout(issue_idempotency_key())
+                self.assertRedirects(response, reverse('payment_success'), fetch_redirect_response=False)
+                self.assertEqual(Order.objects.latest('pk').item_count, lines)
+
+
+class CheckoutIdempotencyTests(CheckoutTestMixin, TestCase):
+    def test_resubmitted_form_returns_the_same_order(self):
+        self.add_to_cart(self.phone, 2)
+        key = issue_idempotency_key()
+        self.checkout(key)
+        order = Order.objects.get()
+
+        # The cart is empty now, but the replay is answered before it is read
+        response = self.checkout(key)
+        self.assertRedirects(response, reverse('payment_success'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['order_id'], order.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock()[self.phone.pk], 3)
+
+    def test_concurrent_duplicate_does_not_decrement_twice(self):
+        self.add_to_cart(self.phone, 2)
+        key = issue_idempotency_key()
+        self.checkout(key)
+        order = Order.objects.get()
+        self.add_to_cart(self.phone, 2)
+
+        # The duplicate misses the early replay check, as if both requests
+        # arrived together, and loses on the unique key instead
+        with mock.patch('payment.views._replayed_order', side_effect=[None, order]):
+            response = self.checkout(key)
+        self.assertRedirects(response, reverse('payment_success'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertEqual(self.stock()[self.phone.pk], 3)
+
+    def test_new_form_places_a_new_order(self):
+        self.add_to_cart(self.phone, 1)
+        self.checkout(issue_idempotency_key())
+        self.add_to_cart(self.phone, 1)
+        self.checkout(issue_idempotency_key())
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self.stock()[self.phone.pk], 3)
+
+
+class PaymentQRTests(CheckoutTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # The delivery option registry is invalidated when the save commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.courier = DeliveryOption.objects.create(name='Courier', price=Money(500), estimated_days=2)
+        self.add_to_cart(self.phone, 2)
+
+    def qr(self, headers=None, **params):
+        return self.client.get(reverse('payment_qr', args=['svg']), params, headers=headers)
+
+    def test_encodes_the_cart_total_not_a_given_amount(self):
+        response = self.qr(delivery=self.courier.pk, amount='0.01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{qr_etag(Money(20500), "svg")}"')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_unchanged_total_revalidates(self):
+        etag = self.qr(delivery=self.courier.pk)['ETag']
+        self.assertEqual(self.qr({'If-None-Match': etag}, delivery=self.courier.pk).status_code, 304)
+        self.add_to_cart(self.case, 1)
+        self.assertEqual(self.qr({'If-None-Match': etag}, delivery=self.courier.pk).status_code, 200)
+
+    def test_needs_a_cart_and_a_delivery_option(self):
+        self.assertEqual(self.qr(delivery=self.courier.pk + 1).status_code, 404)
+        self.assertEqual(self.qr().status_code, 404)
+        self.client.post(reverse('cart_delete'), {'product_id': self.phone.pk})
+        self.assertEqual(self.qr(delivery=self.courier.pk).status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.qr(delivery=self.courier.pk).status_code, 302)
+
+
+class InvoiceListTests(TestCase):
+    # Session, user and the page of orders; the first page of a customer
+    # with more than one page also aggregates the summary
+    PAGE_QUERIES = 3
+
+    def setUp(self):
+        self.buyer = User.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client.force_login(self.buyer)
+
+    def add_orders(self, count, email='shopper@example.com'):
+        Order.objects.bulk_create([
+            Order(user=self.buyer, shipping_email=email, amount_paid=Money(1000 + i), status='DELIVERED')
+            for i in range(count)
+        ])
+
+    def get(self, query=''):
+        response = self.client.get(f"{reverse('customer_invoice_list')}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def ids(self, context):
+        return [order.pk for order in context['page']]
+
+    def test_pages_follow_cursors(self):
+        self.add_orders(45)
+        self.add_orders(2, email='someone@example.com')
+        newest = list(Order.objects.filter(shipping_email='shopper@example.com').order_by('-id').values_list('pk', flat=True))
+
+        first = self.get()
+        self.assertEqual(self.ids(first), newest[:20])
+        self.assertFalse(first['page'].has_previous)
+        self.assertEqual(first['summary']['count'], 45)
+        self.assertEqual(first['summary']['total'], Money(45 * 1000 + sum(range(45))))
+
+        second = self.get(first['page'].next_query)
+        self.assertEqual(self.ids(second), newest[20:40])
+        self.assertIsNone(second['summary'])
+
+        last = self.get(second['page'].next_query)
+        self.assertEqual(self.ids(last), newest[40:])
+        self.assertFalse(last['page'].has_next)
+
+        back = self.get(last['page'].prev_query)
+        self.assertEqual(self.ids(back), newest[20:40])
+        self.assertEqual(self.ids(self.get(back['page'].prev_query)), newest[:20])
+
+    def test_single_page_summary_needs_no_query(self):
+        self.add_orders(3)
+        with self.assertNumQueries(self.PAGE_QUERIES):
+            context = self.get()
+        self.assertEqual(len(self.ids(context)), 3)
+        self.assertEqual((context['summary']['count'], context['summary']['total']), (3, Money(3003)))
+        self.assertFalse(context['page'].has_other_pages)
+
+    def test_query_count_is_fixed(self):
+        for total in (45, 400):
+            self.add_orders(total - Order.objects.count())
+            with self.assertNumQueries(self.PAGE_QUERIES + 1):
+                first = self.get()
+            with self.assertNumQueries(self.PAGE_QUERIES):
+                later = self.get(first['page'].next_query)
+            with self.assertNumQueries(self.PAGE_QUERIES):
+                self.get(later['page'].next_query)
+
+    def test_no_invoices(self):
+        response = self.client.get(reverse('customer_invoice_list'), {'email': 'nobody@example.com'})
+        self.assertContains(response, 'No invoices found for this email address.')
+        self.assertEqual(response.context['summary']['count'], 0)
+
+
+class InvoicePageTests(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client.force_login(self.buyer)
+        product = Product.objects.create(name='Phone', price=Money(10000), Sale_price=Money(9000))
+        self.order = Order.objects.create(user=self.buyer, amount_paid=Money(10500), status='DELIVERED')
+        OrderItem.objects.create(order=self.order, product=product, quantity=1, price=Money(10000))
+        cache.clear()
+
+    def view(self, etag=None, order=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('customer_invoice_detail', args=[(order or self.order).pk]), headers=headers)
+
+    def test_finalized_invoice_is_rendered_once(self):
+        with mock.patch('payment.invoices._render', wraps=invoices._render) as render_body:
+            self.assertContains(self.view(), 'Phone')
+            self.assertContains(self.view(), 'Phone')
+        self.assertEqual(render_body.call_count, 1)
+
+    def test_open_invoice_is_rendered_every_time(self):
+        self.order.status = 'SHIPPED'
+        self.order.save()
+        with mock.patch('payment.invoices._render', wraps=invoices._render) as render_body:
+            response = self.view()
+            self.view()
+        self.assertNotIn('ETag', response)
+        self.assertEqual(render_body.call_count, 2)
+
+    def test_unchanged_page_revalidates(self):
+        etag = self.view()['ETag']
+        self.assertEqual(self.view(etag).status_code, 304)
+
+        # Reopening the order moves it to a new version
+        self.order.status = 'SHIPPED'
+        self.order.save()
+        self.order.status = 'DELIVERED'
+        self.order.save()
+        self.assertEqual(self.view(etag).status_code, 200)
+
+    def test_new_csrf_token_changes_the_etag(self):
+        etag = self.view()['ETag']
+        # What login does to the CSRF cookie
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        response = self.view(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pending_messages_are_not_swallowed(self):
+        etag = self.view()['ETag']
+        someone_elses = Order.objects.create(amount_paid=Money(500), status='DELIVERED')
+        self.assertEqual(self.view(order=someone_elses).status_code, 302)
+        response = self.view(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'You do not have permission to view this invoice.')
@@ -8,5 +8,6 @@ urlpatterns = [
 	path('checkout/', views.checkout, name="checkout"),
 	path('customer_invoice_detail/<int:order_id>/', views.customer_invoice_detail, name="customer_invoice_detail"),
 	path('customer_invoice_list/', views.customer_invoice_list, name="customer_invoice_list"),
+	path('qr/<str:fmt>/', views.payment_qr, name="payment_qr"),
 	path('test-telegram/', views.test_telegram_notification, name="test_telegram"),
 ]
\ No newline at end of file
@@ -3,74 +3,114 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 import logging
-import qrcode
-from io import BytesIO
-import base64
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Sum
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_GET
 import logging
-import requests
 from cart.cart import Cart
 from store.models import Product
-from .forms import ShippingForm, PaymentForm
+from .forms import ShippingForm, PaymentForm, read_idempotency_key
+from .invoices import invoice_etag, render_invoice
 from .models import ShippingAddress, Order, OrderItem, DeliveryOption
+from .notifications import enqueue_order_notification, send_telegram_notification
+from .qr import FORMATS, get_qr_url, qr_etag, render_qr
+from .registry import active_delivery_options, get_active_delivery_option
+from store.money import Money
+from store.pagination import keyset_paginate
 logger = logging.getLogger(__name__)
 
+INVOICES_PER_PAGE = 20
+
+
+def _replayed_order(request):
+    """The order already created by this user from the submitted checkout form, if any."""
+    key = read_idempotency_key(request.POST.get('idempotency_key'))
+    if key is None:
+        return None
+    return Order.objects.filter(user=request.user, idempotency_key=key).select_related('shipping_address', 'delivery_option').first()
+
+
+def _remember_order(request, order, order_items):
+    """Store what the success page shows about ``order`` in the session."""
+    shipping_address = order.shipping_address
+    delivery_option = order.delivery_option
+    request.session['payment_successful'] = True
+    request.session['order_id'] = order.id
+    request.session['order_items'] = [
+        {
+            'product_id': item.product.id if item.product else None,
+            'product_name': item.product.name if item.product else '',
+            'quantity': item.quantity,
+            'price': float(item.price),
+            'total': float(item.get_total())
+        } for item in order_items
+    ]
+    request.session['shipping_address'] = {
+        'full_name': shipping_address.shipping_full_name,
+        'email': shipping_address.shipping_email,
+        'address1': shipping_address.shipping_address1,
+        'address2': shipping_address.shipping_address2 or '',
+        'city': shipping_address.shipping_city,
+        'state': shipping_address.shipping_state or '',
+        'zipcode': shipping_address.shipping_zipcode or '',
+        'country': shipping_address.shipping_country
+    } if shipping_address else {}
+    request.session['delivery_option'] = {
+        'name': delivery_option.name,
+        'price': float(delivery_option.price),
+        'estimated_days': delivery_option.estimated_days
+    } if delivery_option else {}
+    request.session['payment_method'] = order.get_payment_method_display()
+
+
+def _replay_checkout(request, order):
+    """Answer a resubmitted checkout with the order it already created, writing nothing."""
+    logger.info(f"Checkout resubmitted for order {order.id}; returning the existing order")
+    if request.session.get('order_id') != order.id:
+        _remember_order(request, order, order.orderitem_set.select_related('product'))
+    return redirect('payment_success')
+
+
 @login_required(login_url='/register/')
 
 def checkout(request):
+    if request.method == 'POST':
+        # A double-click or retried POST carries the key of an order we
+        # already wrote; answer it before touching the cart or stock
+        replayed = _replayed_order(request)
+        if replayed is not None:
+            return _replay_checkout(request, replayed)
+
     cart = Cart(request)
-    delivery_options = DeliveryOption.objects.filter(is_active=True)
-    logger.debug(f"Delivery options fetched: {list(delivery_options.values('id', 'name', 'price'))}")
+    delivery_options = active_delivery_options()
+    logger.debug(f"Delivery options: {[(option.id, option.name, option.price) for option in delivery_options]}")
 
     # Ensure at least one delivery option exists
-    if not delivery_options.exists():
+    if not delivery_options:
         logger.error("No active delivery options found in database")
         default_option, _ = DeliveryOption.objects.get_or_create(
             name="Standard",
             defaults={'price': 5.00, 'estimated_days': 5, 'description': 'Standard delivery', 'is_active': True}
         )
-        delivery_options = DeliveryOption.objects.filter(is_active=True)
+        delivery_options = active_delivery_options()
         
 
-    # Calculate cart total without delivery
-    try:
-        cart_total_raw = cart.get_total_price() or 0
-        logger.debug(f"Raw cart total: {cart_total_raw}")
-        if isinstance(cart_total_raw, str):
-            cleaned_total = ''.join(char for char in cart_total_raw if char.isdigit() or char in ['.', '-'])
-            if cleaned_total.count('.') > 1:
-                logger.error(f"Invalid cart total format: multiple decimal points in '{cleaned_total}'")
-                raise ValueError("Invalid cart total format: multiple decimal points")
-            if not cleaned_total.replace('.', '').replace('-', '').isdigit():
-                logger.error(f"Invalid cart total format: non-numeric characters in '{cleaned_total}'")
-                raise ValueError("Invalid cart total format: non-numeric characters")
-            if cleaned_total in ['', '.', '-']:
-                logger.error(f"Invalid cart total format: empty or incomplete number '{cleaned_total}'")
-                raise ValueError("Invalid cart total format: empty or incomplete number")
-            cart_total = float(cleaned_total)
-        else:
-            cart_total = float(cart_total_raw)
-    except (ValueError, TypeError) as e:
-        logger.error(f"Error converting cart total: {str(e)}")
-        return render(request, "payment/checkout.html", {
-            'order': {'get_cart_items': 0, 'get_cart_total': 0, 'delivery_cost': 0, 'grand_total': 0},
-            'items': [],
-            'delivery_options': delivery_options,
-            'selected_delivery_id': None,
-            'shipping_form': ShippingForm(),
-            'payment_form': PaymentForm(),
-            'error': "Invalid cart total. Please check your cart and try again."
-        })
+    # Cart prices are integer cents, so the total needs no parsing
+    cart_total = cart.get_total_price()
 
     # Default delivery option
-    default_delivery = delivery_options.first()
+    default_delivery = delivery_options[0]
     selected_delivery_id = request.POST.get('delivery_option', default_delivery.id)
     logger.debug(f"Selected delivery ID: {selected_delivery_id}")
 
     # Get selected delivery option
-    selected_delivery = DeliveryOption.objects.filter(id=selected_delivery_id, is_active=True).first() or default_delivery
-    delivery_cost = float(selected_delivery.price) if selected_delivery else 0
+    selected_delivery = get_active_delivery_option(selected_delivery_id) or default_delivery
+    delivery_cost = selected_delivery.price if selected_delivery else Money()
     
     order = {
         'get_cart_items': cart.__len__(),
@@ -80,8 +120,11 @@ def checkout(request):
     }
     
     product_ids = [int(pid) for pid in cart.cart.keys()]
-    products = Product.objects.filter(id__in=product_ids, Is_sale=True)
-    product_dict = {str(product.id): product for product in products}
+    product_dict = {
+        product_id: product
+        for product_id, product in cart.get_products().items()
+        if product is not None and product.Is_sale
+    }
 
     logger.debug(f"product_ids: {product_ids}")
     logger.debug(f"product_dict keys: {list(product_dict.keys())}")
@@ -98,71 +141,24 @@ def checkout(request):
 
     items = []
     for pid in product_ids:
-        product = product_dict.get(str(pid))
-        if product:
-            try:
-                price_raw = cart.cart[str(pid)]['price']
-                if isinstance(price_raw, str):
-                    cleaned_price = ''.join(char for char in price_raw if char.isdigit() or char in ['.', '-'])
-                    if cleaned_price.count('.') > 1:
-                        logger.error(f"Invalid price format for product ID {pid}: multiple decimal points in '{cleaned_price}'")
-                        raise ValueError(f"Invalid price format for product ID {pid}: multiple decimal points")
-                    if not cleaned_price.replace('.', '').replace('-', '').isdigit():
-                        logger.error(f"Invalid price format for product ID {pid}: non-numeric characters in '{cleaned_price}'")
-                        raise ValueError(f"Invalid price format for product ID {pid}: non-numeric characters")
-                    if cleaned_price in ['', '.', '-']:
-                        logger.error(f"Invalid price format for product ID {pid}: empty or incomplete number '{cleaned_price}'")
-                        raise ValueError(f"Invalid price format for product ID {pid}: empty or incomplete number")
-                    price = float(cleaned_price)
-                else:
-                    price = float(price_raw)
-                items.append({
-                    'product': {
-                        'id': pid,
-                        'name': product.name,
-                        'price': price,
-                        'imageURL': product.imageURL
-                    },
-                    'quantity': cart.cart[str(pid)]['quantity'],
-                    'get_total': price * cart.cart[str(pid)]['quantity']
-                })
-            except (AttributeError, ValueError) as e:
-                logger.error(f"Error processing product ID {pid}: {e}")
-                return render(request, "payment/checkout.html", {
-                    'order': order,
-                    'items': [],
-                    'delivery_options': delivery_options,
-                    'selected_delivery_id': selected_delivery_id,
-                    'error': f"Invalid product data for ID {pid}."
-                })
-        else:
-            logger.warning(f"Product ID {pid} not found in product_dict")
-            return render(request, "payment/checkout.html", {
-                'order': order,
-                'items': [],
-                'delivery_options': delivery_options,
-                'selected_delivery_id': selected_delivery_id,
-                'error': f"Product ID {pid} is no longer available."
-            })
+        product = product_dict[str(pid)]
+        price = Money(cart.cart[str(pid)]['price'])
+        items.append({
+            'product': {
+                'id': pid,
+                'name': product.name,
+                'price': price,
+                'imageURL': product.imageURL
+            },
+            'quantity': cart.cart[str(pid)]['quantity'],
+            'get_total': price * cart.cart[str(pid)]['quantity']
+        })
 
     shipping_form = ShippingForm(request.POST or None)
     payment_form = PaymentForm(request.POST or None)
 
-    # Generate QR code for bank transfer if selected
-    qr_code = None
-    if request.POST.get('payment_method') == 'bank_transfer':
-        try:
-            payment_data = f"Bank: Example Bank\nAccount: 1234567890\nAmount: ${order['grand_total']:.2f}"
-            qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-            qr.add_data(payment_data)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            qr_code = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        except Exception as e:
-            logger.error(f"Error generating QR code: {e}")
-            qr_code = None
+    # The bank-transfer QR is served by payment_qr and cached there
+    qr_url = get_qr_url(selected_delivery)
 
     if request.method == 'POST' and shipping_form.is_valid() and payment_form.is_valid():
         try:
@@ -178,107 +174,70 @@ def checkout(request):
                     'selected_delivery_id': selected_delivery_id,
                     'shipping_form': shipping_form,
                     'payment_form': payment_form,
-                    'qr_code': qr_code
+                    'qr_url': qr_url
                 })
 
-            # Save shipping address
-            shipping_address = shipping_form.save(commit=False)
-            logger.debug(f"Saving shipping address for user: {request.user}")
-            shipping_address.user = request.user
-            shipping_address.save()
-
-            # Create Order
-            logger.debug(f"Creating order with amount_paid: {order['grand_total']}")
-            new_order = Order.objects.create(
-                user=request.user,
-                shipping_address=shipping_address,
-                delivery_option=selected_delivery,
-                payment_method=payment_form.cleaned_data['payment_method'],
-                amount_paid=order['grand_total']
-            )
-
-            # Create OrderItems and reduce stock
-            order_items = []
-            for product_id, item in cart.cart.items():
-                product = product_dict.get(product_id)
-                if product:
-                    price_raw = item['price']
-                    logger.debug(f"Processing OrderItem for product ID {product_id}, price: {price_raw}")
-                    if isinstance(price_raw, str):
-                        cleaned_price = ''.join(char for char in price_raw if char.isdigit() or char in ['.', '-'])
-                        if cleaned_price.count('.') > 1:
-                            logger.error(f"Invalid price format for OrderItem product ID {product_id}: multiple decimal points in '{cleaned_price}'")
-                            raise ValueError(f"Invalid price format for product ID {product_id}")
-                        if not cleaned_price.replace('.', '').replace('-', '').isdigit():
-                            logger.error(f"Invalid price format for OrderItem product ID {product_id}: non-numeric characters in '{cleaned_price}'")
-                            raise ValueError(f"Invalid price format for product ID {product_id}")
-                        if cleaned_price in ['', '.', '-']:
-                            logger.error(f"Invalid price format for OrderItem product ID {product_id}: empty or incomplete number '{cleaned_price}'")
-                            raise ValueError(f"Invalid price format for product ID {product_id}")
-                        price = float(cleaned_price)
-                    else:
-                        price = float(price_raw)
-                    
-                    # Reduce stock
-                    quantity = item['quantity']
-                    if not product.reduce_stock(quantity):
-                        logger.error(f"Insufficient stock for product ID {product_id}")
-                        raise ValueError(f"Insufficient stock for {product.name}")
-                    
-                    order_item = OrderItem.objects.create(
-                        order=new_order,
-                        product=product,
-                        quantity=quantity,
-                        price=price
+            # Write the order in one transaction: stock is decremented with
+            # conditional UPDATEs in product-id order, so concurrent buyers
+            # cannot oversell and a failure leaves nothing half-written
+            quantities = {item['product']['id']: item['quantity'] for item in items}
+            try:
+                with transaction.atomic():
+                    # Save shipping address
+                    shipping_address = shipping_form.save(commit=False)
+                    logger.debug(f"Saving shipping address for user: {request.user}")
+                    shipping_address.user = request.user
+                    shipping_address.save()
+
+                    # Create Order first: its unique idempotency key makes a
+                    # concurrent duplicate submission fail before it touches stock
+                    logger.debug(f"Creating order with amount_paid: {order['grand_total']}")
+                    new_order = Order.objects.create(
+                        user=request.user,
+                        shipping_address=shipping_address,
+                        delivery_option=selected_delivery,
+                        payment_method=payment_form.cleaned_data['payment_method'],
+                        amount_paid=order['grand_total'],
+                        idempotency_key=payment_form.cleaned_data['idempotency_key'],
+                        items_subtotal=cart_total,
+                        item_count=sum(quantities.values()),
+                        grand_total=order['grand_total']
                     )
-                    order_items.append(order_item)
-                else:
-                    logger.error(f"Product ID {product_id} not found during OrderItem creation")
-                    raise ValueError(f"Product ID {product_id} not found")
+
+                    short = Product.reduce_stock_many(quantities)
+                    if short:
+                        names = ", ".join(product_dict[str(pid)].name for pid in short)
+                        logger.error(f"Insufficient stock for product IDs {short}")
+                        raise ValueError(f"Insufficient stock for {names}")
+
+                    # Create OrderItems
+                    order_items = OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=new_order,
+                            product=product_dict[str(item['product']['id'])],
+                            quantity=item['quantity'],
+                            price=item['product']['price']
+                        )
+                        for item in items
+                    ])
+
+                    # Queue the Telegram notification; send_notifications delivers it
+                    enqueue_order_notification(new_order, order_items, shipping_address, selected_delivery, payment_form.cleaned_data['payment_method'])
+            except IntegrityError:
+                # Lost the race to a concurrent submission of the same form
+                replayed = _replayed_order(request)
+                if replayed is None:
+                    raise
+                return _replay_checkout(request, replayed)
 
             # Clear cart
-            request.session['cart'] = {}
-            request.session.modified = True
-            logger.debug("Cart cleared by resetting session['cart']")
+            cart.clear()
+            logger.debug("Cart cleared")
 
             # Set session data for success page
-            request.session['payment_successful'] = True
-            request.session['order_id'] = new_order.id
-            request.session['order_items'] = [
-                {
-                    'product_id': item.product.id,
-                    'product_name': item.product.name,
-                    'quantity': item.quantity,
-                    'price': float(item.price),
-                    'total': float(item.get_total())
-                } for item in order_items
-            ]
-            request.session['shipping_address'] = {
-                'full_name': shipping_address.shipping_full_name,
-                'email': shipping_address.shipping_email,
-                'address1': shipping_address.shipping_address1,
-                'address2': shipping_address.shipping_address2 or '',
-                'city': shipping_address.shipping_city,
-                'state': shipping_address.shipping_state or '',
-                'zipcode': shipping_address.shipping_zipcode or '',
-                'country': shipping_address.shipping_country
-            }
-            request.session['delivery_option'] = {
-                'name': selected_delivery.name,
-                'price': float(selected_delivery.price),
-                'estimated_days': selected_delivery.estimated_days
-            }
-            request.session['payment_method'] = new_order.get_payment_method_display()
+            _remember_order(request, new_order, order_items)
             logger.debug("Redirecting to payment_success")
 
-            # Send Telegram notification
-            logger.info(f"About to send Telegram notification for order {new_order.id}")
-            try:
-                send_telegram_notification(new_order, order_items, shipping_address, selected_delivery, payment_form.cleaned_data['payment_method'])
-                logger.info(f"Telegram notification sent successfully for order {new_order.id}")
-            except Exception as e:
-                logger.error(f"Error in Telegram notification for order {new_order.id}: {str(e)}")
-            
             logger.info(f"Redirecting to payment_success for order {new_order.id}")
             return redirect('payment_success')
 
@@ -292,7 +251,7 @@ def checkout(request):
                 'selected_delivery_id': selected_delivery_id,
                 'shipping_form': shipping_form,
                 'payment_form': payment_form,
-                'qr_code': qr_code
+                'qr_url': qr_url
             })
 
     return render(request, "payment/checkout.html", {
@@ -302,95 +261,9 @@ def checkout(request):
         'selected_delivery_id': selected_delivery_id,
         'shipping_form': shipping_form,
         'payment_form': payment_form,
-        'qr_code': qr_code
+        'qr_url': qr_url
     })
 
-def send_telegram_notification(order, order_items, shipping_address, delivery_option, payment_method):
-    """
-    Send order notification to Telegram group with retry logic and better error handling
-    """
-    import os
-    import time
-    
-    try:
-        # Get bot configuration from environment variables or use defaults
-        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc')
-        chat_id = os.environ.get('TELEGRAM_CHAT_ID', '-4862435107')  # Bot Get me Shop group
-        
-        # Validate configuration
-        if not bot_token or not chat_id:
-            logger.error("Telegram bot configuration missing: BOT_TOKEN or CHAT_ID")
-            return False
-        
-        # Calculate total items
-        total_items = sum(item.quantity for item in order_items)
-        
-        # Format a concise message for group
-        message = f"🛒 *NEW ORDER #{order.id}*\n\n"
-        message += f"💰 *Total:* ${order.amount_paid:.2f}\n"
-        message += f"📦 *Items:* {total_items} item{'s' if total_items != 1 else ''}\n"
-        message += f"👤 *Customer:* {shipping_address.shipping_full_name}\n"
-        message += f"📧 *Email:* {shipping_address.shipping_email}\n"
-        message += f"🚚 *Delivery:* {delivery_option.name}\n"
-        message += f"💳 *Payment:* {payment_method}\n\n"
-        
-        # List items briefly
-        message += f"📋 *Order Items:*\n"
-        for item in order_items:
-            message += f"• {item.product.name} x{item.quantity}\n"
-        
-        message += f"\n📍 *Address:* {shipping_address.shipping_city}, {shipping_address.shipping_country}"
-        
-        # Retry logic for sending to Telegram
-        max_retries = 3
-        retry_delay = 2  # seconds
-        
-        for attempt in range(max_retries):
-            try:
-                # Send to Telegram
-                url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-                data = {
-                    'chat_id': chat_id,
-                    'text': message,
-                    'parse_mode': 'Markdown'
-                }
-                
-                response = requests.post(url, data=data, timeout=30)  # Increased timeout
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get('ok'):
-                        logger.info(f"Telegram notification sent successfully for order {order.id}")
-                        return True
-                    else:
-                        logger.error(f"Telegram API error: {result.get('description', 'Unknown error')}")
-                else:
-                    logger.error(f"HTTP error {response.status_code}: {response.text}")
-                
-                # If not the last attempt, wait before retrying
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying Telegram notification in {retry_delay} seconds... (attempt {attempt + 2}/{max_retries})")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    
-            except requests.exceptions.Timeout:
-                logger.error(f"Telegram request timeout (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Telegram request error (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    
-        logger.error(f"Failed to send Telegram notification after {max_retries} attempts for order {order.id}")
-        return False
-            
-    except Exception as e:
-        logger.error(f"Error sending Telegram notification: {str(e)}")
-        return False
-
 def payment_success(request):
     return render(request, "payment/payment_success.html", {
         'order_id': request.session.get('order_id', 'N/A'),
@@ -401,49 +274,130 @@ def payment_success(request):
         'payment_method': request.session.get('payment_method', 'N/A')
     })
     
-def payment_view(request):
-    form = PaymentForm()
-    qr_code = form.get_qr_code() if request.POST.get('payment_method') == 'bank_transfer' else None
-    return render(request, 'payment/payment_form.html', {'form': form, 'qr_code': qr_code})
+def _qr_amount(request):
+    """The requester's checkout total for ``?delivery=``, or None without a cart or a valid option."""
+    if not hasattr(request, '_qr_amount'):
+        cart = Cart(request)
+        delivery_option = get_active_delivery_option(request.GET.get('delivery'))
+        request._qr_amount = cart.get_total_price() + delivery_option.price if len(cart) and delivery_option else None
+    return request._qr_amount
+
+
+def _qr_etag(request, fmt):
+    amount = _qr_amount(request)
+    if amount is None or fmt not in FORMATS:
+        return None
+    try:
+        return qr_etag(amount, fmt)
+    except ValueError:
+        return None
+
+
+@login_required(login_url='/register/')
+@require_GET
+# The URL stays the same when the cart changes, so revalidate every time; an
+# unchanged amount costs a 304
+@cache_control(private=True, no_cache=True)
+@etag(_qr_etag)
+def payment_qr(request, fmt):
+    """Bank-transfer QR image for the requester's cart plus ``?delivery=``; rendered once per amount"""
+    if fmt not in FORMATS:
+        raise Http404("Unknown QR format")
+    amount = _qr_amount(request)
+    if amount is None:
+        raise Http404("Nothing to pay for")
+    try:
+        image = render_qr(amount, fmt)
+    except ValueError:
+        raise Http404("Invalid amount")
+    return HttpResponse(image, content_type=FORMATS[fmt])
+
+def _invoice_order(request, order_id):
+    """The columns needed to authorize and version an invoice, loaded once per request."""
+    if not hasattr(request, '_invoice_order'):
+        request._invoice_order = Order.objects.only(
+            'id', 'user_id', 'shipping_email', 'status', 'status_changed_at'
+        ).filter(id=order_id).first()
+    return request._invoice_order
+
+
+def _can_view_invoice(request, order):
+    return order.user_id == request.user.id or bool(order.shipping_email and order.shipping_email == request.user.email)
+
+
+def _invoice_page_etag(request, order_id):
+    order = _invoice_order(request, order_id)
+    if order is None or not _can_view_invoice(request, order):
+        return None
+    if messages.get_messages(request):
+        # Pending flash messages are shown once, so the page must be rendered
+        return None
+    # The page around the invoice shows the user and their cart count, and
+    # embeds the CSRF token, whose secret login rotates; get_token() makes
+    # sure the secret exists before the page is rendered
+    get_token(request)
+    return invoice_etag(order, request.user.pk, len(Cart(request)), request.META['CSRF_COOKIE'])
+
 @login_required(login_url='/register/')
+@cache_control(private=True, no_cache=True)
+@etag(_invoice_page_etag)
 def customer_invoice_detail(request, order_id):
     """
     View to display detailed invoice information for a specific order.
     Accessible only to the user who owns the order or via email match.
+    Finalized invoices come from the render cache and answer If-None-Match with 304.
     """
-    order = get_object_or_404(Order, id=order_id)
+    order = _invoice_order(request, order_id)
+    if order is None:
+        raise Http404("No Order matches the given query.")
     
     # Security check: Ensure the order belongs to the logged-in user
-    if order.user != request.user and (not order.shipping_address or order.shipping_address.shipping_email != request.user.email):
+    if not _can_view_invoice(request, order):
         messages.error(request, "You do not have permission to view this invoice.")
         return redirect('customer_invoice_list')
     
-    # Fetch order items
-    items = OrderItem.objects.filter(order=order).select_related('product')
-    
     context = {
         'order': order,
-        'items': items,
+        'invoice_html': render_invoice(order),
     }
     
     return render(request, 'payment/customer_invoice_detail.html', context)
 @login_required(login_url='/register/')
 def customer_invoice_list(request):
     email = request.GET.get('email')
-    orders = []
+    page = []
+    summary = None
 
     # Use logged-in user's email if no email is provided in GET request
     if not email and request.user.is_authenticated:
         email = request.user.email
 
     if email:
-        orders = Order.objects.filter(shipping_address__shipping_email=email).select_related('shipping_address', 'delivery_option').prefetch_related('orderitem_set__product')
-        if not orders:
-            messages.info(request, 'No invoices found for this email address.')
+        # Newest first, one page at a time, straight off the
+        # (shipping_email, -id) index; totals and item counts are stored on
+        # Order, so items are never loaded
+        orders = Order.objects.filter(shipping_email=email)
+        page = keyset_paginate(orders.select_related('user', 'shipping_address'), request, descending=True, page_size=INVOICES_PER_PAGE)
+        # The summary is shown on the first page only, and only customers
+        # with more than one page of invoices need a query for it
+        if not request.GET.get('after') and not request.GET.get('before'):
+            if page.has_next:
+                summary = orders.aggregate(count=Count('id'), total=Sum('amount_paid'), latest=Max('date_ordered'))
+            else:
+                summary = {
+                    'count': len(page),
+                    'total': sum((order.amount_paid for order in page), Money()),
+                    'latest': max((order.date_ordered for order in page), default=None),
+                }
+            summary['total'] = summary['total'] or Money()
+            if not summary['count']:
+                messages.info(request, 'No invoices found for this email address.')
 
     context = {
-        'orders': orders,
-        'email': email
+        'orders': page,
+        'page': page,
+        'email': email,
+        'summary': summary
     }
     return render(request, 'payment/customer_invoice_list.html', context)
 
@@ -479,7 +433,9 @@ def test_telegram_notification(request):
         ]
         
         # Send test notification
-        send_telegram_notification(test_order, test_items, test_shipping, test_delivery, 'Credit Card')
+        if not send_telegram_notification(test_order, test_items, test_shipping, test_delivery, 'Credit Card'):
+            messages.error(request, 'Error sending test notification, see the server log for details.')
+            return redirect('home')
         
         messages.success(request, 'Test Telegram notification sent successfully!')
         return redirect('payment_success')
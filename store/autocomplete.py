@@ -0,0 +1,195 @@
+"""
+Per-process typeahead index over product and category names.
+
+Every name is stored under each of its word-start suffixes ("Pixel 8 Pro" is
+reachable from "pixel", "8" and "pro") in one sorted list, so a lookup is a
+``bisect`` plus a short forward scan and never touches the database. The index
+is built lazily on first use and updated in place by the Product and Category
+receivers in ``store/models.py``.
+
+Every ``REBUILD_INTERVAL`` one request rebuilds the index from the database
+while the others keep reading the old one; the new index is swapped in whole,
+with any changes made during the rebuild replayed onto it first.
+"""
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.urls import NoReverseMatch, reverse
+
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 20
+DEFAULT_RESULTS = 8
+# Other workers only see saves made in their own process, so rebuild from the
+# database at most this often to pick up their changes.
+REBUILD_INTERVAL = 300
+
+
+def normalize(text):
+    """
+    Casefold, collapse whitespace and strip accents from Latin letters.
+
+    Combining marks are only dropped after a Latin base letter ("Café" ->
+    "cafe"); in scripts such as Khmer and Thai they are part of the spelling.
+    """
+    kept, latin = [], False
+    for ch in unicodedata.normalize('NFKD', text or ''):
+        if not unicodedata.combining(ch):
+            latin = unicodedata.name(ch, '').startswith('LATIN ')
+        elif latin:
+            continue
+        kept.append(ch)
+    text = unicodedata.normalize('NFC', ''.join(kept))
+    return ' '.join(text.casefold().split())
+
+
+def _category_url(name):
+    try:
+        return reverse('category', args=[name])
+    except NoReverseMatch:
+        return ''
+
+
+def _suffixes(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class InMemoryIndex:
+    """
+    Lifecycle of a per-process index built from the database.
+
+    Subclasses set up their structures in ``__init__`` (naming them in
+    ``DATA``) and fill them from the database in ``_load``.
+    """
+    DATA = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()          # guards the index data
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time
+        self._changes = None                   # made during a rebuild, replayed onto it
+        self.built_at = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _change(self, apply):
+        """Apply ``apply(index)`` to this index, and to the one being rebuilt if any."""
+        with self._lock:
+            if self.built_at is not None:
+                apply(self)
+            if self._changes is not None:
+                self._changes.append(apply)
+
+    def rebuild(self):
+        with self._lock:
+            self._changes = []
+        fresh = type(self)()
+        try:
+            fresh._load()
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        with self._lock:
+            # Saves that landed while we were reading would otherwise be lost
+            for apply in self._changes:
+                apply(fresh)
+            self._changes = None
+            for name in self.DATA:
+                setattr(self, name, getattr(fresh, name))
+            self.built_at = time.monotonic()
+
+    def _is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > REBUILD_INTERVAL
+
+    def ensure_built(self):
+        if not self._is_stale():
+            return
+        # With no index yet every caller waits for the one build; once there
+        # is one, only the first caller to see it stale rebuilds it
+        built = self.built_at is not None
+        if not self._rebuild_lock.acquire(blocking=not built):
+            return
+        try:
+            if self._is_stale():
+                self.rebuild()
+        except Exception:
+            if not built:
+                raise
+            logger.exception(f"Rebuilding {type(self).__name__} failed; keeping the current index")
+        finally:
+            self._rebuild_lock.release()
+
+
+class PrefixIndex(InMemoryIndex):
+    DATA = ('_keys', '_entries', '_entry_keys')
+
+    def __init__(self):
+        super().__init__()
+        self._keys = []        # sorted (key, kind, id)
+        self._entries = {}     # (kind, id) -> payload
+        self._entry_keys = {}  # (kind, id) -> keys, for removal
+
+    def _add(self, kind, obj_id, name, url):
+        ref = (kind, obj_id)
+        self._remove(ref)
+        keys = _suffixes(name)
+        for key in keys:
+            insort(self._keys, (key, kind, obj_id))
+        self._entries[ref] = {'type': kind, 'id': obj_id, 'name': name, 'url': url}
+        self._entry_keys[ref] = keys
+
+    def _remove(self, ref):
+        for key in self._entry_keys.pop(ref, ()):
+            i = bisect_left(self._keys, (key,) + ref)
+            if i < len(self._keys) and self._keys[i] == (key,) + ref:
+                del self._keys[i]
+        self._entries.pop(ref, None)
+
+    def _load(self):
+        for pk, name in Product.objects.values_list('id', 'name'):
+            self._add('product', pk, name, reverse('product', args=[pk]))
+        for pk, name in Category.objects.values_list('id', 'name'):
+            self._add('category', pk, name, _category_url(name))
+
+    def add_product(self, product):
+        pk, name, url = product.pk, product.name, reverse('product', args=[product.pk])
+        self._change(lambda index: index._add('product', pk, name, url))
+
+    def add_category(self, category):
+        pk, name, url = category.pk, category.name, _category_url(category.name)
+        self._change(lambda index: index._add('category', pk, name, url))
+
+    def remove(self, kind, obj_id):
+        self._change(lambda index: index._remove((kind, obj_id)))
+
+    def suggest(self, prefix, limit=DEFAULT_RESULTS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, kind, obj_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if (kind, obj_id) not in seen:
+                    seen.add((kind, obj_id))
+                    results.append(self._entries[(kind, obj_id)])
+                i += 1
+        return results
+
+
+index = PrefixIndex()
+
+
+def suggest(prefix, limit=DEFAULT_RESULTS):
+    index.ensure_built()
+    return index.suggest(prefix, max(1, min(limit, MAX_RESULTS)))
@@ -0,0 +1,131 @@
+"""
+Facet filters for product listings.
+
+Every option count is computed in a single grouped query: products are grouped
+by category and each option is a conditional ``COUNT`` whose filter applies
+every *other* selected facet, so picking a price range still shows how many
+products each other range would give.
+"""
+from django.db.models import Count, Q
+from django.urls import NoReverseMatch, reverse
+
+PRICE_RANGES = [
+    ('under-200', 'Under $200', None, 200),
+    ('200-500', '$200 - $500', 200, 500),
+    ('500-1000', '$500 - $1,000', 500, 1000),
+    ('over-1000', 'Over $1,000', 1000, None),
+]
+PRICE_RANGE_KEYS = {key for key, *_ in PRICE_RANGES}
+
+
+def _price_q(low, high):
+    q = Q(price__isnull=False)
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+class FacetFilter:
+    """The facet selection carried in ``request.GET`` for one listing."""
+
+    def __init__(self, request, category=None):
+        self.params = request.GET
+        self.category = category
+        price = request.GET.get('price', '')
+        self.price = price if price in PRICE_RANGE_KEYS else ''
+        self.in_stock = request.GET.get('in_stock') == '1'
+        self.on_sale = request.GET.get('on_sale') == '1'
+
+    def _filters(self):
+        filters = {
+            'category': Q(category=self.category) if self.category else Q(),
+            'price': Q(),
+            'in_stock': Q(quantity__gt=0) if self.in_stock else Q(),
+            'on_sale': Q(Is_sale=True) if self.on_sale else Q(),
+        }
+        if self.price:
+            _, _, low, high = next(r for r in PRICE_RANGES if r[0] == self.price)
+            filters['price'] = _price_q(low, high)
+        return filters
+
+    def _without(self, facet):
+        q = Q()
+        for name, facet_q in self._filters().items():
+            if name != facet:
+                q &= facet_q
+        return q
+
+    def apply(self, queryset):
+        return queryset.filter(self._without(None))
+
+    def _query(self, **changes):
+        params = self.params.copy()
+        for key in ('after', 'before'):
+            params.pop(key, None)
+        for key, value in changes.items():
+            if value:
+                params[key] = value
+            else:
+                params.pop(key, None)
+        return params.urlencode()
+
+    def counts(self, queryset):
+        """Run the single grouped COUNT query; one row per category."""
+        aggregates = {'category_total': Count('id', filter=self._without('category'))}
+        price_base = self._without('price')
+        for key, _, low, high in PRICE_RANGES:
+            aggregates[f'price_{key}'] = Count('id', filter=price_base & _price_q(low, high))
+        aggregates['in_stock'] = Count('id', filter=self._without('in_stock') & Q(quantity__gt=0))
+        aggregates['on_sale'] = Count('id', filter=self._without('on_sale') & Q(Is_sale=True))
+        return list(
+            queryset.order_by()
+            .values('category_id', 'category__name')
+            .annotate(**aggregates)
+        )
+
+    def facets(self, queryset):
+        """Facet groups with option labels, counts and toggle query strings."""
+        rows = self.counts(queryset)
+        total = lambda key: sum(row[key] for row in rows)
+
+        price_options = [
+            {
+                'label': label,
+                'count': total(f'price_{key}'),
+                'selected': self.price == key,
+                'query': self._query(price='' if self.price == key else key),
+            }
+            for key, label, _, _ in PRICE_RANGES
+        ]
+        category_options = []
+        for row in sorted(rows, key=lambda row: row['category__name'] or ''):
+            if not row['category__name'] or not row['category_total']:
+                continue
+            try:
+                url = reverse('category', args=[row['category__name']])
+            except NoReverseMatch:
+                continue
+            category_options.append({
+                'label': row['category__name'],
+                'count': row['category_total'],
+                'selected': self.category is not None and row['category_id'] == self.category.id,
+                'url': f"{url}?{self._query()}",
+            })
+        return [
+            {'name': 'Price', 'options': price_options},
+            {'name': 'Availability', 'options': [{
+                'label': 'In stock',
+                'count': total('in_stock'),
+                'selected': self.in_stock,
+                'query': self._query(in_stock='' if self.in_stock else '1'),
+            }]},
+            {'name': 'Deals', 'options': [{
+                'label': 'On sale',
+                'count': total('on_sale'),
+                'selected': self.on_sale,
+                'query': self._query(on_sale='' if self.on_sale else '1'),
+            }]},
+            {'name': 'Category', 'options': category_options},
+        ]
@@ -0,0 +1,161 @@
+"""
+Typo-tolerant product matching over an in-memory character-trigram index.
+
+Trigrams are taken over the whole normalized string, spaces included, so
+scripts that do not separate words with spaces (Khmer, Thai) still produce
+useful grams. Two inverted indexes are kept per process:
+
+* trigram -> vocabulary words from product names, used to correct each query
+  token ("samsng" -> "samsung") for a "did you mean" suggestion;
+* trigram -> product ids over names and descriptions, used to rank similar
+  products when even the corrected query finds nothing.
+
+Candidates come from the posting lists and only the best ``MAX_CANDIDATES``
+are scored with a bounded edit distance, so latency does not grow with the
+catalog. The index follows the same lifecycle as ``store.autocomplete``.
+"""
+from collections import Counter, defaultdict
+
+from .autocomplete import InMemoryIndex, normalize
+from .models import Product
+
+MAX_CANDIDATES = 50
+MAX_QUERY_TOKENS = 8
+MIN_SIMILARITY = 0.3
+# Posting lists longer than this are too common to tell products apart.
+MAX_POSTINGS = 2000
+
+
+def trigrams(text):
+    text = normalize(text)
+    if not text:
+        return set()
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, bound):
+    """Optimal string alignment distance, or ``bound + 1`` once it is exceeded."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > bound:
+            return bound + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _max_typos(word):
+    return 1 if len(word) <= 5 else 2
+
+
+class TrigramIndex(InMemoryIndex):
+    DATA = ('_doc_postings', '_doc_grams', '_word_postings', '_word_refs', '_doc_words')
+
+    def __init__(self):
+        super().__init__()
+        self._doc_postings = defaultdict(set)   # trigram -> product ids
+        self._doc_grams = {}                    # product id -> trigrams
+        self._word_postings = defaultdict(set)  # trigram -> vocabulary words
+        self._word_refs = Counter()             # word -> products using it
+        self._doc_words = {}                    # product id -> name words
+
+    def _add(self, pk, name, description):
+        self._remove(pk)
+        grams = trigrams(name) | trigrams(description or '')
+        for gram in grams:
+            self._doc_postings[gram].add(pk)
+        self._doc_grams[pk] = grams
+        words = set(normalize(name).split())
+        for word in words:
+            if not self._word_refs[word]:
+                for gram in trigrams(word):
+                    self._word_postings[gram].add(word)
+            self._word_refs[word] += 1
+        self._doc_words[pk] = words
+
+    def _remove(self, pk):
+        for gram in self._doc_grams.pop(pk, ()):
+            self._doc_postings[gram].discard(pk)
+        for word in self._doc_words.pop(pk, ()):
+            self._word_refs[word] -= 1
+            if not self._word_refs[word]:
+                del self._word_refs[word]
+                for gram in trigrams(word):
+                    self._word_postings[gram].discard(word)
+
+    def _load(self):
+        for pk, name, description in Product.objects.values_list('id', 'name', 'description'):
+            self._add(pk, name, description)
+
+    def add_product(self, product):
+        pk, name, description = product.pk, product.name, product.description
+        self._change(lambda index: index._add(pk, name, description))
+
+    def remove(self, pk):
+        self._change(lambda index: index._remove(pk))
+
+    def _candidates(self, grams, postings):
+        counts = Counter()
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting and len(posting) <= MAX_POSTINGS:
+                counts.update(posting)
+        return counts.most_common(MAX_CANDIDATES)
+
+    def correct_word(self, word):
+        if word in self._word_refs:
+            return word
+        best, best_key = None, None
+        for candidate, _ in self._candidates(trigrams(word), self._word_postings):
+            bound = _max_typos(word)
+            distance = edit_distance(word, candidate, bound)
+            if distance > bound:
+                continue
+            key = (distance, -self._word_refs[candidate], candidate)
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+        return best
+
+    def correct(self, query):
+        words = normalize(query).split()[:MAX_QUERY_TOKENS]
+        with self._lock:
+            corrected = [self.correct_word(word) or word for word in words]
+        if corrected == words:
+            return None
+        return ' '.join(corrected)
+
+    def similar(self, query, limit):
+        grams = trigrams(query)
+        if not grams:
+            return []
+        with self._lock:
+            scored = []
+            for pk, shared in self._candidates(grams, self._doc_postings):
+                similarity = shared / len(grams)
+                if similarity >= MIN_SIMILARITY:
+                    scored.append((-similarity, pk))
+        scored.sort()
+        return [pk for _, pk in scored[:limit]]
+
+
+index = TrigramIndex()
+
+
+def did_you_mean(query):
+    """Return ``query`` with each token snapped to a catalog word, or None."""
+    index.ensure_built()
+    return index.correct(query)
+
+
+def similar_product_ids(query, limit=12):
+    """Ids of products whose names/descriptions share most trigrams with ``query``."""
+    index.ensure_built()
+    return index.similar(query, limit)
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS store_product_search (
+                product_id bigint PRIMARY KEY REFERENCES store_product (id) ON DELETE CASCADE,
+                document tsvector NOT NULL
+            )
+            """
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS store_product_search_document_gin "
+            "ON store_product_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            """
+            INSERT INTO store_product_search (product_id, document)
+            SELECT id,
+                   setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                   setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+            FROM store_product
+            ON CONFLICT (product_id) DO NOTHING
+            """
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+            "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, name, description) "
+            "SELECT id, name, coalesce(description, '') FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_category_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
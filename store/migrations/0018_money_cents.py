@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+import store.money
+from store.money import Money
+
+
+def copy_field(model_name, source, target, convert):
+    def run(apps, schema_editor):
+        Model = apps.get_model('store', model_name)
+        rows = Model.objects.exclude(**{f'{source}__isnull': True}).values_list('id', source)
+        Model.objects.bulk_update(
+            [Model(id=pk, **{target: convert(value)}) for pk, value in rows.iterator()],
+            [target],
+            batch_size=500,
+        )
+    return run
+
+
+def to_cents(value):
+    return Money.parse(value).cents
+
+
+def to_dollars(cents):
+    return float(Money(cents))
+
+
+class Migration(migrations.Migration):
+    """Store Product.price and Product.Sale_price as integer cents instead of floats."""
+
+    dependencies = [
+        ('store', '0017_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField('product', 'price_cents', models.BigIntegerField(null=True)),
+        migrations.AddField('product', 'sale_price_cents', models.BigIntegerField(null=True)),
+        migrations.AlterField('product', 'Sale_price', models.FloatField(null=True)),
+        migrations.RunPython(
+            copy_field('Product', 'price', 'price_cents', to_cents),
+            copy_field('Product', 'price_cents', 'price', to_dollars),
+        ),
+        migrations.RunPython(
+            copy_field('Product', 'Sale_price', 'sale_price_cents', to_cents),
+            copy_field('Product', 'sale_price_cents', 'Sale_price', to_dollars),
+        ),
+        migrations.RemoveField('product', 'price'),
+        migrations.RemoveField('product', 'Sale_price'),
+        migrations.RenameField('product', 'price_cents', 'price'),
+        migrations.RenameField('product', 'sale_price_cents', 'Sale_price'),
+        migrations.AlterField('product', 'price', store.money.MoneyField(blank=True, null=True)),
+        migrations.AlterField('product', 'Sale_price', store.money.MoneyField()),
+    ]
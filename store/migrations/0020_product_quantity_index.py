@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='quantity',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='Available stock quantity'),
+        ),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+import copy
 import datetime
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+import logging
+
+from .money import MoneyField
+
+logger = logging.getLogger(__name__)
 
 class Profile(models.Model):
     ROLE_CHOICES = [
@@ -49,12 +56,17 @@ class Category(models.Model):
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=200)
-    Sale_price = models.FloatField()
+    Sale_price = MoneyField()
     description = models.CharField(max_length=200, null=True, blank=True)
     image = models.ImageField(null=True, blank=True)
     Is_sale = models.BooleanField(default=False, null=True, blank=True)
-    price = models.FloatField(null=True, blank=True)
-    quantity = models.PositiveIntegerField(default=0, help_text="Available stock quantity")
+    price = MoneyField(null=True, blank=True)
+    quantity = models.PositiveIntegerField(default=0, help_text="Available stock quantity", db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -87,18 +99,118 @@ class Product(models.Model):
         return self.quantity >= requested_quantity
     
     def reduce_stock(self, quantity):
-        """Reduce stock by the specified quantity"""
-        if self.has_sufficient_stock(quantity):
+        """Reduce stock by the specified quantity with a conditional UPDATE"""
+        updated = Product.objects.filter(pk=self.pk, quantity__gte=quantity).update(
+            quantity=models.F('quantity') - quantity
+        )
+        if updated:
             self.quantity -= quantity
-            self.save()
-            return True
-        return False
+        return bool(updated)
+
+    @classmethod
+    def reduce_stock_many(cls, quantities):
+        """
+        Reduce stock for {product_id: quantity} in two queries, all or nothing.
+
+        Rows are locked in product-id order (so concurrent checkouts cannot
+        deadlock) and decremented by a single UPDATE guarded by
+        ``quantity >= n``. Returns the ids that lack stock; nothing is changed
+        unless that list is empty. Call inside ``transaction.atomic()``.
+        """
+        quantities = {int(pid): qty for pid, qty in quantities.items()}
+        if not quantities:
+            return []
+        locked = dict(
+            cls.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by('id')
+            .values_list('id', 'quantity')
+        )
+        short = sorted(pid for pid, qty in quantities.items() if locked.get(pid, 0) < qty)
+        if short:
+            return short
+        guard = models.Q()
+        for pid, qty in quantities.items():
+            guard |= models.Q(id=pid, quantity__gte=qty)
+        updated = cls.objects.filter(guard).update(
+            quantity=models.F('quantity') - models.Case(
+                *[models.When(id=pid, then=models.Value(qty)) for pid, qty in quantities.items()],
+                default=models.Value(0),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+        if updated != len(quantities):
+            raise RuntimeError("Stock changed while locked; aborting decrement")
+        return []
     
     def add_stock(self, quantity):
         """Add stock by the specified quantity"""
         self.quantity += quantity
         self.save()
 
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    from .search import get_backend
+    try:
+        # A savepoint, so a failed index write doesn't abort the caller's transaction
+        with transaction.atomic():
+            get_backend().index(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to index product {instance.pk} for search: {e}")
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    from .search import get_backend
+    try:
+        with transaction.atomic():
+            get_backend().remove(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove product {instance.pk} from search index: {e}")
+
+@receiver(post_save, sender=Product)
+def update_product_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index
+    # Applied once the save commits, so a rolled-back save never shows up in
+    # suggestions; a copy, because a delete later in the transaction clears pk
+    product = copy.copy(instance)
+    transaction.on_commit(lambda: index.add_product(product))
+
+@receiver(post_delete, sender=Product)
+def remove_product_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index
+    pk = instance.pk
+    transaction.on_commit(lambda: index.remove('product', pk))
+
+@receiver(post_save, sender=Product)
+def update_product_fuzzy_index(sender, instance, **kwargs):
+    from .fuzzy import index
+    product = copy.copy(instance)
+    transaction.on_commit(lambda: index.add_product(product))
+
+@receiver(post_delete, sender=Product)
+def remove_product_fuzzy_index(sender, instance, **kwargs):
+    from .fuzzy import index
+    pk = instance.pk
+    transaction.on_commit(lambda: index.remove(pk))
+
+@receiver(post_save, sender=Category)
+def update_category_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index
+    category = copy.copy(instance)
+    transaction.on_commit(lambda: index.add_category(category))
+
+@receiver(post_delete, sender=Category)
+def remove_category_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index
+    pk = instance.pk
+    transaction.on_commit(lambda: index.remove('category', pk))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, instance, **kwargs):
+    from .registry import category_registry
+    category_registry.invalidate()
+
 class Order(models.Model):
     Product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
@@ -109,4 +221,4 @@ class Order(models.Model):
     status = models.CharField(max_length=200, null=True, blank=True)
     
     def __str__(self):
-        return str(self.Product)
\ No newline at end of file
+        return str(self.Product)
@@ -0,0 +1,162 @@
+"""
+Exact money amounts stored as integer cents.
+
+``Money`` wraps a cent count and prints as dollars ("12.50"), so templates,
+``floatformat`` and f-strings keep working while every sum and product is
+integer arithmetic. ``MoneyField`` stores it in a BIGINT column.
+
+Plain numbers crossing into money code (form input, ``price__gte=200`` in a
+filter, ``Money.parse('12.5')``) are read as dollars; only ``Money(cents)``
+and the database column deal in cents. A ``Money`` equals and hashes like
+its dollar ``Decimal``, so ``Money(500) == 5`` and both work as the same dict
+key; floats compare after rounding to the cent, so don't mix them into keys.
+
+Multiplying by an int (a quantity) is exact; multiplying by a ``Decimal``
+(a rate) rounds the result half-up to the cent. Floats are refused.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import total_ordering
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+
+CENT = Decimal('0.01')
+
+
+@total_ordering
+class Money:
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if isinstance(cents, Money):
+            cents = cents.cents
+        if isinstance(cents, bool) or not isinstance(cents, int):
+            raise TypeError(f"Money() takes integer cents, got {cents!r}; use Money.parse() for dollars")
+        object.__setattr__(self, 'cents', cents)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    @classmethod
+    def parse(cls, value):
+        """Money from a dollar amount (Decimal, int, float or numeric string), rounded to the cent."""
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, bool) or value is None:
+            raise ValueError(f"Invalid amount: {value!r}")
+        try:
+            amount = Decimal(str(value).strip()) if not isinstance(value, Decimal) else value
+            if not amount.is_finite():
+                raise ValueError(f"Invalid amount: {value!r}")
+            return cls(int(amount.quantize(CENT, rounding=ROUND_HALF_UP).scaleb(2)))
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {value!r}")
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2).quantize(CENT)
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __hash__(self):
+        # Consistent with __eq__ against ints and Decimals of the same dollar value
+        return hash(self.to_decimal())
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+    @staticmethod
+    def _other_cents(other):
+        if isinstance(other, Money):
+            return other.cents
+        if isinstance(other, (int, float, Decimal)) and not isinstance(other, bool):
+            return Money.parse(other).cents
+        return None
+
+    def __eq__(self, other):
+        cents = self._other_cents(other)
+        return NotImplemented if cents is None else self.cents == cents
+
+    def __lt__(self, other):
+        cents = self._other_cents(other)
+        return NotImplemented if cents is None else self.cents < cents
+
+    def __add__(self, other):
+        cents = self._other_cents(other)
+        return NotImplemented if cents is None else Money(self.cents + cents)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        cents = self._other_cents(other)
+        return NotImplemented if cents is None else Money(self.cents - cents)
+
+    def __rsub__(self, other):
+        cents = self._other_cents(other)
+        return NotImplemented if cents is None else Money(cents - self.cents)
+
+    def __mul__(self, factor):
+        if isinstance(factor, Decimal):
+            if not factor.is_finite():
+                raise ValueError(f"Invalid factor: {factor!r}")
+            return Money(int((self.cents * factor).quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+        if isinstance(factor, bool) or not isinstance(factor, int):
+            return NotImplemented
+        return Money(self.cents * factor)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+
+class MoneyFormField(forms.DecimalField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('max_digits', 12)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        return value.to_decimal() if isinstance(value, Money) else value
+
+
+class MoneyField(models.BigIntegerField):
+    """Money column holding integer cents; reads back as ``Money``."""
+
+    description = "Amount of money in integer cents"
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Money(int(value))
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            return Money.parse(value)
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return self.to_python(value).cents
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super(models.BigIntegerField, self).formfield(**{'form_class': MoneyFormField, **kwargs})
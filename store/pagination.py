@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination for listing pages.
+
+Rows are ordered by a unique, indexed integer key (the primary key by default)
+and each page is fetched with ``WHERE key > cursor ORDER BY key LIMIT n + 1``,
+so a request costs the same whether it is page 1 or page 500.
+"""
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 48
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move around it."""
+
+    def __init__(self, object_list, page_size, params, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, direction, cursor):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[direction] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.next_cursor) if self.has_next else ''
+
+    @property
+    def prev_query(self):
+        return self._query('before', self.prev_cursor) if self.has_previous else ''
+
+
+def _parse_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read ``?per_page=`` from the request, clamped to ``1..maximum``."""
+    try:
+        size = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def keyset_paginate(queryset, request, key='id', descending=False, page_size=None):
+    """
+    Return a ``KeysetPage`` of ``queryset`` for the cursor in ``request.GET``.
+
+    ``?after=<key>`` moves forward and ``?before=<key>`` moves back. ``key``
+    must be unique and indexed so the ordering is stable between requests.
+    """
+    size = page_size or get_page_size(request)
+    after = _parse_cursor(request.GET.get('after'))
+    before = _parse_cursor(request.GET.get('before'))
+
+    forward = f'-{key}' if descending else key
+    backward = key if descending else f'-{key}'
+    past, behind = ('lt', 'gt') if descending else ('gt', 'lt')
+
+    if before is not None:
+        rows = list(queryset.filter(**{f'{key}__{behind}': before}).order_by(backward)[:size + 1])
+        more_behind = len(rows) > size
+        rows = rows[:size][::-1]
+        has_next, has_previous = bool(rows), more_behind
+    else:
+        if after is not None:
+            queryset = queryset.filter(**{f'{key}__{past}': after})
+        rows = list(queryset.order_by(forward)[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_previous = after is not None and bool(rows)
+
+    next_cursor = getattr(rows[-1], key) if has_next else None
+    prev_cursor = getattr(rows[0], key) if has_previous else None
+    return KeysetPage(rows, size, request.GET, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,104 @@
+"""
+Process-local copies of small, rarely changing reference tables.
+
+A ``ReferenceRegistry`` loads its whole table once and answers ``all()``,
+``get(pk)`` and ``lookup(field, value)`` from dictionaries, so views stop
+querying Category and DeliveryOption on every request.
+
+Invalidation has two parts:
+
+* ``post_save``/``post_delete`` receivers call ``invalidate()``, which drops
+  this process's copy immediately;
+* after the transaction commits, ``invalidate()`` also writes a new version
+  stamp to the shared cache. Every worker compares its copy's stamp with the
+  cache at most once per ``CHECK_INTERVAL`` seconds and reloads when it
+  differs.
+
+The stamp lives in the default cache, which settings point at a backend
+every worker shares: Redis via ``REDIS_URL``, or else the database cache
+table. Each worker sees its own saves immediately and other workers' saves
+within ``CHECK_INTERVAL`` seconds.
+
+Returned instances are shared between requests and must not be modified.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+CHECK_INTERVAL = 2
+
+
+class ReferenceRegistry:
+    def __init__(self, model, index_fields=(), order_by=('pk',)):
+        self.model = model
+        self.index_fields = index_fields
+        self.order_by = order_by
+        self.cache_key = f"registry:{model._meta.label_lower}"
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _shared_version(self):
+        version = cache.get(self.cache_key)
+        if version is None:
+            cache.add(self.cache_key, uuid.uuid4().hex, None)
+            version = cache.get(self.cache_key)
+        return version
+
+    def _load(self, version):
+        rows = list(self.model._default_manager.order_by(*self.order_by))
+        by_pk = {row.pk: row for row in rows}
+        indexes = {}
+        for field in self.index_fields:
+            index = indexes[field] = {}
+            for row in rows:
+                index.setdefault(getattr(row, field), row)
+        return rows, by_pk, indexes, version
+
+    def _current(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < CHECK_INTERVAL:
+            return snapshot
+        with self._lock:
+            version = self._shared_version()
+            if self._snapshot is None or self._snapshot[3] != version:
+                self._snapshot = self._load(version)
+            self._checked_at = now
+            return self._snapshot
+
+    def all(self):
+        return list(self._current()[0])
+
+    def get(self, pk):
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        return self._current()[1].get(pk)
+
+    def lookup(self, field, value):
+        """First row (in registry order) whose ``field`` equals ``value``."""
+        return self._current()[2][field].get(value)
+
+    def filter(self, **conditions):
+        return [
+            row for row in self._current()[0]
+            if all(getattr(row, field) == value for field, value in conditions.items())
+        ]
+
+    def _bump(self):
+        cache.set(self.cache_key, uuid.uuid4().hex, None)
+
+    def invalidate(self):
+        self._snapshot = None
+        transaction.on_commit(self._bump)
+
+
+category_registry = ReferenceRegistry(Category, index_fields=('name',), order_by=('name', 'pk'))
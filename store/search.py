@@ -0,0 +1,246 @@
+"""
+Ranked full-text product search.
+
+On PostgreSQL products are indexed into a ``tsvector`` column behind a GIN
+index; on SQLite into an FTS5 virtual table. Any other database falls back to
+``icontains`` matching. The index tables are created by migration
+``0017_product_search_index`` and kept in sync by the Product save/delete
+receivers in ``store/models.py``.
+"""
+import logging
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+from .pagination import get_page_size
+
+logger = logging.getLogger(__name__)
+
+PG_TABLE = 'store_product_search'
+FTS_TABLE = 'store_product_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split free text into search tokens, dropping operators and punctuation."""
+    return _TOKEN_RE.findall(query.lower())[:16]
+
+
+class BaseSearchBackend:
+    def index(self, product_id):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def ranked_ids(self, query, limit, offset=0):
+        raise NotImplementedError
+
+    def matching_ids(self, query):
+        """Unranked, unlimited subquery of matching product ids, for ``id__in``."""
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """``tsvector`` document per product, name weighted above description."""
+
+    def index(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {PG_TABLE} (product_id, document)
+                SELECT id,
+                       setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                       setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+                FROM store_product WHERE id = %s
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                [product_id],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PG_TABLE} WHERE product_id = %s", [product_id])
+
+    @staticmethod
+    def _tsquery(tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def ranked_ids(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = self._tsquery(tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT product_id FROM {PG_TABLE}, to_tsquery('simple', %s) query
+                WHERE document @@ query
+                ORDER BY ts_rank(document, query) DESC, product_id
+                LIMIT %s OFFSET %s
+                """,
+                [tsquery, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching_ids(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        return RawSQL(
+            f"SELECT product_id FROM {PG_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+            [self._tsquery(tokens)],
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 table keyed by product id, ranked with bm25 (name weighted 10x)."""
+
+    def index(self, product_id):
+        product = Product.objects.filter(id=product_id).values('name', 'description').first()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+            if product:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                    [product_id, product['name'], product['description'] or ''],
+                )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    @staticmethod
+    def _match(tokens):
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def ranked_ids(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = self._match(tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+                ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), rowid
+                LIMIT %s OFFSET %s
+                """,
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching_ids(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self._match(tokens)])
+
+
+class FallbackSearchBackend(BaseSearchBackend):
+    """Unranked ``icontains`` matching for databases without a text index."""
+
+    def matching_ids(self, query):
+        query = query.strip()
+        if not query:
+            return []
+        return Product.objects.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).values('id')
+
+    def ranked_ids(self, query, limit, offset=0):
+        if not query.strip():
+            return []
+        ids = self.matching_ids(query).order_by('id').values_list('id', flat=True)
+        return list(ids[offset:offset + limit])
+
+
+_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend():
+    return _BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+class SearchPage:
+    """A page of ranked results; same interface as ``pagination.KeysetPage``."""
+
+    def __init__(self, object_list, number, has_next, params):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = number > 1
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, number):
+        params = self._params.copy()
+        params['page'] = number
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(self.number + 1) if self.has_next else ''
+
+    @property
+    def prev_query(self):
+        return self._query(self.number - 1) if self.has_previous else ''
+
+
+def search_products(query, request, params):
+    """Return a ``SearchPage`` of products for ``query`` in rank order."""
+    size = get_page_size(request)
+    try:
+        number = max(1, int(request.GET.get('page', 1)))
+    except (TypeError, ValueError):
+        number = 1
+
+    try:
+        ids = get_backend().ranked_ids(query, size + 1, (number - 1) * size)
+    except Exception as e:
+        logger.error(f"Search index query failed, falling back to icontains: {e}")
+        ids = FallbackSearchBackend().ranked_ids(query, size + 1, (number - 1) * size)
+
+    has_next = len(ids) > size
+    ids = ids[:size]
+    products = Product.objects.in_bulk(ids)
+    results = [products[pk] for pk in ids if pk in products]
+    return SearchPage(results, number, has_next, params)
+
+
+def filter_products(queryset, query):
+    """
+    Restrict ``queryset`` to every product matching ``query`` through the index.
+
+    The match is a subquery of the filtered queryset, so it is neither
+    capped nor materialized in Python. A subquery only fails once the
+    queryset is evaluated, so the index is probed here first.
+    """
+    try:
+        ids = get_backend().matching_ids(query)
+        # A savepoint, so a failed probe doesn't abort the caller's transaction
+        with transaction.atomic():
+            Product.objects.filter(id__in=ids).exists()
+    except Exception as e:
+        logger.error(f"Search index query failed, falling back to icontains: {e}")
+        ids = FallbackSearchBackend().matching_ids(query)
+    return queryset.filter(id__in=ids)
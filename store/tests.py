@@ -1,3 +1,467 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .autocomplete import REBUILD_INTERVAL, PrefixIndex, normalize
+from .facets import FacetFilter
+from .fuzzy import TrigramIndex
+from .models import Category, Product
+from .money import Money
+from .pagination import keyset_paginate
+from .registry import CHECK_INTERVAL, ReferenceRegistry
+from .search import FallbackSearchBackend, SQLiteSearchBackend, filter_products, search_products
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates back to ``migrate_from``, lets the test add rows, then migrates to ``migrate_to``."""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        super().setUp()
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self._migrate, executor.loader.graph.leaf_nodes())
+        self.apps = self._migrate(self.migrate_from)
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def migrate(self):
+        return self._migrate(self.migrate_to)
+
+
+class ReferenceRegistryTests(TestCase):
+    def test_other_workers_see_invalidation(self):
+        # Two registries over the same table stand in for two worker processes
+        worker_a = ReferenceRegistry(Category, index_fields=('name',))
+        worker_b = ReferenceRegistry(Category, index_fields=('name',))
+        phone = Category.objects.create(name='Phones')
+        phone_id = phone.pk
+        self.assertEqual(worker_a.lookup('name', 'Phones').pk, phone_id)
+        self.assertEqual(worker_b.lookup('name', 'Phones').pk, phone_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            phone.delete()
+            worker_b.invalidate()
+        self.assertIsNone(worker_b.lookup('name', 'Phones'))
+
+        # Worker A keeps its copy until its next version check...
+        self.assertEqual(worker_a.lookup('name', 'Phones').pk, phone_id)
+        worker_a._checked_at -= CHECK_INTERVAL
+        # ...which reads the stamp worker B wrote to the shared cache
+        self.assertIsNone(worker_a.lookup('name', 'Phones'))
+
+
+class ReduceStockManyTests(TestCase):
+    def setUp(self):
+        self.phone = Product.objects.create(name='Phone', price=Money(10000), Sale_price=Money(9000), quantity=5)
+        self.case = Product.objects.create(name='Case', price=Money(1000), Sale_price=Money(900), quantity=2)
+
+    def stock(self):
+        return dict(Product.objects.values_list('id', 'quantity'))
+
+    def test_decrements_every_line(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(Product.reduce_stock_many({self.phone.pk: 2, str(self.case.pk): 2}), [])
+        self.assertEqual(self.stock(), {self.phone.pk: 3, self.case.pk: 0})
+
+    def test_short_line_changes_nothing(self):
+        short = Product.reduce_stock_many({self.phone.pk: 2, self.case.pk: 3})
+        self.assertEqual(short, [self.case.pk])
+        self.assertEqual(self.stock(), {self.phone.pk: 5, self.case.pk: 2})
+
+    def test_cannot_oversell(self):
+        self.assertEqual(Product.reduce_stock_many({self.phone.pk: 3}), [])
+        self.assertEqual(Product.reduce_stock_many({self.phone.pk: 3}), [self.phone.pk])
+        self.assertEqual(Product.reduce_stock_many({self.phone.pk + self.case.pk: 1}), [self.phone.pk + self.case.pk])
+        self.assertEqual(self.stock()[self.phone.pk], 2)
+
+    def test_stock_changed_after_locking_aborts(self):
+        # A row that no longer satisfies the guard (as if sold under us) fails
+        # the whole decrement rather than overselling it
+        real_filter = Product.objects.filter
+
+        def sold_meanwhile(guard):
+            real_filter(pk=self.case.pk).update(quantity=0)
+            return real_filter(guard)
+
+        # The guarded UPDATE is the only Product.objects.filter() call
+        with mock.patch.object(Product.objects, 'filter', side_effect=sold_meanwhile):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Product.reduce_stock_many({self.phone.pk: 1, self.case.pk: 1})
+
+
+class MoneyTests(SimpleTestCase):
+    def test_equal_amounts_hash_alike(self):
+        self.assertEqual(Money(500), Decimal('5'))
+        self.assertEqual(Money(500), 5)
+        self.assertEqual(hash(Money(500)), hash(Decimal('5')))
+        self.assertEqual(hash(Money(1999)), hash(Decimal('19.99')))
+        self.assertEqual(len({Money(500), Decimal('5.00'), 5}), 1)
+
+    def test_multiply(self):
+        self.assertEqual(Money(1999) * 3, Money(5997))
+        self.assertEqual(3 * Money(1999), Money(5997))
+        self.assertEqual(Money(1999) * Decimal('0.1'), Money(200))
+        self.assertEqual(Decimal('0.1') * Money(1999), Money(200))
+        with self.assertRaises(TypeError):
+            Money(1999) * 0.1
+        with self.assertRaises(ValueError):
+            Money(1999) * Decimal('NaN')
+
+
+class ProductMoneyMigrationTests(MigrationTestCase):
+    migrate_from = [('store', '0017_product_search_index')]
+    migrate_to = [('store', '0018_money_cents')]
+
+    def test_dollars_become_cents(self):
+        Product = self.apps.get_model('store', 'Product')
+        phone = Product.objects.create(name='Phone', price=19.99, Sale_price=0.1 + 0.2)
+        free = Product.objects.create(name='Sticker', price=None, Sale_price=0)
+
+        Product = self.migrate().get_model('store', 'Product')
+        prices = {pk: (price, sale) for pk, price, sale in Product.objects.values_list('pk', 'price', 'Sale_price')}
+        self.assertEqual(prices[phone.pk], (Money(1999), Money(30)))
+        self.assertEqual(prices[free.pk], (None, Money(0)))
+
+
+class PaymentMoneyMigrationTests(MigrationTestCase):
+    migrate_from = [('payment', '0005_notificationoutbox')]
+    migrate_to = [('payment', '0006_money_cents')]
+
+    def test_dollars_become_cents(self):
+        DeliveryOption = self.apps.get_model('payment', 'DeliveryOption')
+        Order = self.apps.get_model('payment', 'Order')
+        OrderItem = self.apps.get_model('payment', 'OrderItem')
+        delivery = DeliveryOption.objects.create(name='Courier', price=Decimal('1.50'), estimated_days=2)
+        order = Order.objects.create(amount_paid=Decimal('21.49'), delivery_option=delivery)
+        item = OrderItem.objects.create(order=order, quantity=2, price=Decimal('9.99'))
+
+        apps = self.migrate()
+        self.assertEqual(apps.get_model('payment', 'DeliveryOption').objects.get(pk=delivery.pk).price, Money(150))
+        self.assertEqual(apps.get_model('payment', 'Order').objects.get(pk=order.pk).amount_paid, Money(2149))
+        self.assertEqual(apps.get_model('payment', 'OrderItem').objects.get(pk=item.pk).price, Money(999))
+
+
+class KeysetPaginateTests(TestCase):
+    def setUp(self):
+        self.ids = [
+            Product.objects.create(name=f'Product {i}', price=Money(1000), Sale_price=Money(900)).pk
+            for i in range(7)
+        ]
+
+    def page(self, descending=False, **params):
+        request = RequestFactory().get('/', {'per_page': 3, **params})
+        return keyset_paginate(Product.objects.all(), request, descending=descending)
+
+    def ids_of(self, page):
+        return [product.pk for product in page]
+
+    def test_walks_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(self.ids_of(first), self.ids[:3])
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+
+        second = self.page(after=first.next_cursor)
+        self.assertEqual(self.ids_of(second), self.ids[3:6])
+        self.assertEqual((second.has_previous, second.has_next), (True, True))
+
+        last = self.page(after=second.next_cursor)
+        self.assertEqual(self.ids_of(last), self.ids[6:])
+        self.assertEqual((last.has_previous, last.has_next), (True, False))
+
+        back = self.page(before=last.prev_cursor)
+        self.assertEqual(self.ids_of(back), self.ids[3:6])
+        self.assertEqual((back.has_previous, back.has_next), (True, True))
+        self.assertEqual(self.ids_of(self.page(before=back.prev_cursor)), self.ids[:3])
+        self.assertFalse(self.page(before=back.prev_cursor).has_previous)
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        Product.objects.filter(pk=self.ids[6]).delete()
+        second = self.page(after=self.page().next_cursor)
+        self.assertEqual(self.ids_of(second), self.ids[3:6])
+        self.assertFalse(second.has_next)
+
+    def test_descending(self):
+        first = self.page(descending=True)
+        self.assertEqual(self.ids_of(first), self.ids[:-4:-1])
+        self.assertEqual(self.ids_of(self.page(descending=True, after=first.next_cursor)), self.ids[-4:-7:-1])
+
+    def test_cursor_past_either_end(self):
+        self.assertEqual(self.ids_of(self.page(after=self.ids[-1])), [])
+        self.assertFalse(self.page(after=self.ids[-1]).has_other_pages)
+        self.assertEqual(self.ids_of(self.page(before=self.ids[0])), [])
+
+    def test_bad_cursor_is_first_page(self):
+        self.assertEqual(self.ids_of(self.page(after='x')), self.ids[:3])
+
+    def test_queries_keep_other_params(self):
+        page = self.page(q='phone')
+        self.assertEqual(page.next_query, f'per_page=3&q=phone&after={page.next_cursor}')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        def add(name, description=''):
+            return Product.objects.create(name=name, description=description, price=Money(1000), Sale_price=Money(900))
+        self.case = add('Leather case', 'Fits every Pixel phone')
+        self.pixel = add('Pixel phone', 'Google flagship')
+        self.charger = add('Charger', 'USB-C fast charger')
+
+    def search(self, query):
+        request = RequestFactory().get('/', {'searched': query})
+        return [product.pk for product in search_products(query, request, request.GET.copy())]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('pixel phone'), [self.pixel.pk, self.case.pk])
+
+    def test_prefixes_and_every_token_must_match(self):
+        self.assertEqual(self.search('char'), [self.charger.pk])
+        self.assertEqual(self.search('pixel charger'), [])
+        self.assertEqual(self.search('"; DROP'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.charger.name = 'Wireless pad'
+        self.charger.save()
+        self.assertEqual(self.search('wireless'), [self.charger.pk])
+        self.charger.delete()
+        self.assertEqual(self.search('wireless'), [])
+
+    def test_filter_products_is_an_uncapped_subquery(self):
+        # The list itself, one query however many products match, after a
+        # probe of the index in a savepoint
+        with self.assertNumQueries(4):
+            matches = set(filter_products(Product.objects.all(), 'phone').values_list('pk', flat=True))
+        self.assertEqual(matches, {self.pixel.pk, self.case.pk})
+
+    def test_filter_products_falls_back_when_the_index_fails(self):
+        broken = RawSQL("SELECT rowid FROM no_such_table", [])
+        with mock.patch.object(SQLiteSearchBackend, 'matching_ids', return_value=broken):
+            with self.assertLogs('store.search', 'ERROR'):
+                matches = set(filter_products(Product.objects.all(), 'phone'))
+        self.assertEqual(matches, {self.pixel, self.case})
+
+    def test_fallback_backend_matches_substrings(self):
+        with mock.patch('store.search.get_backend', FallbackSearchBackend):
+            self.assertEqual(self.search('harg'), [self.charger.pk])
+            self.assertEqual(set(filter_products(Product.objects.all(), 'phone')), {self.pixel, self.case})
+
+    def test_failed_index_write_keeps_the_product(self):
+        def broken_index(backend, product_id):
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO no_such_table VALUES (1)")
+
+        with mock.patch.object(SQLiteSearchBackend, 'index', broken_index):
+            with self.assertLogs('store.models', 'ERROR'):
+                with transaction.atomic():
+                    product = Product.objects.create(name='Cable', price=Money(100), Sale_price=Money(90))
+                    self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+
+class FacetFilterTests(TestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name='Phones')
+        self.cases = Category.objects.create(name='Cases')
+        for name, category, dollars, quantity, on_sale in [
+            ('Budget phone', self.phones, 150, 3, True),
+            ('Mid phone', self.phones, 350, 0, False),
+            ('Flagship', self.phones, 1200, 2, True),
+            ('Slim case', self.cases, 20, 9, False),
+            ('Rugged case', self.cases, 45, 0, True),
+        ]:
+            Product.objects.create(
+                name=name, category=category, price=Money(dollars * 100), Sale_price=Money(dollars * 90),
+                quantity=quantity, Is_sale=on_sale,
+            )
+
+    def facet_filter(self, category=None, **params):
+        return FacetFilter(RequestFactory().get('/', params), category)
+
+    def options(self, facet_filter):
+        return {
+            (group['name'], option['label']): option
+            for group in facet_filter.facets(Product.objects.all())
+            for option in group['options']
+        }
+
+    def listed(self, facet_filter):
+        return facet_filter.apply(Product.objects.all()).count()
+
+    def assert_counts_match_listing(self, category=None, **params):
+        # Every option's count is the size of the list that choosing it shows
+        facet_filter = self.facet_filter(category, **params)
+        options = self.options(facet_filter)
+        for (group, label), option in options.items():
+            if group == 'Category':
+                chosen = self.facet_filter(Category.objects.get(name=label), **params)
+            elif option['selected']:
+                continue
+            else:
+                chosen = FacetFilter(RequestFactory().get(f"/?{option['query']}"), category)
+            with self.subTest(group=group, label=label):
+                self.assertEqual(option['count'], self.listed(chosen))
+        return options
+
+    def test_counts_match_the_filtered_list(self):
+        self.assert_counts_match_listing()
+        self.assert_counts_match_listing(in_stock='1')
+        self.assert_counts_match_listing(self.phones, price='200-500')
+        self.assert_counts_match_listing(self.cases, on_sale='1', in_stock='1')
+
+    def test_counts_ignore_their_own_facet(self):
+        options = self.assert_counts_match_listing(price='under-200', in_stock='1')
+        self.assertEqual(self.listed(self.facet_filter(price='under-200', in_stock='1')), 2)
+        self.assertEqual(options[('Price', 'Over $1,000')]['count'], 1)
+        self.assertEqual(options[('Availability', 'In stock')]['count'], 2)
+        self.assertEqual(options[('Category', 'Phones')]['count'], 1)
+
+    def test_counts_are_one_query(self):
+        with self.assertNumQueries(1):
+            self.facet_filter(self.phones, price='over-1000').facets(Product.objects.all())
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        self.pixel = self.add('Pixel 8 Pro')
+        self.index = PrefixIndex()
+        self.index.ensure_built()
+
+    def add(self, name):
+        return Product.objects.create(name=name, price=Money(1000), Sale_price=Money(900))
+
+    def names(self, prefix):
+        return [entry['name'] for entry in self.index.suggest(prefix)]
+
+    def make_stale(self):
+        self.index.built_at -= REBUILD_INTERVAL + 1
+
+    def test_matches_any_word_start(self):
+        self.assertEqual(self.names('pro'), ['Pixel 8 Pro'])
+        self.assertEqual(self.names('8 p'), ['Pixel 8 Pro'])
+        self.assertEqual(self.names('ixel'), [])
+
+    def test_changes_during_rebuild_survive_the_swap(self):
+        load = PrefixIndex._load
+        fold = self.add('Pixel Fold')
+
+        def saved_while_loading(index):
+            load(index)
+            # These land after the rebuild read the table
+            self.index.add_product(fold)
+            self.index.remove('product', self.pixel.pk)
+
+        with mock.patch.object(PrefixIndex, '_load', saved_while_loading):
+            self.make_stale()
+            self.index.ensure_built()
+        self.assertEqual(self.names('pixel'), ['Pixel Fold'])
+
+    def test_stale_index_is_served_while_another_request_rebuilds(self):
+        self.make_stale()
+        with self.index._rebuild_lock:
+            with self.assertNumQueries(0):
+                self.index.ensure_built()
+            self.assertEqual(self.names('pixel'), ['Pixel 8 Pro'])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        self.make_stale()
+        with mock.patch.object(PrefixIndex, '_load', side_effect=DatabaseError('gone')):
+            with self.assertLogs('store.autocomplete', 'ERROR'):
+                self.index.ensure_built()
+        self.assertEqual(self.names('pixel'), ['Pixel 8 Pro'])
+        self.assertIsNone(self.index._changes)
+
+    def test_saves_reach_the_index_on_commit(self):
+        with mock.patch('store.autocomplete.index', self.index):
+            try:
+                with transaction.atomic():
+                    self.add('Pixel Tablet')
+                    Category.objects.create(name='Pixel Watch')
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            self.assertEqual(self.names('pixel'), ['Pixel 8 Pro'])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add('Pixel Buds')
+                self.add('Pixel Fold').delete()
+                self.pixel.delete()
+            self.assertEqual(self.names('pixel'), ['Pixel Buds'])
+
+
+class FuzzyMatchTests(TestCase):
+    # "Telephone" in Khmer; the coeng sign (U+17D2) has a nonzero combining class
+    KHMER_PHONE = 'ទូរស័ព្ទ'
+
+    def setUp(self):
+        self.phone = Product.objects.create(name=self.KHMER_PHONE, price=Money(1000), Sale_price=Money(900))
+        self.galaxy = Product.objects.create(name='Samsung Galaxy', price=Money(1000), Sale_price=Money(900))
+        self.index = TrigramIndex()
+        self.index.ensure_built()
+
+    def test_normalize_strips_accents_from_latin_only(self):
+        self.assertEqual(normalize('  Café  CRÈME '), 'cafe creme')
+        self.assertEqual(normalize(self.KHMER_PHONE), self.KHMER_PHONE)
+        self.assertEqual(normalize('โทรศัพท์'), 'โทรศัพท์')
+
+    def test_khmer_name_with_a_typo(self):
+        typo = self.KHMER_PHONE.replace('\u17d0', '')
+        self.assertEqual(self.index.correct(typo), self.KHMER_PHONE)
+        self.assertEqual(self.index.similar(typo, 5), [self.phone.pk])
+
+    def test_latin_typos(self):
+        self.assertEqual(self.index.correct('samsng galxy'), 'samsung galaxy')
+        self.assertIsNone(self.index.correct('samsung'))
+        self.assertEqual(self.index.similar('galaxi samsug', 5), [self.galaxy.pk])
+
+    def test_saves_reach_the_index_on_commit(self):
+        with mock.patch('store.fuzzy.index', self.index):
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name='Samsung Tablet', price=Money(1000), Sale_price=Money(900))
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            self.assertIsNone(self.index.correct('samsung tablt'))
+
+            galaxy = self.galaxy.pk
+            with self.captureOnCommitCallbacks(execute=True):
+                buds = Product.objects.create(name='Samsung Buds', price=Money(1000), Sale_price=Money(900))
+                self.galaxy.delete()
+            self.assertEqual(self.index.correct('samsung bds'), 'samsung buds')
+            self.assertNotIn(galaxy, self.index.similar('galaxi samsug', 5))
+            self.assertIn(buds.pk, self.index.similar('galaxi samsug', 5))
+
+
+class SearchViewTests(TestCase):
+    def search(self, query):
+        return self.client.get(reverse('search'), {'searched': query})
+
+    def test_suggestion_without_matches_is_not_offered(self):
+        with mock.patch('store.fuzzy.did_you_mean', return_value='nothing here'):
+            response = self.search('nothng here')
+        self.assertIsNone(response.context.get('did_you_mean'))
+
+    def test_suggestion_with_matches_is_offered(self):
+        Product.objects.create(
+            name='Samsung Galaxy', price=Money(1000), Sale_price=Money(900), image='uploads/product/galaxy.jpg',
+        )
+        with mock.patch('store.fuzzy.did_you_mean', return_value='samsung'):
+            response = self.search('samsng')
+        self.assertEqual(response.context['did_you_mean'], 'samsung')
+        self.assertContains(response, 'Samsung Galaxy')
+
+    def test_no_suggestion_past_the_last_page(self):
+        Product.objects.create(name='Samsung Galaxy', price=Money(1000), Sale_price=Money(900))
+        with mock.patch('store.fuzzy.did_you_mean') as did_you_mean:
+            response = self.client.get(reverse('search'), {'searched': 'samsung', 'page': 2})
+        did_you_mean.assert_not_called()
+        self.assertIsNone(response.context.get('did_you_mean'))
@@ -16,5 +16,6 @@ urlpatterns = [
 	path('product/<int:pk>/', views.product, name="product"),
 	path('category/<str:foo>/', views.category, name="category"),
 	path('search/', views.search , name="search"),
+	path('search/autocomplete/', views.autocomplete, name="autocomplete"),
 	path('add_to_cart/<int:product_id>/', views.add_to_cart, name="add_to_cart")
 ]
\ No newline at end of file
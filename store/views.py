@@ -15,24 +15,56 @@ from payment.models import ShippingAddress
 from cart.cart import Cart
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
+from .pagination import keyset_paginate
+from .facets import FacetFilter
+from .search import SearchPage, search_products
+from . import fuzzy
+from . import autocomplete as typeahead
+from .registry import category_registry
 
 
 
 # Create your views here.
 def search(request):
-	# Determine if they filled out the form
-	if request.method == "POST":
-		searched = request.POST['searched']
-		# Query The Products DB Model
-		searched = Product.objects.filter(Q(name__icontains=searched) | Q(description__icontains=searched))
-		# Test for null
-		if not searched:
-			messages.success(request, "That Product Does Not Exist...Please try Again.")
-			return render(request, "store/search.html", {})
-		else:
-			return render(request, "store/search.html", {'searched':searched})
-	else:
-		return render(request, "store/search.html", {})	
+	searched = request.POST.get('searched') or request.GET.get('searched', '')
+	searched = searched.strip()
+	if not searched:
+		return render(request, "store/search.html", {})
+	# Ranked, paginated lookup through the full-text index
+	params = request.GET.copy()
+	params['searched'] = searched
+	page = search_products(searched, request, params)
+	suggestion = None
+	if not page and page.number == 1:
+		# Nothing matched exactly: retry with typos corrected, then fall
+		# back to the closest products by trigram overlap. Past the last
+		# page of real matches there is nothing to correct
+		suggestion = fuzzy.did_you_mean(searched)
+		if suggestion:
+			page = search_products(suggestion, request, params)
+			if not page:
+				# Only offer a correction that finds something
+				suggestion = None
+		if not page:
+			ids = fuzzy.similar_product_ids(searched)
+			products = Product.objects.in_bulk(ids)
+			similar = [products[pk] for pk in ids if pk in products]
+			page = SearchPage(similar, 1, False, params)
+	# Test for null
+	if not page:
+		messages.success(request, "That Product Does Not Exist...Please try Again.")
+		return render(request, "store/search.html", {'query': searched})
+	return render(request, "store/search.html", {'searched': page, 'page': page, 'query': searched, 'did_you_mean': suggestion})
+
+
+def autocomplete(request):
+	"""Typeahead suggestions for the navbar search box, served from memory."""
+	try:
+		limit = int(request.GET.get('limit', typeahead.DEFAULT_RESULTS))
+	except ValueError:
+		limit = typeahead.DEFAULT_RESULTS
+	results = typeahead.suggest(request.GET.get('q', ''), limit)
+	return JsonResponse({'results': results})
 
 
 def update_info(request):
@@ -68,8 +100,8 @@ def update_user(request):
     
 
 def store(request):
-	products = Product.objects.all()
-	context = {'products':products}
+	page = keyset_paginate(Product.objects.all(), request)
+	context = {'products':page.object_list, 'page':page}
 	return render(request, 'store/store.html', context)
 
 
@@ -121,9 +153,17 @@ def product(request, pk):
 
 def category(request, foo):
     try:
-        category_obj = Category.objects.get(name=foo)
-        products = Product.objects.filter(category=category_obj)
-        context = {'products': products, 'category': category_obj}
+        category_obj = category_registry.lookup('name', foo)
+        if category_obj is None:
+            raise Category.DoesNotExist
+        facet_filter = FacetFilter(request, category_obj)
+        page = keyset_paginate(facet_filter.apply(Product.objects.all()), request)
+        context = {
+            'products': page.object_list,
+            'page': page,
+            'category': category_obj,
+            'facets': facet_filter.facets(Product.objects.all()),
+        }
         return render(request, 'store/category.html', context)
     except Category.DoesNotExist:
         messages.error(request, 'Category does not exist')
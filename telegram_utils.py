@@ -3,71 +3,47 @@
 Utility script to get Telegram chat ID for bot integration
 """
 
-import requests
-import json
+from payment.telegram import TelegramError, get_client
 
 def get_chat_id():
     """
     Get your chat ID by sending a message to your bot first,
     then running this script to get the chat ID from the bot's updates
     """
-    bot_token = '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc'
-    
-    # Get updates from bot
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
-    
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data['ok'] and data['result']:
-                print("Recent messages to your bot:")
-                for update in data['result']:
-                    if 'message' in update:
-                        message = update['message']
-                        chat = message['chat']
-                        print(f"Chat ID: {chat['id']}")
-                        print(f"Chat Type: {chat['type']}")
-                        print(f"From: {chat.get('first_name', '')} {chat.get('last_name', '')}")
-                        print(f"Username: @{chat.get('username', 'N/A')}")
-                        print("-" * 50)
-            else:
-                print("No recent messages found.")
-                print("To get your chat ID:")
-                print("1. Open Telegram")
-                print("2. Search for @Getme_Phone_Shop_bot")
-                print("3. Start a conversation with your bot")
-                print("4. Send any message to the bot")
-                print("5. Run this script again")
+        updates = get_client().call('getUpdates', http_method='get')
+        if updates:
+            print("Recent messages to your bot:")
+            for update in updates:
+                if 'message' in update:
+                    message = update['message']
+                    chat = message['chat']
+                    print(f"Chat ID: {chat['id']}")
+                    print(f"Chat Type: {chat['type']}")
+                    print(f"From: {chat.get('first_name', '')} {chat.get('last_name', '')}")
+                    print(f"Username: @{chat.get('username', 'N/A')}")
+                    print("-" * 50)
         else:
-            print(f"Error: {response.status_code}")
-            print(response.text)
+            print("No recent messages found.")
+            print("To get your chat ID:")
+            print("1. Open Telegram")
+            print("2. Search for @Getme_Phone_Shop_bot")
+            print("3. Start a conversation with your bot")
+            print("4. Send any message to the bot")
+            print("5. Run this script again")
             
-    except Exception as e:
+    except TelegramError as e:
         print(f"Error: {e}")
 
 def send_test_message(chat_id):
     """
     Send a test message to verify the chat ID is correct
     """
-    bot_token = '7875498577:AAHaoHdqWX390E_GI08v4gBe78izt76r4Rc'
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    data = {
-        'chat_id': chat_id,
-        'text': '🔔 Test message from your e-commerce site! Your Telegram integration is working! 🎉',
-        'parse_mode': 'Markdown'
-    }
-    
     try:
-        response = requests.post(url, data=data)
-        if response.status_code == 200:
-            print("✅ Test message sent successfully!")
-        else:
-            print(f"❌ Error sending test message: {response.text}")
-    except Exception as e:
-        print(f"❌ Error: {e}")
+        get_client().send_message(chat_id, '🔔 Test message from your e-commerce site! Your Telegram integration is working! 🎉')
+        print("✅ Test message sent successfully!")
+    except TelegramError as e:
+        print(f"❌ Error sending test message: {e}")
 
 if __name__ == "__main__":
     print("Telegram Bot Chat ID Utility")